@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status
-from fastapi.responses import FileResponse
-from typing import List, Optional
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Header, Query, Request, status
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import AsyncIterator, Callable, List, Optional
+from sqlalchemy.orm import Session, sessionmaker
 import os
+import json
+import asyncio
+import time
 import uuid
 from pathlib import Path
 
@@ -12,15 +16,221 @@ from ..models.pdf_project import PDFProject, PDFFile, PDFOperation
 from ..core.security import get_current_active_user
 from ..services.pdf_service import PDFService
 from ..core.config import settings
+from ..utils.file_utils import clean_filename
+from ..utils.downloads import CACHE_POLICIES, ContentFileResponse, content_disposition
+from ..services.image_extract import image_summary
+from ..services.rasterize import raster_summary
+from ..services.resumable_upload import resumable_uploads, parse_upload_metadata, OFFSET_CONTENT_TYPE, TUS_VERSION
+from ..services.search_index import search_index
+from ..services.sprites import SPRITE_NAME
+from ..services.text_extract import text_summary
+from ..services.thumbnail_queue import thumbnail_queue, PRIORITY_PROJECT, PRIORITY_VISIBLE
+from ..services.thumbnails import THUMBNAIL_KEY, THUMBNAIL_FORMATS, negotiate_format, variant_path
+from ..utils.streaming import stream_zip, stream_ndjson, iter_ndjson
 from ..utils.schemas import (
     PDFProjectCreate, PDFProjectResponse, PDFFileResponse,
     PDFOperationResponse, MergePDFRequest, CompressPDFRequest,
-    WatermarkRequest, SplitPDFRequest
+    WatermarkRequest, SplitPDFRequest, OptimizePDFRequest, RasterizeRequest, ExtractImagesRequest,
+    VirtualDocumentResponse
 )
 
 router = APIRouter()
 pdf_service = PDFService()
 
+def _get_user_project(db: Session, project_id: int, user: User) -> PDFProject:
+    """Obtém projeto do usuário ou retorna 404"""
+    project = db.query(PDFProject).filter(
+        PDFProject.id == project_id,
+        PDFProject.owner_id == user.id
+    ).first()
+    
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Projeto não encontrado"
+        )
+    return project
+
+def _get_user_file(db: Session, file_id: int, user: User) -> PDFFile:
+    """Obtém arquivo de um projeto do usuário ou retorna 404"""
+    pdf_file = db.query(PDFFile).join(PDFProject).filter(
+        PDFFile.id == file_id,
+        PDFProject.owner_id == user.id
+    ).first()
+    
+    if not pdf_file or not os.path.exists(pdf_file.file_path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Arquivo não encontrado"
+        )
+    return pdf_file
+
+def _register_uploads(db: Session, project_id: int, user: User, file_infos: List[dict], start_index: int = 0) -> List[PDFFile]:
+    """Cria os PDFFile dos arquivos ingeridos, na ordem dada, e agenda indexação e thumbnails"""
+    uploaded_files = []
+    
+    for file_info in file_infos:
+        # Criar registro no banco
+        db_file = PDFFile(
+            project_id=project_id,
+            original_filename=file_info["original_filename"],
+            stored_filename=file_info["stored_filename"],
+            file_path=file_info["file_path"],
+            file_size=file_info["file_size"],
+            content_hash=file_info["content_hash"],
+            page_count=file_info["metadata"].get("page_count", 0),
+            preview_path=file_info["preview_path"],
+            thumbnail_path=file_info["thumbnail_path"],
+            metadata=file_info["metadata"],
+            order_index=start_index + len(uploaded_files)
+        )
+        
+        db.add(db_file)
+        uploaded_files.append(db_file)
+    
+    db.commit()
+    
+    # Refresh para obter IDs
+    session_factory = sessionmaker(bind=db.get_bind())
+    for file in uploaded_files:
+        db.refresh(file)
+        search_index.enqueue(
+            file.id, file.file_path, file.content_hash, user.id, project_id, file.original_filename
+        )
+        # Prévia e thumbnail saem da fila; o upload não espera a renderização
+        thumbnail_queue.enqueue(file.id, file.file_path, session_factory, priority=PRIORITY_PROJECT)
+    
+    return uploaded_files
+
+def _get_user_upload(upload_id: str, user: User) -> dict:
+    """Obtém upload retomável do usuário ou retorna 404"""
+    upload = resumable_uploads.get(upload_id)
+    
+    if not upload or upload["owner_id"] != user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Upload não encontrado"
+        )
+    return upload
+
+def _tus_headers(upload: dict) -> dict:
+    return {
+        "Tus-Resumable": TUS_VERSION,
+        "Upload-Offset": str(upload["offset"]),
+        "Upload-Length": str(upload["length"]),
+        "Cache-Control": "no-store"
+    }
+
+# Status HTTP de cada falha do upload retomável, como no tus
+_UPLOAD_ERROR_STATUS = {
+    "not_found": status.HTTP_404_NOT_FOUND,
+    "offset": status.HTTP_409_CONFLICT,
+    "incomplete": status.HTTP_409_CONFLICT,
+    "locked": status.HTTP_423_LOCKED,
+    "length": status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+    "interrupted": status.HTTP_400_BAD_REQUEST,
+}
+
+def _upload_error(result: dict) -> HTTPException:
+    headers = {"Tus-Resumable": TUS_VERSION}
+    if "offset" in result:
+        headers["Upload-Offset"] = str(result["offset"])
+    return HTTPException(status_code=_UPLOAD_ERROR_STATUS[result["reason"]], detail=result["error"], headers=headers)
+
+def _negotiated_image(store_dir: str, name: str, accept: Optional[str], not_found: str) -> ContentFileResponse:
+    """Serve a variante de imagem pré-gerada que melhor atende o Accept, como recurso imutável"""
+    available = [
+        image_format for image_format in THUMBNAIL_FORMATS
+        if variant_path(store_dir, name, image_format).exists()
+    ]
+    image_format = negotiate_format(accept, available)
+    if image_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=not_found
+        )
+    
+    return ContentFileResponse(
+        path=variant_path(store_dir, name, image_format),
+        media_type=THUMBNAIL_FORMATS[image_format]["media_type"],
+        etag=f'"{name}.{image_format}"',
+        cache_control=CACHE_POLICIES["thumbnail"],
+        headers={"Vary": "Accept"}
+    )
+
+def _create_operation(
+    db: Session,
+    user: User,
+    operation_type: str,
+    pdf_file: PDFFile,
+    parameters: dict
+) -> PDFOperation:
+    """Registra uma operação sobre um arquivo no histórico"""
+    operation = PDFOperation(
+        user_id=user.id,
+        project_id=pdf_file.project_id,
+        operation_type=operation_type,
+        status="processing",
+        input_files=[pdf_file.file_path],
+        parameters=parameters
+    )
+    db.add(operation)
+    db.commit()
+    db.refresh(operation)
+    return operation
+
+def _complete_operation(db: Session, operation: PDFOperation, result: dict, output_files: List[str]) -> None:
+    """Atualiza a operação com o resultado do serviço, retornando 500 em caso de erro"""
+    if not result["success"]:
+        operation.status = "error"
+        operation.error_message = result["error"]
+        db.commit()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=result["error"]
+        )
+    
+    operation.status = "completed"
+    operation.output_files = output_files
+    db.commit()
+
+def _output_url(path: str) -> str:
+    """URL de um arquivo gerado, servido pela montagem /outputs (nunca o caminho no servidor)"""
+    return "/outputs/" + Path(os.path.relpath(path, settings.OUTPUT_DIR)).as_posix()
+
+def _update_operation(session_factory: Callable[[], Session], operation_id: int, **values) -> None:
+    """Grava o resultado de uma operação em uma sessão própria"""
+    db = session_factory()
+    try:
+        db.query(PDFOperation).filter(PDFOperation.id == operation_id).update(values)
+        db.commit()
+    finally:
+        db.close()
+
+async def _stream_operation(
+    session_factory: Callable[[], Session],
+    operation_id: int,
+    items: AsyncIterator[dict]
+) -> AsyncIterator[dict]:
+    """Repassa os itens gerados por uma operação em streaming, registrando o resultado ao final
+    
+    A resposta já começou quando um erro acontece, então ele só pode ficar no histórico.
+    O corpo é enviado depois que a sessão da requisição foi fechada (as dependências
+    com yield terminam antes), por isso o resultado vai por uma sessão nova.
+    """
+    output_files = []
+    try:
+        async for item in items:
+            # Itens com erro (uma imagem ilegível, por exemplo) não geram arquivo
+            if "output_path" in item:
+                output_files.append(item["output_path"])
+            yield item
+    except Exception as e:
+        _update_operation(session_factory, operation_id, status="error", error_message=str(e))
+        raise
+    
+    _update_operation(session_factory, operation_id, status="completed", output_files=output_files)
+
 @router.post("/projects/", response_model=PDFProjectResponse)
 async def create_project(
     project: PDFProjectCreate,
@@ -75,11 +285,18 @@ async def get_project(
 @router.post("/projects/{project_id}/upload", response_model=List[PDFFileResponse])
 async def upload_files(
     project_id: int,
+    response: Response,
     files: List[UploadFile] = File(...),
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
 ):
-    """Upload de arquivos PDF para um projeto"""
+    """Upload de arquivos PDF para um projeto
+    
+    Os arquivos são processados em paralelo (até UPLOAD_CONCURRENCY por vez) e
+    cada falha fica isolada: os demais são gravados normalmente, a resposta
+    vem com status 207 e os erros no cabeçalho X-Upload-Errors. O order_index
+    segue a ordem do envio, não a ordem de conclusão.
+    """
     # Verificar se o projeto existe e pertence ao usuário
     project = db.query(PDFProject).filter(
         PDFProject.id == project_id,
@@ -99,51 +316,200 @@ async def upload_files(
             detail=f"Máximo de {settings.MAX_FILES_PER_UPLOAD} arquivos por upload"
         )
     
-    uploaded_files = []
+    semaphore = asyncio.Semaphore(max(1, settings.UPLOAD_CONCURRENCY))
     
-    for file in files:
-        # Validar extensão
-        if not file.filename.lower().endswith('.pdf'):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Arquivo {file.filename} não é um PDF válido"
-            )
-        
-        # Validar tamanho
-        content = await file.read()
-        if len(content) > settings.MAX_FILE_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Arquivo {file.filename} excede o tamanho máximo"
-            )
-        
-        # Salvar arquivo
-        file_info = await pdf_service.save_uploaded_file(content, file.filename)
-        
-        # Criar registro no banco
-        db_file = PDFFile(
-            project_id=project_id,
-            original_filename=file_info["original_filename"],
-            stored_filename=file_info["stored_filename"],
-            file_path=file_info["file_path"],
-            file_size=file_info["file_size"],
-            page_count=file_info["metadata"].get("page_count", 0),
-            thumbnail_path=file_info["thumbnail_path"],
-            metadata=file_info["metadata"],
-            order_index=len(uploaded_files)
+    async def ingest(file: UploadFile) -> dict:
+        async with semaphore:
+            # Validar extensão
+            if not file.filename.lower().endswith('.pdf'):
+                return {"success": False, "error": f"Arquivo {file.filename} não é um PDF válido"}
+            
+            # Validar tamanho
+            content = await file.read()
+            if len(content) > settings.MAX_FILE_SIZE:
+                return {"success": False, "error": f"Arquivo {file.filename} excede o tamanho máximo"}
+            
+            # Salvar arquivo; em caso de erro o serviço já removeu o que gravou
+            try:
+                return {"success": True, "file_info": await pdf_service.save_uploaded_file(content, file.filename)}
+            except Exception as e:
+                return {"success": False, "error": str(e)}
+    
+    # gather devolve os resultados na ordem do envio
+    results = await asyncio.gather(*(ingest(file) for file in files))
+    
+    errors = [
+        {"index": index, "filename": file.filename, "error": result["error"]}
+        for index, (file, result) in enumerate(zip(files, results)) if not result["success"]
+    ]
+    if len(errors) == len(files):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="; ".join(error["error"] for error in errors)
         )
-        
-        db.add(db_file)
-        uploaded_files.append(db_file)
     
-    db.commit()
+    uploaded_files = _register_uploads(
+        db, project_id, current_user, [result["file_info"] for result in results if result["success"]]
+    )
     
-    # Refresh para obter IDs
-    for file in uploaded_files:
-        db.refresh(file)
+    if errors:
+        response.status_code = status.HTTP_207_MULTI_STATUS
+        response.headers["X-Upload-Errors"] = json.dumps(errors)
     
     return uploaded_files
 
+@router.post("/projects/{project_id}/uploads", status_code=status.HTTP_201_CREATED)
+async def create_resumable_upload(
+    project_id: int,
+    request: Request,
+    upload_length: int = Header(...),
+    upload_metadata: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Cria um upload retomável (POST do tus)
+    
+    O tamanho final vem em Upload-Length e o nome em Upload-Metadata
+    ("filename <base64>"). Os blocos são enviados por PATCH na URL devolvida
+    em Location; HEAD informa o offset para retomar e /finalize cria o arquivo.
+    """
+    _get_user_project(db, project_id, current_user)
+    
+    try:
+        filename = parse_upload_metadata(upload_metadata).get("filename", "")
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    if not filename.lower().endswith('.pdf'):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Arquivo {filename} não é um PDF válido"
+        )
+    if upload_length < 0 or upload_length > settings.RESUMABLE_MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Arquivo {filename} excede o tamanho máximo"
+        )
+    
+    upload = await run_in_threadpool(resumable_uploads.create, current_user.id, project_id, filename, upload_length)
+    
+    return JSONResponse(
+        status_code=status.HTTP_201_CREATED,
+        content={"upload_id": upload["upload_id"], "offset": upload["offset"], "length": upload["length"]},
+        headers={
+            "Location": str(request.url_for("get_upload_offset", upload_id=upload["upload_id"])),
+            **_tus_headers(upload)
+        }
+    )
+
+@router.head("/uploads/{upload_id}")
+async def get_upload_offset(
+    upload_id: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Offset atual do upload retomável (HEAD do tus): o cliente retoma a partir dele"""
+    upload = _get_user_upload(upload_id, current_user)
+    return Response(status_code=status.HTTP_200_OK, headers=_tus_headers(upload))
+
+@router.patch("/uploads/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(...),
+    content_type: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Grava o corpo da requisição a partir de Upload-Offset (PATCH do tus)"""
+    _get_user_upload(upload_id, current_user)
+    
+    if (content_type or "").split(";")[0].strip().lower() != OFFSET_CONTENT_TYPE:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"Content-Type deve ser {OFFSET_CONTENT_TYPE}"
+        )
+    
+    # O corpo vai direto para o arquivo, sem passar inteiro pela memória
+    result = await resumable_uploads.append(upload_id, upload_offset, request.stream())
+    if not result["success"]:
+        raise _upload_error(result)
+    
+    return Response(
+        status_code=status.HTTP_204_NO_CONTENT,
+        headers={"Tus-Resumable": TUS_VERSION, "Upload-Offset": str(result["offset"])}
+    )
+
+@router.delete("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_resumable_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Descarta um upload retomável e o que já foi enviado"""
+    _get_user_upload(upload_id, current_user)
+    
+    if not await run_in_threadpool(resumable_uploads.delete, upload_id):
+        raise _upload_error({"reason": "locked", "error": "Upload está recebendo um bloco"})
+    
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers={"Tus-Resumable": TUS_VERSION})
+
+@router.post("/uploads/{upload_id}/finalize", response_model=PDFFileResponse)
+async def finalize_resumable_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Conclui o upload retomável e o passa pelo mesmo pipeline do upload comum
+    
+    O arquivo é movido para o diretório de uploads e o hash calculado durante a
+    transferência é aproveitado; o PDF entra no fim do projeto.
+    """
+    upload = _get_user_upload(upload_id, current_user)
+    project = _get_user_project(db, upload["project_id"], current_user)
+    
+    file_path = pdf_service.upload_path(upload["filename"])
+    result = await run_in_threadpool(resumable_uploads.finish, upload_id, file_path)
+    if not result["success"]:
+        raise _upload_error(result)
+    
+    try:
+        file_info = await pdf_service.ingest_stored_file(file_path, result["filename"], result["content_hash"])
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    start_index = db.query(PDFFile).filter(PDFFile.project_id == project.id).count()
+    return _register_uploads(db, project.id, current_user, [file_info], start_index)[0]
+
+@router.get("/projects/{project_id}/files", response_model=List[PDFFileResponse])
+async def list_project_files(
+    project_id: int,
+    visible: Optional[str] = Query(None, description="IDs dos arquivos na tela, ex.: 4,5,6"),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Arquivos do projeto na ordem atual, com a situação da prévia e da thumbnail
+    
+    Thumbnails ainda pendentes do projeto passam à frente na fila; as dos
+    arquivos em visible vão para o topo.
+    """
+    _get_user_project(db, project_id, current_user)
+    
+    try:
+        visible_ids = {int(file_id) for file_id in visible.split(",") if file_id.strip()} if visible else set()
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="visible deve ser uma lista de IDs separados por vírgula"
+        )
+    
+    pdf_files = db.query(PDFFile).filter(
+        PDFFile.project_id == project_id
+    ).order_by(PDFFile.order_index).all()
+    
+    pending = [pdf_file.id for pdf_file in pdf_files if not pdf_file.thumbnail_path]
+    thumbnail_queue.prioritize(pending, PRIORITY_PROJECT)
+    thumbnail_queue.prioritize(visible_ids.intersection(pending), PRIORITY_VISIBLE)
+    
+    return pdf_files
+
 @router.put("/projects/{project_id}/reorder")
 async def reorder_files(
     project_id: int,
@@ -209,7 +575,13 @@ async def merge_project_pdfs(
         project_id=project_id,
         operation_type="merge",
         status="processing",
-        parameters={"output_filename": request.output_filename}
+        parameters={
+            "output_filename": request.output_filename,
+            "parallel": request.parallel,
+            "deduplicate": request.deduplicate,
+            "optimize": request.optimize,
+            "linearize": request.linearize
+        }
     )
     db.add(operation)
     db.commit()
@@ -217,7 +589,14 @@ async def merge_project_pdfs(
     
     try:
         # Mesclar PDFs
-        result = await pdf_service.merge_pdfs(pdf_files, request.output_filename)
+        result = await pdf_service.merge_pdfs(
+            pdf_files,
+            request.output_filename,
+            parallel=request.parallel,
+            deduplicate=request.deduplicate,
+            optimize=request.optimize,
+            linearize=request.linearize
+        )
         
         if result["success"]:
             # Atualizar projeto
@@ -235,6 +614,10 @@ async def merge_project_pdfs(
                 "message": "PDFs mesclados com sucesso",
                 "output_path": result["output_path"],
                 "total_pages": result["total_pages"],
+                "file_size": result["file_size"],
+                "bytes_saved": result["bytes_saved"],
+                "optimization": result.get("optimization"),
+                "linearization": result.get("linearization"),
                 "operation_id": operation.id
             }
         else:
@@ -280,12 +663,209 @@ async def download_project_output(
             detail="Arquivo não existe no sistema"
         )
     
-    return FileResponse(
+    # Com Range e ETag o visualizador busca só as páginas que exibe e revalida com 304
+    return ContentFileResponse(
         path=project.output_path,
         filename=project.output_filename,
-        media_type="application/pdf"
+        media_type="application/pdf",
+        cache_control=CACHE_POLICIES["output"]
+    )
+
+@router.get("/projects/{project_id}/virtual", response_model=VirtualDocumentResponse)
+async def get_virtual_document(
+    project_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Mapa de páginas do documento mesclado virtual do projeto"""
+    _get_user_project(db, project_id, current_user)
+    
+    pdf_files = db.query(PDFFile).filter(
+        PDFFile.project_id == project_id
+    ).order_by(PDFFile.order_index).all()
+    
+    # Arquivos sem page_count gravado são abertos para contar as páginas: fora do event loop
+    virtual_doc = await run_in_threadpool(pdf_service.build_virtual_document, pdf_files)
+    
+    return {
+        "project_id": project_id,
+        "total_pages": virtual_doc["total_pages"],
+        "files": [
+            {
+                "file_id": entry["file"].id,
+                "original_filename": entry["file"].original_filename,
+                "first_page": entry["first_page"],
+                "page_count": entry["page_count"]
+            }
+            for entry in virtual_doc["entries"]
+        ]
+    }
+
+@router.get("/projects/{project_id}/virtual/pages/{page_number}")
+async def get_virtual_page(
+    project_id: int,
+    page_number: int,
+    format: str = Query("png", pattern="^(png|pdf)$"),
+    dpi: int = Query(settings.PREVIEW_DPI, ge=36, le=300),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Serve uma página do documento mesclado virtual sob demanda"""
+    _get_user_project(db, project_id, current_user)
+    
+    pdf_files = db.query(PDFFile).filter(
+        PDFFile.project_id == project_id
+    ).order_by(PDFFile.order_index).all()
+    
+    virtual_doc = await run_in_threadpool(pdf_service.build_virtual_document, pdf_files)
+    
+    if not 1 <= page_number <= virtual_doc["total_pages"]:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Página não encontrada no documento virtual"
+        )
+    
+    result = await pdf_service.get_virtual_page(virtual_doc, page_number, format, dpi)
+    
+    if not result["success"]:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=result["error"]
+        )
+    
+    return Response(
+        content=result["content"],
+        media_type=result["media_type"],
+        headers={
+            "X-Source-File-Id": str(result["source_file_id"]),
+            "X-Source-Page": str(result["source_page"]),
+            "X-Total-Pages": str(result["total_pages"])
+        }
+    )
+
+@router.get("/files/{file_id}/download")
+async def download_file(
+    file_id: int,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Download do arquivo enviado, com suporte a Range e GET condicional"""
+    pdf_file = _get_user_file(db, file_id, current_user)
+    
+    return ContentFileResponse(
+        path=pdf_file.file_path,
+        filename=pdf_file.original_filename,
+        media_type="application/pdf",
+        content_disposition_type="inline",
+        cache_control=CACHE_POLICIES["upload"],
+        # Hash calculado na ingestão: identifica o conteúdo sem reler o arquivo
+        etag=f'"{pdf_file.content_hash}"' if pdf_file.content_hash else None
+    )
+
+@router.get("/thumbnails/{key}")
+async def get_thumbnail(key: str, accept: Optional[str] = Header(None)):
+    """Serve a thumbnail no melhor formato aceito pelo cliente (AVIF, WebP ou JPEG)
+    
+    A chave é o hash da imagem, então a resposta é imutável e o navegador não
+    revalida. Sem autenticação para poder ser usada direto em <img>: a chave só
+    é conhecida por quem lista os arquivos do projeto.
+    """
+    if not THUMBNAIL_KEY.match(key):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Thumbnail não encontrada"
+        )
+    return _negotiated_image(settings.THUMBNAIL_DIR, key, accept, "Thumbnail não encontrada")
+
+@router.get("/projects/{project_id}/sprite")
+async def get_project_sprite(
+    project_id: int,
+    kind: str = Query("files", pattern="^(files|pages)$", description="files (uma thumbnail por arquivo) ou pages"),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Todas as thumbnails do projeto em uma sprite, com o mapa de coordenadas
+    
+    Na primeira chamada após uma mudança nos arquivos a sprite é montada em
+    segundo plano e a resposta é 202; basta repetir a chamada.
+    """
+    _get_user_project(db, project_id, current_user)
+    
+    pdf_files = db.query(PDFFile).filter(PDFFile.project_id == project_id).all()
+    result = await pdf_service.get_sprite(project_id, kind, pdf_files)
+    
+    if result["status"] == "building":
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=result, headers={"Retry-After": "1"})
+    
+    for sheet in result["sheets"]:
+        sheet["url"] = f"/api/pdf/sprites/{sheet['name']}"
+    return result
+
+@router.get("/sprites/{name}")
+async def get_sprite_sheet(name: str, accept: Optional[str] = Header(None)):
+    """Folha de sprite em WebP ou JPEG; o nome traz a assinatura do conjunto, então é imutável"""
+    if not SPRITE_NAME.match(name):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Sprite não encontrada"
+        )
+    return _negotiated_image(settings.SPRITE_DIR, name, accept, "Sprite não encontrada")
+
+@router.get("/files/{file_id}/extract")
+async def extract_pages(
+    file_id: int,
+    pages: str = Query(..., description="Faixas de páginas, ex.: 1-3,5,8-"),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Extrai páginas de um arquivo em memória, sem gravar no diretório de saída"""
+    pdf_file = _get_user_file(db, file_id, current_user)
+    
+    try:
+        content = await run_in_threadpool(pdf_service.extract_pages, pdf_file.file_path, pages)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    filename = f"{Path(pdf_file.original_filename).stem}_{clean_filename(pages).replace(',', '_')}.pdf"
+    return Response(
+        content=content,
+        media_type="application/pdf",
+        headers={"Content-Disposition": content_disposition(filename, "inline")}
     )
 
+@router.get("/files/{file_id}/text")
+async def extract_text(
+    file_id: int,
+    mode: str = Query("text", pattern="^(text|blocks|words)$", description="text, blocks ou words"),
+    pages: Optional[str] = Query(None, description="Faixas de páginas, ex.: 1-3,5,8-"),
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Extrai o texto nativo do arquivo como NDJSON, uma linha por página à medida que fica pronta"""
+    pdf_file = _get_user_file(db, file_id, current_user)
+    
+    try:
+        page_indexes = await run_in_threadpool(pdf_service.select_pages, pdf_file.file_path, pages)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    # Gerador síncrono: o Starlette puxa uma página por vez em thread, no ritmo do cliente
+    def lines():
+        page_count = characters = 0
+        for page in pdf_service.iter_text(pdf_file.file_path, page_indexes, mode):
+            page_count += 1
+            characters += page["characters"]
+            yield page
+        yield {"summary": text_summary(page_count, characters)}
+    
+    return StreamingResponse(iter_ndjson(lines()), media_type="application/x-ndjson")
+
 @router.post("/compress")
 async def compress_pdf(
     request: CompressPDFRequest,
@@ -293,8 +873,68 @@ async def compress_pdf(
     db: Session = Depends(get_db)
 ):
     """Comprime um PDF"""
-    # Implementar compressão de PDF
-    pass
+    pdf_file = _get_user_file(db, request.input_file_id, current_user)
+    output_path = Path(settings.OUTPUT_DIR) / clean_filename(request.output_filename)
+    
+    operation = _create_operation(db, current_user, "compress", pdf_file, {
+        "quality": request.quality,
+        "target_dpi": request.target_dpi,
+        "target_size": request.target_size,
+        "linearize": request.linearize,
+        "output_filename": request.output_filename
+    })
+    
+    result = await pdf_service.compress_pdf(
+        pdf_file.file_path,
+        str(output_path),
+        quality=request.quality,
+        target_dpi=request.target_dpi,
+        target_size=request.target_size,
+        linearize=request.linearize
+    )
+    _complete_operation(db, operation, result, [str(output_path)])
+    
+    response = {
+        "message": "PDF comprimido com sucesso",
+        "output_path": str(output_path),
+        "operation_id": operation.id
+    }
+    response.update({key: value for key, value in result.items() if key != "success"})
+    return response
+
+@router.post("/optimize")
+async def optimize_pdf(
+    request: OptimizePDFRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Otimiza um PDF: subconjunto de fontes, poda de recursos e object streams"""
+    pdf_file = _get_user_file(db, request.input_file_id, current_user)
+    output_path = Path(settings.OUTPUT_DIR) / clean_filename(request.output_filename)
+    
+    operation = _create_operation(db, current_user, "optimize", pdf_file, {
+        "subset_fonts": request.subset_fonts,
+        "prune_resources": request.prune_resources,
+        "output_filename": request.output_filename
+    })
+    
+    result = await pdf_service.optimize_pdf(
+        pdf_file.file_path,
+        str(output_path),
+        subset_fonts=request.subset_fonts,
+        prune_resources=request.prune_resources
+    )
+    _complete_operation(db, operation, result, [str(output_path)])
+    
+    return {
+        "message": "PDF otimizado com sucesso",
+        "output_path": str(output_path),
+        "original_size": result["original_size"],
+        "optimized_size": result["optimized_size"],
+        "bytes_saved": result["bytes_saved"],
+        "steps": result["steps"],
+        "operation_id": operation.id
+    }
 
 @router.post("/watermark")
 async def add_watermark(
@@ -303,8 +943,39 @@ async def add_watermark(
     db: Session = Depends(get_db)
 ):
     """Adiciona marca d'água a um PDF"""
-    # Implementar marca d'água
-    pass
+    pdf_file = _get_user_file(db, request.input_file_id, current_user)
+    output_path = Path(settings.OUTPUT_DIR) / clean_filename(request.output_filename)
+    
+    operation = _create_operation(db, current_user, "watermark", pdf_file, {
+        "watermark_text": request.watermark_text,
+        "opacity": request.opacity,
+        "font_size": request.font_size,
+        "rotation": request.rotation,
+        "incremental": request.incremental,
+        "linearize": request.linearize,
+        "output_filename": request.output_filename
+    })
+    
+    result = await pdf_service.add_watermark(
+        pdf_file.file_path,
+        request.watermark_text,
+        str(output_path),
+        opacity=request.opacity,
+        font_size=request.font_size,
+        rotation=request.rotation,
+        incremental=request.incremental,
+        optimize=request.optimize,
+        linearize=request.linearize
+    )
+    _complete_operation(db, operation, result, [str(output_path)])
+    
+    response = {
+        "message": "Marca d'água adicionada com sucesso",
+        "output_path": str(output_path),
+        "operation_id": operation.id
+    }
+    response.update({key: value for key, value in result.items() if key != "success"})
+    return response
 
 @router.post("/split")
 async def split_pdf(
@@ -313,8 +984,234 @@ async def split_pdf(
     db: Session = Depends(get_db)
 ):
     """Divide um PDF em múltiplos arquivos"""
-    # Implementar divisão de PDF
-    pass
+    pdf_file = _get_user_file(db, request.input_file_id, current_user)
+    # Lido antes do commit da operação, que expira o pdf_file
+    file_path = pdf_file.file_path
+    output_prefix = clean_filename(request.output_prefix)
+    
+    # Planejar antes de responder: parâmetros inválidos viram 400, não um ZIP truncado
+    try:
+        parts = await run_in_threadpool(
+            pdf_service.plan_split,
+            file_path,
+            mode=request.mode,
+            pages_per_file=request.pages_per_file,
+            ranges=request.ranges,
+            bookmark_level=request.bookmark_level,
+            max_size=request.max_size
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    operation = _create_operation(db, current_user, "split", pdf_file, {
+        "mode": request.mode,
+        "pages_per_file": request.pages_per_file,
+        "ranges": request.ranges,
+        "bookmark_level": request.bookmark_level,
+        "max_size": request.max_size,
+        "output_prefix": output_prefix
+    })
+    # Diretório por execução: divisões simultâneas com o mesmo prefixo não se sobrescrevem
+    output_dir = os.path.join(settings.OUTPUT_DIR, f"{output_prefix}_{uuid.uuid4().hex}")
+    
+    if request.archive:
+        session_factory, operation_id = sessionmaker(bind=db.get_bind()), operation.id
+        
+        async def entries():
+            split_parts = pdf_service.iter_split(file_path, parts, output_dir, output_prefix)
+            async for part in _stream_operation(session_factory, operation_id, split_parts):
+                yield os.path.basename(part["output_path"]), part["output_path"]
+        
+        return StreamingResponse(
+            stream_zip(entries()),
+            media_type="application/zip",
+            headers={"Content-Disposition": content_disposition(f"{output_prefix}.zip")}
+        )
+    
+    written = []
+    try:
+        async for part in pdf_service.iter_split(file_path, parts, output_dir, output_prefix):
+            written.append(part)
+        result = {"success": True}
+    except Exception as e:
+        result = {"success": False, "error": str(e)}
+    _complete_operation(db, operation, result, [part["output_path"] for part in written])
+    
+    return {
+        "message": "PDF dividido com sucesso",
+        "operation_id": operation.id,
+        "total_files": len(written),
+        "parts": written
+    }
+
+@router.post("/rasterize")
+async def rasterize_pdf(
+    request: RasterizeRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Exporta páginas do PDF como imagens (ZIP ou manifesto NDJSON)"""
+    pdf_file = _get_user_file(db, request.input_file_id, current_user)
+    # Lido antes do commit da operação: o corpo é gerado com a sessão já fechada
+    file_path = pdf_file.file_path
+    output_prefix = clean_filename(request.output_prefix)
+    
+    try:
+        page_indexes = await run_in_threadpool(pdf_service.select_pages, file_path, request.pages)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    operation = _create_operation(db, current_user, "rasterize", pdf_file, {
+        "pages": request.pages,
+        "dpi": request.dpi,
+        "format": request.format,
+        "quality": request.quality,
+        "output": request.output
+    })
+    output_dir = os.path.join(settings.OUTPUT_DIR, f"{output_prefix}_{uuid.uuid4().hex}")
+    
+    session_factory, operation_id = sessionmaker(bind=db.get_bind()), operation.id
+    
+    def rendered_pages():
+        return _stream_operation(session_factory, operation_id, pdf_service.iter_rasterize(
+            file_path, page_indexes, output_dir,
+            dpi=request.dpi, image_format=request.format, quality=request.quality
+        ))
+    
+    if request.output == "ndjson":
+        async def lines():
+            start = time.perf_counter()
+            count = 0
+            async for page in rendered_pages():
+                count += 1
+                entry = {key: value for key, value in page.items() if key != "output_path"}
+                entry["url"] = _output_url(page["output_path"])
+                yield entry
+            yield {"summary": raster_summary(count, time.perf_counter() - start)}
+        
+        return StreamingResponse(stream_ndjson(lines()), media_type="application/x-ndjson")
+    
+    async def entries():
+        start = time.perf_counter()
+        manifest = []
+        async for page in rendered_pages():
+            arcname = os.path.basename(page["output_path"])
+            manifest.append({key: value for key, value in page.items() if key != "output_path"})
+            manifest[-1]["filename"] = arcname
+            yield arcname, page["output_path"]
+        
+        summary = raster_summary(len(manifest), time.perf_counter() - start)
+        yield "manifest.json", json.dumps({"pages": manifest, **summary}, indent=2).encode("utf-8")
+    
+    return StreamingResponse(
+        stream_zip(entries()),
+        media_type="application/zip",
+        headers={"Content-Disposition": content_disposition(f"{output_prefix}.zip")}
+    )
+
+@router.post("/extract-images")
+async def extract_images(
+    request: ExtractImagesRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Extrai as imagens embutidas no PDF sem recodificá-las (ZIP ou manifesto NDJSON)"""
+    pdf_file = _get_user_file(db, request.input_file_id, current_user)
+    # Lido antes do commit da operação: o corpo é gerado com a sessão já fechada
+    file_path = pdf_file.file_path
+    output_prefix = clean_filename(request.output_prefix)
+    
+    try:
+        page_indexes = await run_in_threadpool(pdf_service.select_pages, file_path, request.pages)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    operation = _create_operation(db, current_user, "extract_images", pdf_file, {
+        "pages": request.pages,
+        "output": request.output
+    })
+    output_dir = os.path.join(settings.OUTPUT_DIR, f"{output_prefix}_{uuid.uuid4().hex}")
+    
+    session_factory, operation_id = sessionmaker(bind=db.get_bind()), operation.id
+    
+    def extracted_images():
+        return _stream_operation(session_factory, operation_id, pdf_service.iter_extract_images(
+            file_path, page_indexes, output_dir
+        ))
+    
+    if request.output == "ndjson":
+        async def lines():
+            images = []
+            async for image in extracted_images():
+                images.append(image)
+                entry = {key: value for key, value in image.items() if key not in ("output_path", "globals_path")}
+                if "output_path" in image:
+                    entry["url"] = _output_url(image["output_path"])
+                if "globals_path" in image:
+                    entry["globals_url"] = _output_url(image["globals_path"])
+                yield entry
+            yield {"summary": image_summary(images)}
+        
+        return StreamingResponse(stream_ndjson(lines()), media_type="application/x-ndjson")
+    
+    async def entries():
+        manifest = []
+        sent_globals = set()
+        async for image in extracted_images():
+            if "error" in image:
+                manifest.append(image)
+                continue
+            
+            # Segmentos globais JBIG2 vão uma vez, antes da primeira imagem que os usa
+            globals_path = image.get("globals_path")
+            if globals_path and globals_path not in sent_globals:
+                sent_globals.add(globals_path)
+                yield os.path.basename(globals_path), globals_path
+            
+            arcname = os.path.basename(image["output_path"])
+            entry = {key: value for key, value in image.items() if key not in ("output_path", "globals_path")}
+            entry["filename"] = arcname
+            if globals_path:
+                entry["globals_filename"] = os.path.basename(globals_path)
+            manifest.append(entry)
+            yield arcname, image["output_path"]
+        
+        summary = image_summary(manifest)
+        yield "manifest.json", json.dumps({"images": manifest, **summary}, indent=2).encode("utf-8")
+    
+    return StreamingResponse(
+        stream_zip(entries()),
+        media_type="application/zip",
+        headers={"Content-Disposition": content_disposition(f"{output_prefix}.zip")}
+    )
+
+@router.get("/search")
+async def search_documents(
+    q: str = Query(..., min_length=1, description="Termos a buscar no texto dos documentos"),
+    project_id: Optional[int] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Busca textual nos documentos do usuário, com trechos ordenados por relevância"""
+    try:
+        return await run_in_threadpool(
+            search_index.search, q, current_user.id, project_id=project_id, limit=limit, offset=offset
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
 
 @router.get("/operations/", response_model=List[PDFOperationResponse])
 async def list_operations(
@@ -37,21 +37,52 @@ class Settings(BaseSettings):
     OUTPUT_DIR: str = str(BASE_DIR / "outputs")
     TEMP_DIR: str = str(BASE_DIR / "temp")
     STATIC_DIR: str = str(BASE_DIR / "static")
+    THUMBNAIL_DIR: str = str(BASE_DIR / "thumbnails")  # Variantes por hash do conteúdo (WebP/AVIF/JPEG)
+    SPRITE_DIR: str = str(BASE_DIR / "thumbnails" / "sprites")
     
     # Configurações de upload
     MAX_FILE_SIZE: int = 50 * 1024 * 1024  # 50MB
     ALLOWED_EXTENSIONS: List[str] = [".pdf"]
     MAX_FILES_PER_UPLOAD: int = 20
+    UPLOAD_CONCURRENCY: int = 4  # Arquivos do mesmo upload processados ao mesmo tempo
+    
+    # Upload retomável (estilo tus): blocos gravados direto no arquivo final
+    RESUMABLE_UPLOAD_DIR: str = str(BASE_DIR / "temp" / "resumable")
+    RESUMABLE_MAX_FILE_SIZE: int = 2 * 1024 * 1024 * 1024  # 2GB
+    RESUMABLE_UPLOAD_TTL: int = 24 * 60 * 60  # Uploads parados por mais tempo são descartados
     
     # Configurações de PDF
     PDF_QUALITY: int = 85
     THUMBNAIL_SIZE: tuple = (200, 280)
+    THUMBNAIL_PREVIEW_SIZE: tuple = (50, 70)  # Prévia gerada no upload, antes da thumbnail completa
     PREVIEW_DPI: int = 150
+    SPRITE_COLUMNS: int = 10
+    SPRITE_PAGE_TILE: tuple = (100, 140)  # Tiles da sprite de páginas; a de arquivos usa THUMBNAIL_SIZE
+    COMPRESS_TARGET_DPI: int = 150
+    COMPRESS_MIN_IMAGE_BYTES: int = 10 * 1024  # Imagens menores não compensam recodificar
+    LINEARIZE_OUTPUTS: bool = False  # Padrão da opção linearize em merge, compress e watermark
+    INGEST_NORMALIZE: bool = False  # Reescrever uploads quebrados ou com atualizações incrementais
+    INGEST_OBJECT_STREAMS: bool = False  # Menores, mas o PyPDF2 os lê 2-4x mais devagar
+    
+    # Configurações de processamento paralelo
+    PDF_WORKERS: int = os.cpu_count() or 2
+    PARALLEL_MERGE_MIN_FILES: int = 50
+    MERGE_DEDUPLICATE: bool = True
+    WATERMARK_PARALLEL_MIN_PAGES: int = 500
+    DOCUMENT_CACHE_SIZE: int = 16  # Documentos abertos mantidos por processo
+    DOCUMENT_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    RASTER_BATCH_PAGES: int = 8  # Páginas por tarefa enviada ao pool
+    THUMBNAIL_WORKERS: int = 2  # Thumbnails simultâneas no pool; o restante fica livre para as operações
     
     # Configurações de OCR
     OCR_ENABLED: bool = True
     OCR_LANGUAGE: str = "por+eng"
     
+    # Configurações de busca
+    SEARCH_INDEX_PATH: str = str(BASE_DIR / "search_index.db")  # SQLite com FTS5, separado do banco principal
+    SEARCH_INDEX_BATCH_PAGES: int = 500  # Páginas por transação do indexador
+    SEARCH_INDEX_OCR: bool = True  # OCR das páginas sem texto nativo (requer OCR_ENABLED)
+    
     # Configurações de Redis (para cache e filas)
     REDIS_URL: str = "redis://localhost:6379/0"
     
@@ -73,5 +104,5 @@ class Settings(BaseSettings):
 settings = Settings()
 
 # Criar diretórios necessários
-for directory in [settings.UPLOAD_DIR, settings.OUTPUT_DIR, settings.TEMP_DIR, settings.STATIC_DIR]:
+for directory in [settings.UPLOAD_DIR, settings.OUTPUT_DIR, settings.TEMP_DIR, settings.STATIC_DIR, settings.THUMBNAIL_DIR, settings.SPRITE_DIR, settings.RESUMABLE_UPLOAD_DIR]:
     os.makedirs(directory, exist_ok=True)
\ No newline at end of file
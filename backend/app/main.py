@@ -1,11 +1,11 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, status, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from typing import List, Optional
 from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
 import os
 import uuid
 import shutil
@@ -17,8 +17,12 @@ from .core.config import settings
 from .core.security import get_current_user
 from .api import pdf_router, auth_router, user_router
 from .services.pdf_service import PDFService
-from .models.database import engine, Base
+from .services.document_cache import document_cache
+from .services.search_index import search_index
+from .services.thumbnail_queue import thumbnail_queue
+from .models.database import engine, Base, SessionLocal
 from .utils.logger import setup_logger
+from .utils.downloads import CACHE_POLICIES, ContentStaticFiles
 
 # Criar tabelas do banco de dados
 Base.metadata.create_all(bind=engine)
@@ -32,6 +36,20 @@ async def lifespan(app: FastAPI):
     logger.info("🚀 PDF Organizer API iniciada")
     logger.info(f"📁 Diretório de upload: {settings.UPLOAD_DIR}")
     logger.info(f"📁 Diretório de saída: {settings.OUTPUT_DIR}")
+    
+    # Trabalhos em segundo plano interrompidos pelo último encerramento
+    try:
+        requeued = await run_in_threadpool(thumbnail_queue.requeue_missing, SessionLocal)
+        logger.info(f"🖼️ Thumbnails reagendadas: {requeued}")
+    except Exception as e:
+        logger.error(f"Erro ao reagendar thumbnails: {str(e)}")
+    
+    try:
+        requeued = await run_in_threadpool(search_index.requeue_missing, SessionLocal)
+        logger.info(f"🔎 Arquivos reagendados para indexação: {requeued}")
+    except Exception as e:
+        logger.error(f"Erro ao reagendar indexação: {str(e)}")
+    
     yield
     # Shutdown
     logger.info("🛑 PDF Organizer API encerrada")
@@ -53,6 +71,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cabeçalhos lidos pelo cliente: upload retomável (tus) e erros por arquivo do upload
+    expose_headers=["Location", "Tus-Resumable", "Upload-Offset", "Upload-Length", "X-Upload-Errors"],
 )
 
 # Middleware de logging de requests
@@ -99,9 +119,9 @@ os.makedirs(settings.OUTPUT_DIR, exist_ok=True)
 os.makedirs(settings.TEMP_DIR, exist_ok=True)
 
 # Montar arquivos estáticos
-app.mount("/static", StaticFiles(directory="static"), name="static")
-app.mount("/uploads", StaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
-app.mount("/outputs", StaticFiles(directory=settings.OUTPUT_DIR), name="outputs")
+app.mount("/static", ContentStaticFiles(directory="static", cache_control=CACHE_POLICIES["static"]), name="static")
+app.mount("/uploads", ContentStaticFiles(directory=settings.UPLOAD_DIR, cache_control=CACHE_POLICIES["upload"]), name="uploads")
+app.mount("/outputs", ContentStaticFiles(directory=settings.OUTPUT_DIR, cache_control=CACHE_POLICIES["output"]), name="outputs")
 
 # Adicionar manipuladores de erro globais
 @app.exception_handler(RequestValidationError)
@@ -174,7 +194,8 @@ async def health_check():
     return {
         "status": "healthy",
         "version": "3.0.0",
-        "timestamp": str(datetime.utcnow())
+        "timestamp": str(datetime.utcnow()),
+        "document_cache": document_cache.stats()
     }
 
 
@@ -37,8 +37,10 @@ class PDFFile(Base):
     stored_filename = Column(String(255), nullable=False)
     file_path = Column(String(500), nullable=False)
     file_size = Column(Integer, nullable=False)
+    content_hash = Column(String(64), nullable=True, index=True)  # SHA-256 do conteúdo
     page_count = Column(Integer, nullable=True)
     order_index = Column(Integer, default=0)
+    preview_path = Column(String(500), nullable=True)  # Prévia em baixa resolução, até a thumbnail ficar pronta
     thumbnail_path = Column(String(500), nullable=True)
     metadata = Column(JSON, nullable=True)  # Metadados do PDF
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,150 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, List, Dict, Any, Tuple
+import fitz  # PyMuPDF
+
+from ..core.config import settings
+
+# (caminho, mtime em ns)
+CacheKey = Tuple[str, int]
+
+class DocumentCache:
+    """LRU de documentos PyMuPDF abertos, por processo
+    
+    Um fitz.Document não pode ser usado por duas threads ao mesmo tempo, então
+    o cache guarda apenas handles ociosos: borrow() retira um handle (ou abre
+    um novo se todos estiverem emprestados) e a devolução o recoloca no topo da
+    LRU. O limite de memória usa o tamanho do arquivo como estimativa.
+    """
+    
+    def __init__(self, max_documents: int, max_bytes: int):
+        self.max_documents = max_documents
+        self.max_bytes = max_bytes
+        self._reset()
+    
+    def _reset(self) -> None:
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._idle: "OrderedDict[CacheKey, List[fitz.Document]]" = OrderedDict()
+        self._sizes: Dict[CacheKey, int] = {}
+        self._idle_count = 0
+        self._idle_bytes = 0
+        self._borrowed = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def _check_process(self) -> None:
+        # Processo filho criado por fork (fora do pool do serviço, que usa forkserver):
+        # os handles herdados pertencem ao pai
+        if os.getpid() != self._pid:
+            self._reset()
+    
+    @contextmanager
+    def borrow(self, path: str) -> Iterator[fitz.Document]:
+        """Empresta um documento aberto; ele volta ao cache ao sair do bloco"""
+        self._check_process()
+        stat = os.stat(path)
+        key = (str(path), stat.st_mtime_ns)
+        
+        doc = None
+        with self._lock:
+            handles = self._idle.get(key)
+            if handles:
+                doc = handles.pop()
+                self._idle_count -= 1
+                self._idle_bytes -= self._sizes[key]
+                self.hits += 1
+            else:
+                self.misses += 1
+            self._borrowed += 1
+        
+        try:
+            if doc is None:
+                # Pelo caminho, o MuPDF lê sob demanda através do cache de páginas do
+                # sistema; abrir de um buffer exigiria uma cópia privada em bytes
+                doc = fitz.open(path)
+            yield doc
+        except Exception:
+            # Estado do documento incerto após erro: descartar o handle
+            if doc is not None:
+                doc.close()
+            doc = None
+            raise
+        finally:
+            with self._lock:
+                self._borrowed -= 1
+            if doc is not None:
+                self._release(key, stat.st_size, doc)
+    
+    def _release(self, key: CacheKey, size: int, doc: fitz.Document) -> None:
+        """Devolve o handle ao topo da LRU e descarta os excedentes"""
+        to_close = []
+        with self._lock:
+            # Versões anteriores do mesmo arquivo não serão mais pedidas
+            for stale in [k for k in self._idle if k[0] == key[0] and k != key]:
+                to_close.extend(self._drop(stale))
+            
+            self._idle.setdefault(key, []).append(doc)
+            self._idle.move_to_end(key)
+            self._sizes[key] = size
+            self._idle_count += 1
+            self._idle_bytes += size
+            
+            while self._idle and (
+                self._idle_count > self.max_documents or self._idle_bytes > self.max_bytes
+            ):
+                oldest = next(iter(self._idle))
+                to_close.extend(self._drop(oldest))
+        
+        for evicted in to_close:
+            evicted.close()
+    
+    def _drop(self, key: CacheKey) -> List[fitz.Document]:
+        """Remove todos os handles de uma chave (chamado com o lock adquirido)"""
+        handles = self._idle.pop(key)
+        size = self._sizes.pop(key)
+        self._idle_count -= len(handles)
+        self._idle_bytes -= size * len(handles)
+        self.evictions += len(handles)
+        return handles
+    
+    def invalidate(self, path: str) -> None:
+        """Fecha os handles ociosos de um arquivo (ex.: antes de removê-lo)"""
+        self._check_process()
+        with self._lock:
+            to_close = [handle for key in [k for k in self._idle if k[0] == str(path)] for handle in self._drop(key)]
+        for doc in to_close:
+            doc.close()
+    
+    def clear(self) -> None:
+        """Fecha todos os handles ociosos e zera as estatísticas"""
+        self._check_process()
+        with self._lock:
+            to_close = [doc for handles in self._idle.values() for doc in handles]
+            self._idle.clear()
+            self._sizes.clear()
+            self._idle_count = 0
+            self._idle_bytes = 0
+            self.hits = self.misses = self.evictions = 0
+        for doc in to_close:
+            doc.close()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Métricas do cache neste processo"""
+        self._check_process()
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / requests, 4) if requests else 0.0,
+                "idle_documents": self._idle_count,
+                "idle_bytes": self._idle_bytes,
+                "borrowed": self._borrowed
+            }
+
+document_cache = DocumentCache(settings.DOCUMENT_CACHE_SIZE, settings.DOCUMENT_CACHE_MAX_BYTES)
@@ -0,0 +1,303 @@
+import asyncio
+import zlib
+from concurrent.futures import Executor
+from io import BytesIO
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import fitz  # PyMuPDF
+from PIL import Image, ImageChops
+
+# Filtros que já são compactos para imagens bitonais; recomprimir só piora
+BILEVEL_FILTERS = ("/JBIG2Decode", "/CCITTFaxDecode")
+
+# Tolerância para considerar uma imagem RGB como tons de cinza
+GRAYSCALE_TOLERANCE = 8
+
+# Fração máxima de pixels intermediários para tratar a imagem como bitonal
+BILEVEL_MAX_MIDTONES = 0.005
+
+def collect_images(doc: fitz.Document, min_bytes: int = 0) -> List[Dict[str, Any]]:
+    """Lista as imagens únicas do documento com a maior resolução efetiva em que aparecem"""
+    images: Dict[int, Dict[str, Any]] = {}
+    
+    for page in doc:
+        for info in page.get_image_info(xrefs=True):
+            xref = info["xref"]
+            bbox = fitz.Rect(info["bbox"])
+            if xref <= 0 or bbox.is_empty:
+                continue
+            
+            # DPI efetivo = pixels / polegadas ocupadas na página
+            dpi = max(info["width"] / (bbox.width / 72), info["height"] / (bbox.height / 72))
+            
+            entry = images.get(xref)
+            if entry is None:
+                images[xref] = {
+                    "xref": xref,
+                    "width": info["width"],
+                    "height": info["height"],
+                    "dpi": dpi,
+                    "page": page.number + 1
+                }
+            elif dpi > entry["dpi"]:
+                entry["dpi"] = dpi
+    
+    candidates = []
+    for entry in images.values():
+        image_filter = doc.xref_get_key(entry["xref"], "Filter")[1]
+        if image_filter in BILEVEL_FILTERS or doc.xref_get_key(entry["xref"], "ImageMask")[1] == "true":
+            continue
+        
+        # Arrays /Decode não são aplicados aos JPEGs extraídos; manter essas imagens intactas
+        if doc.xref_get_key(entry["xref"], "Decode")[0] != "null":
+            continue
+        
+        entry["original_bytes"] = len(doc.xref_stream_raw(entry["xref"]))
+        if entry["original_bytes"] >= min_bytes:
+            candidates.append(entry)
+    
+    return candidates
+
+def _is_grayscale(img: Image.Image) -> bool:
+    """Verifica se os canais RGB são praticamente iguais"""
+    red, green, blue = img.split()
+    return (
+        ImageChops.difference(red, green).getextrema()[1] <= GRAYSCALE_TOLERANCE
+        and ImageChops.difference(green, blue).getextrema()[1] <= GRAYSCALE_TOLERANCE
+    )
+
+def _is_bilevel(img: Image.Image) -> bool:
+    """Verifica se a imagem em tons de cinza é essencialmente preto e branco"""
+    histogram = img.histogram()
+    midtones = sum(histogram[32:224])
+    return midtones <= BILEVEL_MAX_MIDTONES * img.width * img.height
+
+def _prepare_image(data: bytes, scale: float) -> Optional[Tuple[Image.Image, bool]]:
+    """Decodifica, classifica (cinza/bitonal) e reduz a imagem"""
+    img = Image.open(BytesIO(data))
+    img.load()
+    
+    if img.mode == "P":
+        img = img.convert("RGB")
+    if img.mode not in ("RGB", "L"):
+        return None
+    
+    if img.mode == "RGB" and _is_grayscale(img):
+        img = img.convert("L")
+    
+    # Classificar antes de reduzir: a interpolação cria tons intermediários
+    bilevel = img.mode == "L" and _is_bilevel(img)
+    
+    if scale < 1.0:
+        size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+        img = img.resize(size, Image.Resampling.LANCZOS)
+    
+    return img, bilevel
+
+def recompress_image(data: bytes, quality: int, scale: float = 1.0) -> Optional[Dict[str, Any]]:
+    """Reduz e recodifica uma imagem (executado no pool de processos)
+    
+    Retorna o novo stream com os parâmetros do dicionário PDF, ou None se a
+    imagem não puder ser tratada sem perder informação de cor.
+    """
+    prepared = _prepare_image(data, scale)
+    if prepared is None:
+        return None
+    return _encode_image(*prepared, quality)
+
+def sample_encoded_sizes(data: bytes, qualities: List[int], scale: float = 1.0) -> Optional[List[int]]:
+    """Decodifica a imagem uma vez e mede o tamanho codificado em cada qualidade"""
+    prepared = _prepare_image(data, scale)
+    if prepared is None:
+        return None
+    return [len(_encode_image(*prepared, quality)["data"]) for quality in qualities]
+
+def _encode_image(img: Image.Image, bilevel: bool, quality: int) -> Dict[str, Any]:
+    """Codifica a imagem preparada como JPEG ou, se bitonal, como Flate de 1 bit"""
+    if bilevel:
+        # 1 bit por pixel com Flate: sem artefatos JPEG em texto digitalizado
+        img = img.point(lambda v: 255 if v >= 128 else 0).convert("1", dither=Image.Dither.NONE)
+        return {
+            "data": zlib.compress(img.tobytes(), 9),
+            "filter": "/FlateDecode",
+            "colorspace": "/DeviceGray",
+            "bpc": 1,
+            "width": img.width,
+            "height": img.height,
+            "mode": "bilevel"
+        }
+    
+    buffer = BytesIO()
+    img.save(buffer, "JPEG", quality=quality, optimize=True)
+    return {
+        "data": buffer.getvalue(),
+        "filter": "/DCTDecode",
+        "colorspace": "/DeviceGray" if img.mode == "L" else "/DeviceRGB",
+        "bpc": 8,
+        "width": img.width,
+        "height": img.height,
+        "mode": "grayscale" if img.mode == "L" else "rgb"
+    }
+
+def _scale_for(entry: Dict[str, Any], target_dpi: int) -> float:
+    """Fator de redução para levar a imagem à resolução alvo"""
+    return target_dpi / entry["dpi"] if entry["dpi"] > target_dpi else 1.0
+
+def replace_image_stream(doc: fitz.Document, xref: int, result: Dict[str, Any]) -> None:
+    """Substitui o stream da imagem no próprio objeto, mantendo as referências das páginas"""
+    doc.update_stream(xref, result["data"], compress=False)
+    doc.xref_set_key(xref, "Filter", result["filter"])
+    doc.xref_set_key(xref, "DecodeParms", "null")
+    doc.xref_set_key(xref, "Decode", "null")
+    doc.xref_set_key(xref, "Width", str(result["width"]))
+    doc.xref_set_key(xref, "Height", str(result["height"]))
+    doc.xref_set_key(xref, "ColorSpace", result["colorspace"])
+    doc.xref_set_key(xref, "BitsPerComponent", str(result["bpc"]))
+
+def extract_for_recompression(doc: fitz.Document, xref: int) -> Optional[bytes]:
+    """Extrai a imagem em formato legível pelo Pillow, ignorando espaços de cor não suportados"""
+    extracted = doc.extract_image(xref)
+    if not extracted or extracted["colorspace"] not in (1, 3):
+        return None
+    return extracted["image"]
+
+def _document_runner(doc: fitz.Document) -> Callable[..., Awaitable[Any]]:
+    """Executa func(doc, *args) em uma thread, fora do event loop
+    
+    As chamadas sobre o mesmo documento são serializadas: um fitz.Document não
+    pode ser usado por duas threads ao mesmo tempo. A codificação das imagens
+    continua em paralelo no executor.
+    """
+    loop = asyncio.get_running_loop()
+    lock = asyncio.Lock()
+    
+    async def run(func: Callable[..., Any], *args: Any) -> Any:
+        async with lock:
+            return await loop.run_in_executor(None, func, doc, *args)
+    
+    return run
+
+async def recompress_images(
+    doc: fitz.Document,
+    quality: int,
+    target_dpi: int,
+    executor: Executor,
+    min_bytes: int = 0,
+    max_in_flight: int = 8
+) -> List[Dict[str, Any]]:
+    """Recomprime as imagens do documento em paralelo e retorna estatísticas por imagem"""
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_in_flight)
+    on_document = _document_runner(doc)
+    
+    async def process(entry: Dict[str, Any]) -> Dict[str, Any]:
+        stats = {
+            "xref": entry["xref"],
+            "page": entry["page"],
+            "width": entry["width"],
+            "height": entry["height"],
+            "dpi": round(entry["dpi"]),
+            "original_bytes": entry["original_bytes"],
+            "new_bytes": entry["original_bytes"],
+            "action": "skipped"
+        }
+        
+        async with semaphore:
+            data = await on_document(extract_for_recompression, entry["xref"])
+            if data is None:
+                return stats
+            
+            # Reduzir apenas imagens acima da resolução alvo
+            scale = _scale_for(entry, target_dpi)
+            result = await loop.run_in_executor(executor, recompress_image, data, quality, scale)
+        
+        if result is None or len(result["data"]) >= entry["original_bytes"]:
+            return stats
+        
+        await on_document(replace_image_stream, entry["xref"], result)
+        stats.update({
+            "new_bytes": len(result["data"]),
+            "new_width": result["width"],
+            "new_height": result["height"],
+            "action": "downsampled" if scale < 1.0 else "recompressed",
+            "mode": result["mode"]
+        })
+        return stats
+    
+    candidates = await on_document(collect_images, min_bytes)
+    return list(await asyncio.gather(*[process(entry) for entry in candidates]))
+
+def _interpolate(points: List[Tuple[int, float]], quality: int) -> float:
+    """Interpolação linear da razão de tamanho entre as qualidades amostradas"""
+    if quality <= points[0][0]:
+        return points[0][1]
+    for (q0, r0), (q1, r1) in zip(points, points[1:]):
+        if quality <= q1:
+            return r0 + (r1 - r0) * (quality - q0) / (q1 - q0)
+    return points[-1][1]
+
+async def estimate_quality_for_size(
+    doc: fitz.Document,
+    original_size: int,
+    target_size: int,
+    max_quality: int,
+    target_dpi: int,
+    executor: Executor,
+    min_bytes: int = 0,
+    sample_count: int = 8,
+    probe_qualities: Tuple[int, ...] = (10, 30, 50, 70, 90)
+) -> Dict[str, Any]:
+    """Escolhe a maior qualidade JPEG cujo tamanho previsto cabe no alvo
+    
+    Codifica apenas uma amostra das imagens em algumas qualidades, prevê o
+    tamanho final por interpolação e faz busca binária sobre a previsão.
+    """
+    on_document = _document_runner(doc)
+    candidates = await on_document(collect_images, min_bytes)
+    image_bytes = sum(entry["original_bytes"] for entry in candidates)
+    fixed_bytes = max(0, original_size - image_bytes)
+    
+    if not candidates:
+        return {"quality": max_quality, "predicted_size": original_size, "sampled_images": 0}
+    
+    # Amostra espaçada ao longo da lista ordenada por tamanho
+    ordered = sorted(candidates, key=lambda entry: entry["original_bytes"], reverse=True)
+    step = max(1, len(ordered) // sample_count)
+    sample = ordered[::step][:sample_count]
+    
+    loop = asyncio.get_running_loop()
+    qualities = list(probe_qualities)
+    
+    async def measure(entry: Dict[str, Any]) -> Optional[List[int]]:
+        data = await on_document(extract_for_recompression, entry["xref"])
+        if data is None:
+            return None
+        return await loop.run_in_executor(
+            executor, sample_encoded_sizes, data, qualities, _scale_for(entry, target_dpi)
+        )
+    
+    measured = await asyncio.gather(*[measure(entry) for entry in sample])
+    
+    # Razão agregada (novo/original) por qualidade; imagens que não diminuem ficam como estão
+    sample_original = sum(entry["original_bytes"] for entry in sample)
+    points = []
+    for index, quality in enumerate(qualities):
+        new_total = sum(
+            min(sizes[index], entry["original_bytes"]) if sizes else entry["original_bytes"]
+            for entry, sizes in zip(sample, measured)
+        )
+        points.append((quality, new_total / sample_original))
+    
+    def predict(quality: int) -> int:
+        return int(fixed_bytes + image_bytes * _interpolate(points, quality))
+    
+    low, high = 1, max_quality
+    if predict(low) > target_size:
+        high = low
+    while low < high:
+        middle = (low + high + 1) // 2
+        if predict(middle) <= target_size:
+            low = middle
+        else:
+            high = middle - 1
+    
+    return {"quality": low, "predicted_size": predict(low), "sampled_images": len(sample)}
@@ -0,0 +1,137 @@
+import os
+import logging
+from typing import Iterator, List, Optional, Dict, Any
+import fitz  # PyMuPDF
+
+from .document_cache import document_cache
+
+logger = logging.getLogger(__name__)
+
+# Filtros cujo stream já é o arquivo da imagem: copiados byte a byte
+PASSTHROUGH_FORMATS = {
+    "/DCTDecode": "jpg",
+    "/JPXDecode": "jp2",
+    "/JBIG2Decode": "jb2e"
+}
+
+def _single_filter(doc: fitz.Document, xref: int) -> Optional[str]:
+    """Filtro do stream quando há apenas um (cadeias exigem decodificação)"""
+    kind, value = doc.xref_get_key(xref, "Filter")
+    if kind == "name":
+        return value
+    if kind == "array":
+        names = value.strip("[]").split()
+        if len(names) == 1:
+            return names[0]
+    return None
+
+def _jbig2_globals(doc: fitz.Document, xref: int) -> Optional[int]:
+    """xref do stream de segmentos globais JBIG2, se houver"""
+    kind, value = doc.xref_get_key(xref, "DecodeParms/JBIG2Globals")
+    return int(value.split()[0]) if kind == "xref" else None
+
+def collect_page_images(doc: fitz.Document, page_indexes: List[int]) -> Dict[int, Dict[str, Any]]:
+    """XObjects de imagem das páginas, únicos por xref, na ordem da primeira aparição"""
+    images: Dict[int, Dict[str, Any]] = {}
+    for index in page_indexes:
+        for xref, smask, width, height, bpc, colorspace, *_ in doc[index].get_images(full=True):
+            entry = images.get(xref)
+            if entry is None:
+                images[xref] = {
+                    "xref": xref,
+                    "smask": smask,
+                    "width": width,
+                    "height": height,
+                    "bpc": bpc,
+                    "colorspace": colorspace,
+                    "pages": [index + 1]
+                }
+            elif entry["pages"][-1] != index + 1:
+                entry["pages"].append(index + 1)
+    return images
+
+def _decode_image(doc: fitz.Document, xref: int, smask: int) -> bytes:
+    """Decodifica a imagem para PNG, aplicando a máscara suave como canal alfa"""
+    pix = fitz.Pixmap(doc, xref)
+    if pix.colorspace and pix.colorspace.n > 3:
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    if smask:
+        mask = fitz.Pixmap(doc, smask)
+        # Máscaras em outra resolução são comuns; o MuPDF só combina tamanhos iguais
+        if (mask.width, mask.height) != (pix.width, pix.height):
+            mask = fitz.Pixmap(mask, pix.width, pix.height, None)
+        if pix.alpha:
+            pix = fitz.Pixmap(pix, 0)
+        pix = fitz.Pixmap(pix, mask)
+    return pix.tobytes("png")
+
+def iter_images(pdf_path: str, page_indexes: List[int], output_dir: str) -> Iterator[Dict[str, Any]]:
+    """Grava as imagens embutidas das páginas, uma por xref, e as entrega à medida que saem
+    
+    DCT, JPX e JBIG2 sem cadeia de filtros nem /Decode são copiados como estão;
+    o resto é decodificado para PNG. Streams JBIG2 saem no formato embutido
+    (.jb2e), acompanhados do arquivo de segmentos globais (.jb2g) que usam.
+    Imagens que não podem ser gravadas saem com "error" e sem arquivo.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    
+    with document_cache.borrow(pdf_path) as doc:
+        written_globals = set()
+        
+        for entry in collect_page_images(doc, page_indexes).values():
+            try:
+                _write_image(doc, entry, output_dir, written_globals)
+            except Exception as e:
+                # Uma imagem ilegível não interrompe as demais nem o arquivo em streaming
+                logger.error(f"Erro ao extrair a imagem {entry['xref']}: {str(e)}")
+                entry.update({"passthrough": False, "file_size": 0, "error": str(e)})
+            yield entry
+
+def _write_image(doc: fitz.Document, entry: Dict[str, Any], output_dir: str, written_globals: set) -> None:
+    """Grava uma imagem (e os segmentos globais JBIG2 que ela usa), completando entry"""
+    xref = entry["xref"]
+    image_filter = _single_filter(doc, xref)
+    extension = PASSTHROUGH_FORMATS.get(image_filter)
+    
+    # /Decode altera os valores das amostras; o arquivo copiado o ignoraria
+    if extension and doc.xref_get_key(xref, "Decode")[0] == "null":
+        data = doc.xref_stream_raw(xref)
+        passthrough = True
+    else:
+        extension = "png"
+        data = _decode_image(doc, xref, entry["smask"])
+        passthrough = False
+    
+    basename = f"image_{entry['pages'][0]:05d}_{xref}"
+    output_path = os.path.join(output_dir, f"{basename}.{extension}")
+    with open(output_path, "wb") as f:
+        f.write(data)
+    
+    entry.update({
+        "passthrough": passthrough,
+        "filter": image_filter,
+        "format": extension,
+        "file_size": len(data),
+        "output_path": output_path
+    })
+    
+    globals_xref = _jbig2_globals(doc, xref) if extension == "jb2e" else None
+    if globals_xref:
+        globals_path = os.path.join(output_dir, f"globals_{globals_xref}.jb2g")
+        if globals_xref not in written_globals:
+            with open(globals_path, "wb") as f:
+                f.write(doc.xref_stream(globals_xref))
+            written_globals.add(globals_xref)
+        entry["globals_path"] = globals_path
+
+def image_summary(images: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totais da extração: imagens copiadas sem recodificar, decodificadas e com erro"""
+    copied = sum(1 for image in images if image["passthrough"])
+    failed = sum(1 for image in images if "error" in image)
+    return {
+        "total_images": len(images),
+        "copied": copied,
+        "decoded": len(images) - copied - failed,
+        "failed": failed,
+        "total_bytes": sum(image["file_size"] for image in images)
+    }
@@ -0,0 +1,95 @@
+import os
+import time
+from pathlib import Path
+from typing import Optional, Dict, Any
+import fitz  # PyMuPDF
+from PyPDF2 import PdfReader
+
+# Tamanho dos blocos lidos ao contar os marcadores %%EOF
+_SCAN_CHUNK = 1024 * 1024
+
+def measure_parse(pdf_path: str) -> Dict[str, Optional[float]]:
+    """Tempo (ms) para abrir o arquivo e ler a árvore de páginas em cada biblioteca
+
+    None indica que a biblioteca não conseguiu ler o arquivo.
+    """
+    start = time.perf_counter()
+    try:
+        with fitz.open(pdf_path) as doc:
+            doc.load_page(0)
+            doc.page_count
+        pymupdf_ms = round((time.perf_counter() - start) * 1000, 2)
+    except Exception:
+        pymupdf_ms = None
+    
+    start = time.perf_counter()
+    try:
+        with open(pdf_path, "rb") as f:
+            len(PdfReader(f, strict=False).pages)
+        pypdf2_ms = round((time.perf_counter() - start) * 1000, 2)
+    except Exception:
+        pypdf2_ms = None
+    
+    return {"pymupdf": pymupdf_ms, "pypdf2": pypdf2_ms}
+
+def count_eof_markers(pdf_path: str) -> int:
+    """Conta os marcadores %%EOF sem carregar o arquivo inteiro na memória"""
+    marker = b"%%EOF"
+    count = 0
+    tail = b""
+    with open(pdf_path, "rb") as f:
+        while True:
+            chunk = f.read(_SCAN_CHUNK)
+            if not chunk:
+                break
+            data = tail + chunk
+            count += data.count(marker)
+            # Marcador dividido entre dois blocos; o resto é curto demais para contar duas vezes
+            tail = data[-(len(marker) - 1):]
+    return count
+
+def normalize_upload(pdf_path: str, object_streams: bool = False) -> Dict[str, Any]:
+    """Reescreve o upload em forma limpa e compacta (executado no pool de processos)
+    
+    Xref quebrada é reconstruída, cadeias de atualizações incrementais e restos
+    de linearização somem e objetos órfãos são descartados. Arquivos que já
+    estão limpos não ganham nada com a reescrita e ficam como vieram. O original
+    é mantido ao lado como <nome>.original.pdf.
+    """
+    path = Path(pdf_path)
+    original_path = path.with_suffix(".original" + path.suffix)
+    temp_path = path.with_suffix(".normalized" + path.suffix)
+    
+    incremental_updates = max(count_eof_markers(pdf_path) - 1, 0)
+    parse_before = measure_parse(pdf_path)
+    
+    with fitz.open(pdf_path) as doc:
+        repaired = doc.is_repaired
+        linearized = bool(doc.is_fast_webaccess)
+        page_count = doc.page_count
+        
+        if not (repaired or linearized or incremental_updates):
+            return {"normalized": False, "parse_ms_before": parse_before}
+        
+        # garbage=3 (fundir objetos duplicados) leva minutos com dezenas de milhares de objetos
+        doc.save(str(temp_path), garbage=2, deflate=True, use_objstms=int(object_streams))
+    
+    with fitz.open(str(temp_path)) as normalized:
+        if normalized.is_repaired or normalized.page_count != page_count:
+            os.remove(temp_path)
+            raise ValueError("Arquivo normalizado não confere com o original")
+    
+    os.replace(pdf_path, original_path)
+    os.replace(temp_path, pdf_path)
+    
+    return {
+        "normalized": True,
+        "repaired": repaired,
+        "linearized": linearized,
+        "incremental_updates": incremental_updates,
+        "original_path": str(original_path),
+        "original_size": original_path.stat().st_size,
+        "normalized_size": path.stat().st_size,
+        "parse_ms_before": parse_before,
+        "parse_ms_after": measure_parse(pdf_path)
+    }
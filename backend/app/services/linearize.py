@@ -0,0 +1,49 @@
+import os
+import time
+from typing import Dict, Any
+import fitz  # PyMuPDF
+
+try:
+    import pikepdf
+except ImportError:  # Opcional: só usado se o MuPDF não linearizar
+    pikepdf = None
+
+def linearize_file(pdf_path: str) -> Dict[str, Any]:
+    """Regrava o PDF linearizado (executado no pool de processos)
+    
+    Linearizado, o arquivo traz o dicionário de linearização, a primeira
+    página e a tabela de dicas logo no início, e visualizadores com
+    requisições por faixa exibem a página 1 sem baixar o resto. Versões novas
+    do MuPDF removeram a linearização; nesse caso usa-se o pikepdf (qpdf),
+    se estiver instalado.
+    """
+    start = time.perf_counter()
+    original_size = os.path.getsize(pdf_path)
+    temp_path = f"{pdf_path}.linearizing"
+    
+    try:
+        with fitz.open(pdf_path) as doc:
+            # Sem deflate: recomprimir streams já compactados aumentava a saída em ~20%.
+            # Object streams não se combinam com a linearização do MuPDF
+            doc.save(temp_path, garbage=2, linear=True)
+        engine = "pymupdf"
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        if pikepdf is None:
+            raise
+        with pikepdf.open(pdf_path) as pdf:
+            pdf.save(temp_path, linearize=True)
+        engine = "pikepdf"
+    
+    os.replace(temp_path, pdf_path)
+    with fitz.open(pdf_path) as doc:
+        linearized = bool(doc.is_fast_webaccess)
+    
+    return {
+        "linearized": linearized,
+        "engine": engine,
+        "seconds": round(time.perf_counter() - start, 4),
+        "bytes_before": original_size,
+        "bytes_after": os.path.getsize(pdf_path)
+    }
@@ -0,0 +1,104 @@
+import os
+import re
+import time
+from typing import List, Dict, Any
+import fitz  # PyMuPDF
+
+FONT_FILE_KEYS = ("FontFile", "FontFile2", "FontFile3")
+
+def _font_descriptors(doc: fitz.Document, font_xref: int) -> List[int]:
+    """Descritores de uma fonte, incluindo os das fontes descendentes (Type0)"""
+    kind, value = doc.xref_get_key(font_xref, "FontDescriptor")
+    if kind == "xref":
+        return [int(value.split()[0])]
+    
+    kind, value = doc.xref_get_key(font_xref, "DescendantFonts")
+    if kind == "xref":
+        value = doc.xref_object(int(value.split()[0]), compressed=True)
+    
+    descriptors = []
+    for descendant in re.findall(r"(\d+) 0 R", value if kind in ("array", "xref") else ""):
+        kind, descriptor = doc.xref_get_key(int(descendant), "FontDescriptor")
+        if kind == "xref":
+            descriptors.append(int(descriptor.split()[0]))
+    return descriptors
+
+def embedded_font_bytes(doc: fitz.Document) -> int:
+    """Soma o tamanho dos programas de fonte embutidos usados pelas páginas"""
+    font_xrefs = {font[0] for page in doc for font in page.get_fonts() if font[0] > 0}
+    descriptors = {d for font_xref in font_xrefs for d in _font_descriptors(doc, font_xref)}
+    
+    total = 0
+    for descriptor in descriptors:
+        for key in FONT_FILE_KEYS:
+            kind, value = doc.xref_get_key(descriptor, key)
+            if kind == "xref":
+                total += len(doc.xref_stream_raw(int(value.split()[0])))
+    return total
+
+def count_page_resources(doc: fitz.Document) -> int:
+    """Conta fontes, imagens e formulários referenciados pelas páginas"""
+    return sum(
+        len(page.get_fonts()) + len(page.get_images()) + len(page.get_xobjects())
+        for page in doc
+    )
+
+def optimize_pdf_file(
+    input_path: str,
+    output_path: str,
+    subset_fonts: bool = True,
+    prune_resources: bool = True
+) -> Dict[str, Any]:
+    """Subconjunto de fontes, poda de recursos e regravação compacta (executado no pool de processos)
+    
+    Pode receber o mesmo caminho de entrada e saída: o resultado é gravado em
+    um arquivo temporário e só então substitui o destino.
+    """
+    original_size = os.path.getsize(input_path)
+    steps = []
+    
+    with fitz.open(input_path) as doc:
+        # Podar antes do subconjunto para não processar fontes que serão descartadas
+        if prune_resources:
+            start = time.perf_counter()
+            resources_before = count_page_resources(doc)
+            for page in doc:
+                # sanitize=True remove do /Resources o que o conteúdo não usa
+                page.clean_contents(sanitize=True)
+            steps.append({
+                "step": "prune_resources",
+                "seconds": round(time.perf_counter() - start, 4),
+                "resources_removed": resources_before - count_page_resources(doc)
+            })
+        
+        if subset_fonts:
+            start = time.perf_counter()
+            fonts_before = embedded_font_bytes(doc)
+            doc.subset_fonts()
+            steps.append({
+                "step": "subset_fonts",
+                "seconds": round(time.perf_counter() - start, 4),
+                "bytes_before": fonts_before,
+                "bytes_after": embedded_font_bytes(doc)
+            })
+        
+        # Object streams + xref stream comprimida; garbage=4 descarta objetos órfãos
+        start = time.perf_counter()
+        temp_path = f"{output_path}.optimizing"
+        doc.save(temp_path, garbage=4, deflate=True, use_objstms=1)
+    
+    os.replace(temp_path, output_path)
+    optimized_size = os.path.getsize(output_path)
+    steps.append({
+        "step": "rewrite",
+        "seconds": round(time.perf_counter() - start, 4),
+        "bytes_before": original_size,
+        "bytes_after": optimized_size
+    })
+    
+    return {
+        "original_size": original_size,
+        "optimized_size": optimized_size,
+        "bytes_saved": original_size - optimized_size,
+        "steps": steps
+    }
@@ -1,23 +1,195 @@
 import os
+import re
 import uuid
 import asyncio
-from typing import List, Optional, Dict, Any
+import bisect
+import hashlib
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import partial
+from typing import AsyncIterator, Callable, ContextManager, Deque, Iterable, Iterator, List, Optional, Dict, Any, Tuple
 from pathlib import Path
 import fitz  # PyMuPDF
 from PyPDF2 import PdfReader, PdfWriter
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 import pytesseract
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
 from io import BytesIO
 import logging
 
 from ..core.config import settings
-from ..models.pdf_project import PDFProject, PDFFile, PDFOperation
-from ..utils.file_utils import ensure_directory, get_file_hash
+from ..models.pdf_project import PDFFile
+from ..utils.file_utils import ensure_directory
+from .document_cache import document_cache
+from .image_compression import recompress_images, estimate_quality_for_size
+from .image_extract import iter_images, image_summary
+from .ingest import normalize_upload
+from .linearize import linearize_file
+from .optimization import optimize_pdf_file
+from .rasterize import render_batch, raster_summary
+from .split import parse_page_ranges, plan_split, write_split_part
+from .sprites import build_sprite, load_sprite_map, sprite_name, sprite_signature
+from .text_extract import iter_page_text, text_summary
+from .watermark import watermark_file, watermark_incremental, build_stamps
 
 logger = logging.getLogger(__name__)
 
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+# Montagens de sprite em andamento, pelo nome; evita montar a mesma sprite duas vezes
+_sprite_jobs: Dict[str, "asyncio.Future"] = {}
+
+def _new_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Pool de processos iniciado por forkserver (spawn onde não houver)
+    
+    O servidor já tem threads (executor padrão, threadpool do Starlette); um fork
+    copiaria locks que estivessem presos nelas e o filho poderia travar para sempre.
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(method))
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Pool de processos compartilhado para operações CPU-bound"""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = _new_process_pool(settings.PDF_WORKERS)
+    return _process_pool
+
+async def iter_in_window(
+    executor: Executor,
+    calls: Iterable[Tuple[Callable[..., Any], ...]],
+    window: Optional[int] = None
+) -> AsyncIterator[Any]:
+    """Executa as chamadas (função, *args) no executor e entrega os resultados em ordem
+    
+    No máximo window chamadas ficam em andamento (padrão: PDF_WORKERS * 2),
+    então uma exportação grande não ocupa a fila do pool compartilhado à frente
+    das operações dos outros usuários. Se o consumidor parar (cliente
+    desconectado ou erro), as chamadas que ainda não começaram são canceladas.
+    """
+    loop = asyncio.get_running_loop()
+    window = window or settings.PDF_WORKERS * 2
+    pending: Deque["asyncio.Future"] = deque()
+    try:
+        for func, *args in calls:
+            pending.append(loop.run_in_executor(executor, func, *args))
+            if len(pending) >= window:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for future in pending:
+            future.cancel()
+
+def partition_by_pages(page_counts: List[int], chunk_count: int) -> List[Tuple[int, int]]:
+    """Divide a lista ordenada em faixas contíguas [início, fim) com páginas equilibradas"""
+    chunk_count = max(1, min(chunk_count, len(page_counts)))
+    total_pages = sum(page_counts)
+    
+    ranges = []
+    start = 0
+    accumulated = 0
+    
+    for index, count in enumerate(page_counts):
+        accumulated += count
+        remaining_files = len(page_counts) - index - 1
+        remaining_chunks = chunk_count - len(ranges) - 1
+        target = total_pages * (len(ranges) + 1) / chunk_count
+        
+        # Fechar a faixa ao atingir a meta, mantendo arquivos para as faixas restantes
+        if remaining_chunks > 0 and (accumulated >= target or remaining_files == remaining_chunks):
+            ranges.append((start, index + 1))
+            start = index + 1
+    
+    ranges.append((start, len(page_counts)))
+    return ranges
+
+def _merge_chunk(file_paths: List[str], output_path: str) -> int:
+    """Mescla uma faixa contígua de arquivos (executado no pool de processos)"""
+    merged = fitz.open()
+    for file_path in file_paths:
+        with fitz.open(file_path) as src:
+            merged.insert_pdf(src)
+    
+    page_count = merged.page_count
+    merged.save(output_path)
+    merged.close()
+    return page_count
+
+_REFERENCE = re.compile(rb"(\d+) 0 R")
+
+def deduplicate_streams(pdf_path: str) -> Dict[str, Any]:
+    """Unifica streams idênticos (fontes, imagens, perfis ICC) em um único objeto compartilhado
+    
+    Streams com o mesmo hash (dicionário + conteúdo bruto) são trocados pelo
+    primeiro do grupo em todas as referências; as cópias ficam sem uso e saem
+    no garbage=1, que é linear. O garbage=4 fazia a mesma busca comparando
+    streams entre si, em tempo quadrático no número de objetos. Cada rodada
+    pode igualar os dicionários de quem apontava para as cópias (uma imagem
+    com /SMask duplicada, por exemplo), então repete até não sobrar grupo.
+    """
+    with fitz.open(pdf_path) as doc:
+        replaced: Dict[int, int] = {}
+        duplicate_bytes = 0
+        bytes_saved = 0
+        
+        while True:
+            groups: Dict[str, int] = {}
+            mapping: Dict[int, int] = {}
+            for xref in range(1, doc.xref_length()):
+                if xref in replaced or not doc.xref_is_stream(xref):
+                    continue
+                raw = doc.xref_stream_raw(xref)
+                header = doc.xref_object(xref, compressed=True)
+                digest = hashlib.sha256(header.encode() + b"\0" + raw).hexdigest()
+                canonical = groups.setdefault(digest, xref)
+                if canonical != xref:
+                    mapping[xref] = canonical
+                    duplicate_bytes += len(raw)
+                    bytes_saved += len(raw) + len(header)
+            
+            if not mapping:
+                break
+            replaced.update(mapping)
+            
+            # Redirecionar as referências de todos os objetos restantes para o canônico
+            def redirect(match: "re.Match") -> bytes:
+                xref = int(match.group(1))
+                return b"%d 0 R" % mapping.get(xref, xref)
+            
+            for xref in range(1, doc.xref_length()):
+                if xref in replaced:
+                    continue
+                source = doc.xref_object(xref, compressed=True).encode()
+                updated = _REFERENCE.sub(redirect, source)
+                if updated == source:
+                    continue
+                if not doc.xref_is_stream(xref):
+                    doc.update_object(xref, updated.decode())
+                    continue
+                # update_object descartaria o conteúdo do stream: trocar chave a chave
+                for key in doc.xref_get_keys(xref):
+                    value = doc.xref_get_key(xref, key)[1].encode()
+                    redirected = _REFERENCE.sub(redirect, value)
+                    if redirected != value:
+                        doc.xref_set_key(xref, key, redirected.decode())
+        
+        if not replaced:
+            return {"duplicate_streams": 0, "duplicate_bytes": 0, "bytes_saved": 0}
+        
+        temp_path = f"{pdf_path}.dedup"
+        doc.save(temp_path, garbage=1)
+    
+    os.replace(temp_path, pdf_path)
+    
+    # Só o que a deduplicação removeu, não a compactação do resto do arquivo
+    return {
+        "duplicate_streams": len(replaced),
+        "duplicate_bytes": duplicate_bytes,
+        "bytes_saved": bytes_saved
+    }
+
 class PDFService:
     """Serviço principal para operações com PDF"""
     
@@ -25,166 +197,499 @@ class PDFService:
         self.upload_dir = Path(settings.UPLOAD_DIR)
         self.output_dir = Path(settings.OUTPUT_DIR)
         self.temp_dir = Path(settings.TEMP_DIR)
+        self.thumbnail_dir = Path(settings.THUMBNAIL_DIR)
         
         # Garantir que os diretórios existem
-        for directory in [self.upload_dir, self.output_dir, self.temp_dir]:
+        for directory in [self.upload_dir, self.output_dir, self.temp_dir, self.thumbnail_dir]:
             ensure_directory(directory)
     
+    def upload_path(self, filename: str) -> Path:
+        """Caminho novo e único no diretório de uploads, com a extensão do arquivo enviado"""
+        return self.upload_dir / f"{uuid.uuid4()}{Path(filename).suffix}"
+    
     async def save_uploaded_file(self, file_content: bytes, filename: str) -> Dict[str, Any]:
-        """Salva arquivo enviado e extrai metadados"""
+        """Salva arquivo enviado e extrai metadados; PDFs ilegíveis levantam exceção"""
+        file_path = self.upload_path(filename)
+        
         try:
-            # Gerar nome único para o arquivo
-            file_id = str(uuid.uuid4())
-            file_extension = Path(filename).suffix
-            stored_filename = f"{file_id}{file_extension}"
-            file_path = self.upload_dir / stored_filename
+            # Salvar arquivo e calcular o hash em thread: os outros arquivos do upload seguem em paralelo
+            loop = asyncio.get_running_loop()
+            content_hash = await loop.run_in_executor(None, self._write_upload, file_path, file_content)
             
-            # Salvar arquivo
-            with open(file_path, "wb") as f:
-                f.write(file_content)
+        except Exception as e:
+            logger.error(f"Erro ao salvar arquivo {filename}: {str(e)}")
+            file_path.unlink(missing_ok=True)
+            raise
+        
+        return await self.ingest_stored_file(file_path, filename, content_hash)
+    
+    @staticmethod
+    def _write_upload(file_path: Path, file_content: bytes) -> str:
+        """Grava o upload e retorna o hash do conteúdo enviado (reenvios idênticos continuam reconhecíveis)"""
+        with open(file_path, "wb") as f:
+            f.write(file_content)
+        return hashlib.sha256(file_content).hexdigest()
+    
+    async def ingest_stored_file(self, file_path: Path, filename: str, content_hash: str) -> Dict[str, Any]:
+        """Normaliza e analisa um upload já gravado em upload_dir
+        
+        Serve ao upload comum e ao retomável, que chega com o arquivo no lugar e
+        o hash calculado durante a transferência. PDFs ilegíveis levantam exceção.
+        """
+        try:
+            # Normalizar antes de qualquer leitura: metadados e thumbnail já usam o arquivo limpo
+            ingest = await self.normalize_upload(str(file_path)) if settings.INGEST_NORMALIZE else None
             
             # Extrair metadados
             metadata = await self.extract_pdf_metadata(file_path)
-            
-            # Gerar thumbnail
-            thumbnail_path = await self.generate_thumbnail(file_path, file_id)
+            if "error" in metadata:
+                raise ValueError(f"Arquivo {filename} não é um PDF válido: {metadata['error']}")
+            if ingest:
+                metadata["ingest"] = ingest
             
             return {
-                "file_id": file_id,
+                "file_id": file_path.stem,
                 "original_filename": filename,
-                "stored_filename": stored_filename,
+                "stored_filename": file_path.name,
                 "file_path": str(file_path),
-                "file_size": len(file_content),
-                "thumbnail_path": thumbnail_path,
+                "file_size": file_path.stat().st_size,
+                "content_hash": content_hash,
+                # Prévia e thumbnail ficam para a fila de thumbnails (thumbnail_queue)
+                "preview_path": None,
+                "thumbnail_path": None,
                 "metadata": metadata
             }
             
         except Exception as e:
             logger.error(f"Erro ao salvar arquivo {filename}: {str(e)}")
+            # Nada de arquivo órfão no disco: o upload que falhou não vira registro
+            if file_path.exists():
+                file_path.unlink()
             raise
     
+    async def normalize_upload(self, file_path: str) -> Dict[str, Any]:
+        """Repara e reescreve o upload no pool; em caso de erro o arquivo fica como veio"""
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                get_process_pool(), normalize_upload, file_path, settings.INGEST_OBJECT_STREAMS
+            )
+        
+        except Exception as e:
+            logger.error(f"Erro ao normalizar arquivo {file_path}: {str(e)}")
+            return {"normalized": False, "error": str(e)}
+    
     async def extract_pdf_metadata(self, file_path: Path) -> Dict[str, Any]:
         """Extrai metadados do PDF"""
         try:
-            # Usar PyMuPDF para metadados detalhados
-            doc = fitz.open(str(file_path))
-            metadata = doc.metadata
-            
-            # Usar PyPDF2 para informações adicionais
-            with open(file_path, "rb") as f:
-                pdf_reader = PdfReader(f)
-                page_count = len(pdf_reader.pages)
-                
-                # Extrair texto da primeira página para preview
-                first_page_text = ""
-                if page_count > 0:
-                    first_page_text = pdf_reader.pages[0].extract_text()[:500]
-            
-            doc.close()
-            
-            return {
-                "page_count": page_count,
-                "title": metadata.get("title", ""),
-                "author": metadata.get("author", ""),
-                "subject": metadata.get("subject", ""),
-                "creator": metadata.get("creator", ""),
-                "producer": metadata.get("producer", ""),
-                "creation_date": metadata.get("creationDate", ""),
-                "modification_date": metadata.get("modDate", ""),
-                "first_page_text": first_page_text,
-                "file_size_mb": round(file_path.stat().st_size / (1024 * 1024), 2)
-            }
+            # A análise pelo PyMuPDF é síncrona: em thread, para não travar o event loop
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._read_metadata, Path(file_path))
             
         except Exception as e:
             logger.error(f"Erro ao extrair metadados: {str(e)}")
             return {"page_count": 0, "error": str(e)}
     
-    async def generate_thumbnail(self, file_path: Path, file_id: str) -> Optional[str]:
-        """Gera thumbnail da primeira página do PDF"""
-        try:
-            doc = fitz.open(str(file_path))
-            page = doc[0]  # Primeira página
-            
-            # Renderizar página como imagem
-            mat = fitz.Matrix(settings.PREVIEW_DPI / 72, settings.PREVIEW_DPI / 72)
-            pix = page.get_pixmap(matrix=mat)
-            
-            # Converter para PIL Image
-            img_data = pix.tobytes("ppm")
-            img = Image.open(BytesIO(img_data))
-            
-            # Redimensionar para thumbnail
-            img.thumbnail(settings.THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
-            
-            # Salvar thumbnail
-            thumbnail_filename = f"{file_id}_thumb.png"
-            thumbnail_path = self.temp_dir / thumbnail_filename
-            img.save(thumbnail_path, "PNG")
-            
-            doc.close()
-            return str(thumbnail_path)
+    def _read_metadata(self, file_path: Path) -> Dict[str, Any]:
+        # Uma única análise pelo PyMuPDF, aberto pelo caminho: os dados vêm do cache
+        # de páginas do sistema e o handle fica no cache para as leituras seguintes do
+        # arquivo neste processo (páginas virtuais, extração). As thumbnails são
+        # renderizadas no pool e abrem o arquivo por conta própria
+        with self._document(file_path) as doc:
+            metadata = doc.metadata
+            page_count = doc.page_count
             
-        except Exception as e:
-            logger.error(f"Erro ao gerar thumbnail: {str(e)}")
-            return None
+            # Extrair texto da primeira página para preview
+            first_page_text = ""
+            if page_count > 0:
+                first_page_text = doc[0].get_text()[:500]
+        
+        return {
+            "page_count": page_count,
+            "title": metadata.get("title", ""),
+            "author": metadata.get("author", ""),
+            "subject": metadata.get("subject", ""),
+            "creator": metadata.get("creator", ""),
+            "producer": metadata.get("producer", ""),
+            "creation_date": metadata.get("creationDate", ""),
+            "modification_date": metadata.get("modDate", ""),
+            "first_page_text": first_page_text,
+            "file_size_mb": round(file_path.stat().st_size / (1024 * 1024), 2)
+        }
     
-    async def merge_pdfs(self, pdf_files: List[PDFFile], output_filename: str) -> Dict[str, Any]:
+    async def merge_pdfs(
+        self,
+        pdf_files: List[PDFFile],
+        output_filename: str,
+        parallel: Optional[bool] = None,
+        max_workers: Optional[int] = None,
+        deduplicate: Optional[bool] = None,
+        optimize: bool = False,
+        linearize: Optional[bool] = None
+    ) -> Dict[str, Any]:
         """Mescla múltiplos PDFs em um único arquivo"""
         try:
-            pdf_writer = PdfWriter()
             total_pages = 0
+            chunk_count = 1
+            dedup_stats = {"duplicate_streams": 0, "bytes_saved": 0}
             
             # Ordenar arquivos por order_index
             sorted_files = sorted(pdf_files, key=lambda x: x.order_index)
+            output_path = self.output_dir / output_filename
             
-            for pdf_file in sorted_files:
-                with open(pdf_file.file_path, "rb") as f:
-                    pdf_reader = PdfReader(f)
-                    for page in pdf_reader.pages:
-                        pdf_writer.add_page(page)
-                        total_pages += 1
+            if parallel is None:
+                parallel = len(sorted_files) >= settings.PARALLEL_MERGE_MIN_FILES
             
-            # Salvar arquivo mesclado
-            output_path = self.output_dir / output_filename
-            with open(output_path, "wb") as output_file:
-                pdf_writer.write(output_file)
+            if parallel and len(sorted_files) > 1:
+                total_pages, chunk_count = await self._merge_parallel(sorted_files, output_path, max_workers)
+            else:
+                pdf_writer = PdfWriter()
+                
+                for pdf_file in sorted_files:
+                    with open(pdf_file.file_path, "rb") as f:
+                        pdf_reader = PdfReader(f)
+                        for page in pdf_reader.pages:
+                            pdf_writer.add_page(page)
+                            total_pages += 1
+                
+                # Salvar arquivo mesclado
+                with open(output_path, "wb") as output_file:
+                    pdf_writer.write(output_file)
             
-            return {
+            if deduplicate is None:
+                deduplicate = settings.MERGE_DEDUPLICATE
+            
+            if deduplicate and total_pages > 0:
+                try:
+                    loop = asyncio.get_running_loop()
+                    dedup_stats = await loop.run_in_executor(
+                        get_process_pool(), deduplicate_streams, str(output_path)
+                    )
+                except Exception as e:
+                    logger.warning(f"Deduplicação ignorada para {output_filename}: {str(e)}")
+            
+            result = {
                 "success": True,
                 "output_path": str(output_path),
                 "total_pages": total_pages,
-                "file_size": output_path.stat().st_size
+                "file_size": output_path.stat().st_size,
+                "bytes_saved": dedup_stats["bytes_saved"],
+                "duplicate_streams": dedup_stats["duplicate_streams"],
+                "parallel": chunk_count > 1,
+                "chunks": chunk_count
             }
             
+            if optimize and total_pages > 0:
+                result["optimization"] = await self._optimize_in_place(str(output_path))
+                result["file_size"] = output_path.stat().st_size
+            
+            if self._should_linearize(linearize) and total_pages > 0:
+                result["linearization"] = await self._linearize_in_place(str(output_path))
+                result["file_size"] = output_path.stat().st_size
+            
+            return result
+            
         except Exception as e:
             logger.error(f"Erro ao mesclar PDFs: {str(e)}")
             return {"success": False, "error": str(e)}
     
-    async def compress_pdf(self, input_path: str, output_path: str, quality: int = 85) -> Dict[str, Any]:
-        """Comprime um PDF reduzindo o tamanho"""
+    async def _merge_parallel(
+        self,
+        sorted_files: List[PDFFile],
+        output_path: Path,
+        max_workers: Optional[int] = None
+    ) -> Tuple[int, int]:
+        """Mescla faixas contíguas em paralelo e concatena os resultados parciais em ordem"""
+        workers = max_workers or settings.PDF_WORKERS
+        page_counts = [pdf_file.page_count or 1 for pdf_file in sorted_files]
+        ranges = partition_by_pages(page_counts, workers)
+        
+        merge_id = uuid.uuid4().hex
+        partial_paths = [str(self.temp_dir / f"merge_{merge_id}_{i}.pdf") for i in range(len(ranges))]
+        
+        loop = asyncio.get_running_loop()
+        pool = _new_process_pool(workers) if max_workers else get_process_pool()
+        
+        try:
+            await asyncio.gather(*[
+                loop.run_in_executor(
+                    pool,
+                    _merge_chunk,
+                    [pdf_file.file_path for pdf_file in sorted_files[start:end]],
+                    partial_path
+                )
+                for (start, end), partial_path in zip(ranges, partial_paths)
+            ])
+            
+            # Concatenar parciais na ordem original das faixas
+            total_pages = await loop.run_in_executor(pool, _merge_chunk, partial_paths, str(output_path))
+            return total_pages, len(ranges)
+            
+        finally:
+            if max_workers:
+                pool.shutdown()
+            for partial_path in partial_paths:
+                if os.path.exists(partial_path):
+                    os.unlink(partial_path)
+    
+    def build_virtual_document(self, pdf_files: List[PDFFile]) -> Dict[str, Any]:
+        """Monta o mapa de páginas do documento mesclado sem gerar o arquivo"""
+        sorted_files = sorted(pdf_files, key=lambda x: x.order_index)
+        
+        entries = []
+        starts = []
+        total_pages = 0
+        
+        for pdf_file in sorted_files:
+            # Usar contagem gravada no upload; só abre o arquivo se ela faltar
+            page_count = pdf_file.page_count
+            if page_count is None:
+                with fitz.open(pdf_file.file_path) as doc:
+                    page_count = doc.page_count
+            
+            if page_count <= 0:
+                continue
+            
+            starts.append(total_pages)
+            entries.append({
+                "file": pdf_file,
+                "first_page": total_pages + 1,
+                "page_count": page_count
+            })
+            total_pages += page_count
+        
+        return {"entries": entries, "starts": starts, "total_pages": total_pages}
+    
+    def resolve_virtual_page(self, virtual_doc: Dict[str, Any], page_number: int) -> Tuple[PDFFile, int]:
+        """Converte a página N do documento virtual em (arquivo de origem, índice da página)"""
+        if not 1 <= page_number <= virtual_doc["total_pages"]:
+            raise ValueError(f"Página {page_number} fora do intervalo 1-{virtual_doc['total_pages']}")
+        
+        index = bisect.bisect_right(virtual_doc["starts"], page_number - 1) - 1
+        entry = virtual_doc["entries"][index]
+        return entry["file"], page_number - entry["first_page"]
+    
+    def _document(self, file_path: str) -> ContextManager[fitz.Document]:
+        """Documento aberto somente para leitura durante o bloco, emprestado do cache"""
+        return document_cache.borrow(str(file_path))
+    
+    def render_page(self, file_path: str, page_index: int, dpi: Optional[int] = None) -> bytes:
+        """Renderiza uma única página como PNG"""
+        dpi = dpi or settings.PREVIEW_DPI
+        with self._document(file_path) as doc:
+            pix = doc[page_index].get_pixmap(matrix=fitz.Matrix(dpi / 72, dpi / 72))
+            return pix.tobytes("png")
+    
+    def extract_pages(self, file_path: str, pages: str) -> bytes:
+        """Monta em memória um PDF com as faixas de páginas pedidas (ex.: "1-3,5")"""
+        with self._document(file_path) as src:
+            page_ranges = parse_page_ranges(pages, src.page_count)
+            with fitz.open() as subset:
+                for start, end in page_ranges:
+                    subset.insert_pdf(src, from_page=start, to_page=end - 1)
+                # Sem deflate: os streams copiados já vêm comprimidos da origem
+                return subset.tobytes(garbage=1)
+    
+    def extract_page_pdf(self, file_path: str, page_index: int) -> bytes:
+        """Gera um PDF contendo apenas uma página do arquivo de origem"""
+        return self.extract_pages(file_path, str(page_index + 1))
+    
+    async def get_virtual_page(
+        self,
+        virtual_doc: Dict[str, Any],
+        page_number: int,
+        output_format: str = "png",
+        dpi: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Serve uma página do documento mesclado virtual a partir do arquivo de origem"""
         try:
-            doc = fitz.open(input_path)
+            pdf_file, page_index = self.resolve_virtual_page(virtual_doc, page_number)
+            loop = asyncio.get_running_loop()
             
-            # Aplicar compressão
-            doc.save(output_path, garbage=4, deflate=True, clean=True)
+            # Renderização e extração são síncronas (MuPDF): rodam em thread, fora do event loop
+            if output_format == "pdf":
+                content = await loop.run_in_executor(None, self.extract_page_pdf, pdf_file.file_path, page_index)
+                media_type = "application/pdf"
+            else:
+                content = await loop.run_in_executor(None, self.render_page, pdf_file.file_path, page_index, dpi)
+                media_type = "image/png"
             
+            return {
+                "success": True,
+                "content": content,
+                "media_type": media_type,
+                "source_file_id": pdf_file.id,
+                "source_page": page_index + 1,
+                "total_pages": virtual_doc["total_pages"]
+            }
+            
+        except Exception as e:
+            logger.error(f"Erro ao obter página virtual {page_number}: {str(e)}")
+            return {"success": False, "error": str(e)}
+    
+    async def get_sprite(self, project_id: int, kind: str, pdf_files: List[PDFFile]) -> Dict[str, Any]:
+        """Mapa da sprite do projeto; se ainda não existe, agenda a montagem em segundo plano
+        
+        A sprite fica em cache até o conjunto de arquivos mudar (a assinatura
+        entra no nome). Enquanto é montada, retorna status "building".
+        """
+        tile_size = tuple(settings.THUMBNAIL_SIZE if kind == "files" else settings.SPRITE_PAGE_TILE)
+        files = [
+            {
+                "file_id": pdf_file.id,
+                "stored_filename": pdf_file.stored_filename,
+                "file_path": pdf_file.file_path,
+                "thumbnail_path": pdf_file.thumbnail_path
+            }
+            for pdf_file in sorted(pdf_files, key=lambda x: x.order_index)
+        ]
+        name = sprite_name(project_id, kind, sprite_signature(kind, files, tile_size))
+        
+        sprite_map = load_sprite_map(settings.SPRITE_DIR, name)
+        if sprite_map is not None:
+            return {"status": "ready", **sprite_map}
+        
+        if name not in _sprite_jobs:
+            loop = asyncio.get_running_loop()
+            job = loop.run_in_executor(
+                get_process_pool(), build_sprite,
+                settings.SPRITE_DIR, name, kind, files, tile_size, settings.SPRITE_COLUMNS
+            )
+            _sprite_jobs[name] = job
+            job.add_done_callback(partial(self._sprite_done, name))
+        
+        return {"status": "building", "kind": kind}
+    
+    def _sprite_done(self, name: str, job: "asyncio.Future") -> None:
+        _sprite_jobs.pop(name, None)
+        if not job.cancelled() and job.exception() is not None:
+            logger.error(f"Erro ao montar sprite {name}: {str(job.exception())}")
+    
+    async def compress_pdf(
+        self,
+        input_path: str,
+        output_path: str,
+        quality: int = 85,
+        target_dpi: Optional[int] = None,
+        target_size: Optional[int] = None,
+        linearize: Optional[bool] = None
+    ) -> Dict[str, Any]:
+        """Comprime um PDF recodificando as imagens embutidas
+        
+        Com target_size (bytes), a qualidade passa a ser o teto: o valor usado é
+        estimado a partir de uma amostra das imagens e a recodificação completa
+        roda uma única vez.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+            target_dpi = target_dpi or settings.COMPRESS_TARGET_DPI
             original_size = Path(input_path).stat().st_size
+            estimate = None
+            
+            with fitz.open(input_path) as doc:
+                if target_size:
+                    estimate = await estimate_quality_for_size(
+                        doc,
+                        original_size,
+                        target_size,
+                        quality,
+                        target_dpi,
+                        get_process_pool(),
+                        min_bytes=settings.COMPRESS_MIN_IMAGE_BYTES
+                    )
+                    quality = estimate["quality"]
+                
+                # Reduzir e recodificar imagens no pool de processos
+                image_stats = await recompress_images(
+                    doc,
+                    quality,
+                    target_dpi,
+                    get_process_pool(),
+                    min_bytes=settings.COMPRESS_MIN_IMAGE_BYTES,
+                    max_in_flight=settings.PDF_WORKERS * 2
+                )
+                
+                # Aplicar compressão
+                await loop.run_in_executor(
+                    None, partial(doc.save, output_path, garbage=4, deflate=True, clean=True)
+                )
+            
+            linearization = None
+            if self._should_linearize(linearize):
+                linearization = await self._linearize_in_place(output_path)
+            
             compressed_size = Path(output_path).stat().st_size
             compression_ratio = round((1 - compressed_size / original_size) * 100, 2)
             
-            doc.close()
+            changed = [stats for stats in image_stats if stats["action"] != "skipped"]
             
-            return {
+            result = {
                 "success": True,
                 "original_size": original_size,
                 "compressed_size": compressed_size,
-                "compression_ratio": compression_ratio
+                "compression_ratio": compression_ratio,
+                "quality": quality,
+                "images_total": len(image_stats),
+                "images_recompressed": len(changed),
+                "image_bytes_saved": sum(s["original_bytes"] - s["new_bytes"] for s in changed),
+                "images": image_stats
             }
             
+            if linearization is not None:
+                result["linearization"] = linearization
+            
+            if estimate is not None:
+                result.update({
+                    "target_size": target_size,
+                    "predicted_size": estimate["predicted_size"],
+                    "sampled_images": estimate["sampled_images"],
+                    "target_met": compressed_size <= target_size
+                })
+            
+            return result
+            
         except Exception as e:
             logger.error(f"Erro ao comprimir PDF: {str(e)}")
             return {"success": False, "error": str(e)}
     
+    async def optimize_pdf(
+        self,
+        input_path: str,
+        output_path: str,
+        subset_fonts: bool = True,
+        prune_resources: bool = True
+    ) -> Dict[str, Any]:
+        """Otimiza um PDF: subconjunto de fontes, poda de recursos e object streams"""
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                get_process_pool(), optimize_pdf_file, input_path, output_path, subset_fonts, prune_resources
+            )
+            
+            return {"success": True, "output_path": output_path, **result}
+            
+        except Exception as e:
+            logger.error(f"Erro ao otimizar PDF: {str(e)}")
+            return {"success": False, "error": str(e)}
+    
+    async def _optimize_in_place(self, pdf_path: str) -> Dict[str, Any]:
+        """Aplica a otimização sobre uma saída já gravada"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_process_pool(), optimize_pdf_file, pdf_path, pdf_path)
+    
+    def _should_linearize(self, linearize: Optional[bool]) -> bool:
+        return settings.LINEARIZE_OUTPUTS if linearize is None else linearize
+    
+    async def _linearize_in_place(self, pdf_path: str) -> Dict[str, Any]:
+        """Lineariza uma saída já gravada; se falhar, a saída continua válida, só não linearizada"""
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(get_process_pool(), linearize_file, pdf_path)
+        
+        except Exception as e:
+            logger.warning(f"Linearização ignorada para {pdf_path}: {str(e)}")
+            return {"linearized": False, "error": str(e)}
+    
     async def extract_text_ocr(self, pdf_path: str) -> Dict[str, Any]:
         """Extrai texto do PDF usando OCR"""
         try:
@@ -222,73 +727,272 @@ class PDFService:
             logger.error(f"Erro no OCR: {str(e)}")
             return {"success": False, "error": str(e)}
     
-    async def add_watermark(self, pdf_path: str, watermark_text: str, output_path: str) -> Dict[str, Any]:
+    def iter_text(self, pdf_path: str, page_indexes: List[int], mode: str = "text") -> Iterator[Dict[str, Any]]:
+        """Texto nativo das páginas, uma de cada vez (gerador síncrono)"""
+        return iter_page_text(pdf_path, page_indexes, mode)
+    
+    async def extract_text(self, pdf_path: str, mode: str = "text", pages: Optional[str] = None) -> Dict[str, Any]:
+        """Extrai o texto nativo do PDF, sem OCR"""
+        def extract() -> List[Dict[str, Any]]:
+            return list(self.iter_text(pdf_path, self.select_pages(pdf_path, pages), mode))
+        
+        try:
+            loop = asyncio.get_running_loop()
+            extracted = await loop.run_in_executor(None, extract)
+            
+            return {
+                "success": True,
+                "pages": extracted,
+                **text_summary(len(extracted), sum(page["characters"] for page in extracted))
+            }
+        
+        except Exception as e:
+            logger.error(f"Erro ao extrair texto: {str(e)}")
+            return {"success": False, "error": str(e)}
+    
+    async def add_watermark(
+        self,
+        pdf_path: str,
+        watermark_text: str,
+        output_path: str,
+        opacity: float = 0.3,
+        font_size: int = 50,
+        rotation: int = 45,
+        incremental: bool = False,
+        optimize: bool = False,
+        linearize: Optional[bool] = None
+    ) -> Dict[str, Any]:
         """Adiciona marca d'água ao PDF"""
         try:
-            # Criar PDF com marca d'água
-            watermark_buffer = BytesIO()
-            c = canvas.Canvas(watermark_buffer, pagesize=letter)
-            
-            # Configurar texto da marca d'água
-            c.setFont("Helvetica", 50)
-            c.setFillColorRGB(0.5, 0.5, 0.5, alpha=0.3)
-            c.rotate(45)
-            c.drawString(200, 200, watermark_text)
-            c.save()
-            
-            # Aplicar marca d'água a todas as páginas
-            watermark_buffer.seek(0)
-            watermark_pdf = PdfReader(watermark_buffer)
-            watermark_page = watermark_pdf.pages[0]
-            
-            with open(pdf_path, "rb") as f:
-                pdf_reader = PdfReader(f)
-                pdf_writer = PdfWriter()
-                
-                for page in pdf_reader.pages:
-                    page.merge_page(watermark_page)
-                    pdf_writer.add_page(page)
-                
-                with open(output_path, "wb") as output_file:
-                    pdf_writer.write(output_file)
+            options = {"font_size": font_size, "opacity": opacity, "rotation": rotation}
+            loop = asyncio.get_running_loop()
+            pool = get_process_pool()
+            
+            # Atualização incremental: custo proporcional às páginas, não ao tamanho dos streams.
+            # Otimização e linearização regravam o arquivo inteiro, então não se combinam com ela
+            linearize = self._should_linearize(linearize)
+            if incremental and not optimize and not linearize:
+                try:
+                    stats = await loop.run_in_executor(
+                        pool, partial(watermark_incremental, pdf_path, output_path, watermark_text, **options)
+                    )
+                    return {
+                        "success": True,
+                        "output_path": output_path,
+                        "file_size": os.path.getsize(output_path),
+                        "incremental": True,
+                        **stats
+                    }
+                except Exception as e:
+                    logger.warning(f"Atualização incremental indisponível, regravando o arquivo: {str(e)}")
+            
+            with fitz.open(pdf_path) as doc:
+                page_count = doc.page_count
+            
+            chunk_count = 1
+            if page_count >= settings.WATERMARK_PARALLEL_MIN_PAGES and settings.PDF_WORKERS > 1:
+                ranges = partition_by_pages([1] * page_count, settings.PDF_WORKERS)
+                chunk_count = len(ranges)
+            
+            stamps = None
+            if chunk_count > 1:
+                # Os carimbos saem em paralelo; aplicá-los é uma única passada sobre uma cópia do
+                # original, que mantém links, formulários e destinos entre as partes
+                chunk_stamps = await asyncio.gather(*[
+                    loop.run_in_executor(
+                        pool, partial(build_stamps, pdf_path, start, end, watermark_text, **options)
+                    )
+                    for start, end in ranges
+                ])
+                stamps = {size: stamp for chunk in chunk_stamps for size, stamp in chunk.items()}
+            
+            stats = await loop.run_in_executor(
+                pool, partial(watermark_file, pdf_path, output_path, watermark_text, stamps=stamps, **options)
+            )
+            
+            result = {
+                "success": True,
+                "output_path": output_path,
+                "file_size": os.path.getsize(output_path),
+                "incremental": False,
+                "parallel": chunk_count > 1,
+                "chunks": chunk_count,
+                **stats
+            }
             
-            return {"success": True, "output_path": output_path}
+            if optimize:
+                result["optimization"] = await self._optimize_in_place(output_path)
+                result["file_size"] = os.path.getsize(output_path)
+            
+            if linearize:
+                result["linearization"] = await self._linearize_in_place(output_path)
+                result["file_size"] = os.path.getsize(output_path)
+            
+            return result
             
         except Exception as e:
             logger.error(f"Erro ao adicionar marca d'água: {str(e)}")
             return {"success": False, "error": str(e)}
     
-    async def split_pdf(self, pdf_path: str, output_dir: str, pages_per_file: int = 1) -> Dict[str, Any]:
+    def plan_split(
+        self,
+        pdf_path: str,
+        mode: str = "pages",
+        pages_per_file: int = 1,
+        ranges: Optional[str] = None,
+        bookmark_level: int = 1,
+        max_size: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Calcula as partes da divisão; levanta ValueError para parâmetros inválidos"""
+        return plan_split(pdf_path, mode, pages_per_file, ranges, bookmark_level, max_size)
+    
+    async def iter_split(
+        self,
+        pdf_path: str,
+        parts: List[Dict[str, Any]],
+        output_dir: str,
+        output_prefix: str = "split"
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Grava as partes em paralelo e as entrega em ordem, assim que cada uma fica pronta"""
+        os.makedirs(output_dir, exist_ok=True)
+        for part in parts:
+            part["output_path"] = str(Path(output_dir) / f"{output_prefix}_{part['index']}.pdf")
+        
+        calls = (
+            (write_split_part, pdf_path, part["start_page"] - 1, part["end_page"], part["output_path"])
+            for part in parts
+        )
+        sizes = iter_in_window(get_process_pool(), calls)
+        try:
+            for part in parts:
+                part["file_size"] = await anext(sizes)
+                yield part
+        finally:
+            # Cliente desconectado ou erro: não iniciar as partes restantes
+            await sizes.aclose()
+    
+    async def split_pdf(
+        self,
+        pdf_path: str,
+        output_dir: str,
+        pages_per_file: int = 1,
+        mode: str = "pages",
+        ranges: Optional[str] = None,
+        bookmark_level: int = 1,
+        max_size: Optional[int] = None,
+        output_prefix: str = "split"
+    ) -> Dict[str, Any]:
         """Divide um PDF em múltiplos arquivos"""
         try:
-            with open(pdf_path, "rb") as f:
-                pdf_reader = PdfReader(f)
-                total_pages = len(pdf_reader.pages)
-                
-                output_files = []
-                
-                for i in range(0, total_pages, pages_per_file):
-                    pdf_writer = PdfWriter()
-                    
-                    # Adicionar páginas ao novo PDF
-                    for j in range(i, min(i + pages_per_file, total_pages)):
-                        pdf_writer.add_page(pdf_reader.pages[j])
-                    
-                    # Salvar arquivo dividido
-                    output_filename = f"split_{i//pages_per_file + 1}.pdf"
-                    output_path = Path(output_dir) / output_filename
-                    
-                    with open(output_path, "wb") as output_file:
-                        pdf_writer.write(output_file)
-                    
-                    output_files.append(str(output_path))
-                
-                return {
-                    "success": True,
-                    "output_files": output_files,
-                    "total_files": len(output_files)
-                }
-                
+            loop = asyncio.get_running_loop()
+            parts = await loop.run_in_executor(
+                None, self.plan_split, pdf_path, mode, pages_per_file, ranges, bookmark_level, max_size
+            )
+            
+            written = [part async for part in self.iter_split(pdf_path, parts, output_dir, output_prefix)]
+            
+            return {
+                "success": True,
+                "output_files": [part["output_path"] for part in written],
+                "total_files": len(written),
+                "parts": written
+            }
+            
         except Exception as e:
             logger.error(f"Erro ao dividir PDF: {str(e)}")
-            return {"success": False, "error": str(e)}
\ No newline at end of file
+            return {"success": False, "error": str(e)}
+    
+    def select_pages(self, pdf_path: str, pages: Optional[str] = None) -> List[int]:
+        """Índices das páginas pedidas (todas, se não houver faixa); ValueError se inválidas"""
+        with self._document(pdf_path) as doc:
+            page_ranges = parse_page_ranges(pages, doc.page_count) if pages else [(0, doc.page_count)]
+        return [index for start, end in page_ranges for index in range(start, end)]
+    
+    async def iter_rasterize(
+        self,
+        pdf_path: str,
+        page_indexes: List[int],
+        output_dir: str,
+        dpi: Optional[int] = None,
+        image_format: str = "png",
+        quality: int = 85
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Renderiza as páginas em lotes no pool e as entrega em ordem, à medida que ficam prontas"""
+        dpi = dpi or settings.PREVIEW_DPI
+        os.makedirs(output_dir, exist_ok=True)
+        
+        batch_size = settings.RASTER_BATCH_PAGES
+        batches = [page_indexes[i:i + batch_size] for i in range(0, len(page_indexes), batch_size)]
+        
+        calls = ((render_batch, pdf_path, batch, dpi, image_format, quality, output_dir) for batch in batches)
+        rendered = iter_in_window(get_process_pool(), calls)
+        try:
+            async for pages in rendered:
+                for page in pages:
+                    yield page
+        finally:
+            # Cliente desconectado ou erro: não iniciar os lotes restantes
+            await rendered.aclose()
+    
+    async def rasterize_pdf(
+        self,
+        pdf_path: str,
+        output_dir: str,
+        pages: Optional[str] = None,
+        dpi: Optional[int] = None,
+        image_format: str = "png",
+        quality: int = 85
+    ) -> Dict[str, Any]:
+        """Exporta páginas do PDF como imagens"""
+        try:
+            start = time.perf_counter()
+            page_indexes = self.select_pages(pdf_path, pages)
+            rendered = [
+                page async for page in self.iter_rasterize(pdf_path, page_indexes, output_dir, dpi, image_format, quality)
+            ]
+            
+            return {
+                "success": True,
+                "output_dir": output_dir,
+                "pages": rendered,
+                **raster_summary(len(rendered), time.perf_counter() - start)
+            }
+        
+        except Exception as e:
+            logger.error(f"Erro ao rasterizar PDF: {str(e)}")
+            return {"success": False, "error": str(e)}
+    
+    async def iter_extract_images(
+        self,
+        pdf_path: str,
+        page_indexes: List[int],
+        output_dir: str
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Extrai as imagens em uma thread, entregando cada uma assim que é gravada"""
+        loop = asyncio.get_running_loop()
+        images = iter_images(pdf_path, page_indexes, output_dir)
+        try:
+            while True:
+                image = await loop.run_in_executor(None, next, images, None)
+                if image is None:
+                    break
+                yield image
+        finally:
+            images.close()
+    
+    async def extract_images(self, pdf_path: str, output_dir: str, pages: Optional[str] = None) -> Dict[str, Any]:
+        """Extrai as imagens embutidas no PDF, sem recodificar quando o formato permite"""
+        try:
+            page_indexes = self.select_pages(pdf_path, pages)
+            images = [image async for image in self.iter_extract_images(pdf_path, page_indexes, output_dir)]
+            
+            return {
+                "success": True,
+                "output_dir": output_dir,
+                "images": images,
+                **image_summary(images)
+            }
+        
+        except Exception as e:
+            logger.error(f"Erro ao extrair imagens: {str(e)}")
+            return {"success": False, "error": str(e)}
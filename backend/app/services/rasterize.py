@@ -0,0 +1,61 @@
+import os
+from io import BytesIO
+from typing import List, Dict, Any
+import fitz  # PyMuPDF
+from PIL import Image
+
+from .document_cache import document_cache
+
+RASTER_FORMATS = {"png": "png", "jpeg": "jpg", "webp": "webp"}
+
+def encode_pixmap(pix: fitz.Pixmap, image_format: str, quality: int) -> bytes:
+    """Codifica a página renderizada no formato pedido"""
+    if image_format == "png":
+        return pix.tobytes("png")
+    if image_format == "jpeg":
+        return pix.tobytes("jpeg", jpg_quality=quality)
+    
+    img = Image.frombytes("L" if pix.n == 1 else "RGB", (pix.width, pix.height), pix.samples)
+    buffer = BytesIO()
+    img.save(buffer, "WEBP", quality=quality)
+    return buffer.getvalue()
+
+def render_batch(
+    pdf_path: str,
+    page_indexes: List[int],
+    dpi: int,
+    image_format: str,
+    quality: int,
+    output_dir: str
+) -> List[Dict[str, Any]]:
+    """Renderiza um lote de páginas (executado no pool de processos)
+    
+    O documento vem do cache do worker, então cada processo o abre uma vez
+    por mais lotes que receba.
+    """
+    results = []
+    with document_cache.borrow(pdf_path) as doc:
+        for index in page_indexes:
+            pix = doc[index].get_pixmap(dpi=dpi)
+            data = encode_pixmap(pix, image_format, quality)
+            
+            output_path = os.path.join(output_dir, f"page_{index + 1:05d}.{RASTER_FORMATS[image_format]}")
+            with open(output_path, "wb") as f:
+                f.write(data)
+            
+            results.append({
+                "page": index + 1,
+                "width": pix.width,
+                "height": pix.height,
+                "file_size": len(data),
+                "output_path": output_path
+            })
+    return results
+
+def raster_summary(page_count: int, seconds: float) -> Dict[str, Any]:
+    """Totais da exportação, incluindo a vazão em páginas por segundo"""
+    return {
+        "total_pages": page_count,
+        "seconds": round(seconds, 3),
+        "pages_per_second": round(page_count / seconds, 2) if seconds > 0 else 0.0
+    }
@@ -0,0 +1,257 @@
+import os
+import re
+import json
+import time
+import uuid
+import base64
+import shutil
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Optional, Dict, Any, Tuple
+from starlette.concurrency import run_in_threadpool
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+TUS_VERSION = "1.0.0"
+OFFSET_CONTENT_TYPE = "application/offset+octet-stream"
+
+UPLOAD_ID = re.compile(r"^[0-9a-f]{32}$")
+
+# Blocos do corpo são acumulados até este tamanho antes de ir ao disco
+_WRITE_BUFFER = 1024 * 1024
+
+def parse_upload_metadata(header: Optional[str]) -> Dict[str, str]:
+    """Cabeçalho Upload-Metadata do tus: pares "chave valor-em-base64" separados por vírgula"""
+    metadata: Dict[str, str] = {}
+    for item in (header or "").split(","):
+        key, _, value = item.strip().partition(" ")
+        if not key:
+            continue
+        try:
+            metadata[key] = base64.b64decode(value.strip(), validate=True).decode("utf-8") if value else ""
+        except ValueError:
+            raise ValueError(f"Upload-Metadata inválido para a chave {key}")
+    return metadata
+
+class ResumableUploads:
+    """Uploads retomáveis no estilo tus, para arquivos grandes em conexões instáveis
+    
+    Cada upload é um arquivo .part em store_dir e um .json com dono, projeto,
+    nome e tamanho final. Os blocos (PATCH) são gravados direto na posição
+    final do .part e passam pelo SHA-256 à medida que chegam; o offset atual é
+    o próprio tamanho do .part, então sobrevive a quedas da conexão e a
+    reinícios do servidor. Ao finalizar, o .part é movido para o diretório de
+    uploads com o hash já pronto, sem cópia nem releitura do arquivo.
+    """
+    
+    def __init__(self, store_dir: str, ttl: int):
+        self.store_dir = Path(store_dir)
+        self.ttl = ttl
+        # Estado do SHA-256 por upload, com o offset até onde ele já leu
+        self._hashers: Dict[str, Tuple[int, Any]] = {}
+        self._busy: set = set()
+        self._lock = threading.Lock()
+    
+    def _paths(self, upload_id: str) -> Tuple[Path, Path]:
+        return self.store_dir / f"{upload_id}.part", self.store_dir / f"{upload_id}.json"
+    
+    def create(self, owner_id: int, project_id: int, filename: str, length: int) -> Dict[str, Any]:
+        """Registra um upload vazio de length bytes"""
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        self.expire()
+        
+        upload_id = uuid.uuid4().hex
+        part_path, info_path = self._paths(upload_id)
+        info = {
+            "upload_id": upload_id,
+            "owner_id": owner_id,
+            "project_id": project_id,
+            "filename": filename,
+            "length": length,
+            "created_at": time.time()
+        }
+        part_path.touch()
+        info_path.write_text(json.dumps(info), encoding="utf-8")
+        return {**info, "offset": 0}
+    
+    def get(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """Estado do upload com o offset atual, ou None"""
+        if not UPLOAD_ID.match(upload_id):
+            return None
+        part_path, info_path = self._paths(upload_id)
+        try:
+            info = json.loads(info_path.read_text(encoding="utf-8"))
+            return {**info, "offset": part_path.stat().st_size}
+        except (FileNotFoundError, ValueError):
+            return None
+    
+    async def append(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """Grava o corpo de um PATCH a partir de offset
+        
+        Como no tus, o offset precisa ser o atual: não há blocos fora de ordem
+        nem dois PATCH simultâneos no mesmo upload. O que chegou antes de uma
+        queda da conexão fica gravado; o cliente retoma a partir do HEAD.
+        """
+        if not self._acquire(upload_id):
+            return {"success": False, "reason": "locked", "error": "Upload já está recebendo outro bloco"}
+        try:
+            info = self.get(upload_id)
+            if info is None:
+                return {"success": False, "reason": "not_found", "error": "Upload não encontrado"}
+            if offset != info["offset"]:
+                return {
+                    "success": False,
+                    "reason": "offset",
+                    "offset": info["offset"],
+                    "error": f"Offset {offset} não confere com o atual ({info['offset']})"
+                }
+            return await self._write(upload_id, offset, info["length"], chunks)
+        finally:
+            self._release(upload_id)
+    
+    async def _write(self, upload_id: str, offset: int, length: int, chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+        part_path, _ = self._paths(upload_id)
+        hasher = await run_in_threadpool(self._hasher, upload_id, part_path, offset)
+        
+        position = offset
+        buffer = bytearray()
+        result: Dict[str, Any] = {"success": True}
+        
+        f = await run_in_threadpool(open, part_path, "r+b")
+        try:
+            f.seek(offset)
+            async for chunk in chunks:
+                if position + len(buffer) + len(chunk) > length:
+                    result = {"success": False, "reason": "length", "error": "Bloco ultrapassa o tamanho declarado do upload"}
+                    break
+                buffer += chunk
+                if len(buffer) >= _WRITE_BUFFER:
+                    await run_in_threadpool(self._flush, f, hasher, buffer)
+                    position += len(buffer)
+                    buffer = bytearray()
+        
+        except Exception as e:
+            logger.error(f"Erro ao receber bloco do upload {upload_id}: {str(e)}")
+            result = {"success": False, "reason": "interrupted", "error": str(e)}
+        
+        finally:
+            # Mesmo interrompido, o que já chegou é gravado e conta para o offset
+            try:
+                if buffer:
+                    await run_in_threadpool(self._flush, f, hasher, buffer)
+                    position += len(buffer)
+            finally:
+                f.close()
+                with self._lock:
+                    self._hashers[upload_id] = (position, hasher)
+        
+        return {**result, "offset": position}
+    
+    @staticmethod
+    def _flush(f: BinaryIO, hasher: Any, buffer: bytearray) -> None:
+        f.write(buffer)
+        f.flush()
+        hasher.update(buffer)
+    
+    def _hasher(self, upload_id: str, part_path: Path, offset: int) -> Any:
+        """SHA-256 dos primeiros offset bytes
+        
+        Normalmente vem da memória; depois de um reinício (ou de uma gravação
+        que falhou no meio) é refeito lendo o que já está no disco, uma vez.
+        """
+        with self._lock:
+            cached = self._hashers.get(upload_id)
+        if cached is not None and cached[0] == offset:
+            return cached[1]
+        
+        hasher = hashlib.sha256()
+        remaining = offset
+        with open(part_path, "rb") as f:
+            while remaining:
+                chunk = f.read(min(_WRITE_BUFFER, remaining))
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                remaining -= len(chunk)
+        return hasher
+    
+    def finish(self, upload_id: str, destination: Path) -> Dict[str, Any]:
+        """Move o upload completo para destination e retorna o hash do conteúdo"""
+        if not self._acquire(upload_id):
+            return {"success": False, "reason": "locked", "error": "Upload ainda está recebendo um bloco"}
+        try:
+            info = self.get(upload_id)
+            if info is None:
+                return {"success": False, "reason": "not_found", "error": "Upload não encontrado"}
+            if info["offset"] != info["length"]:
+                return {
+                    "success": False,
+                    "reason": "incomplete",
+                    "error": f"Upload incompleto: {info['offset']} de {info['length']} bytes"
+                }
+            
+            part_path, info_path = self._paths(upload_id)
+            content_hash = self._hasher(upload_id, part_path, info["offset"]).hexdigest()
+            try:
+                os.replace(part_path, destination)
+            except OSError:
+                # Diretórios em sistemas de arquivos diferentes
+                shutil.move(str(part_path), str(destination))
+            self._discard(upload_id)
+            
+            return {
+                "success": True,
+                "filename": info["filename"],
+                "file_size": info["length"],
+                "content_hash": content_hash
+            }
+        finally:
+            self._release(upload_id)
+    
+    def delete(self, upload_id: str) -> bool:
+        """Descarta o upload (extensão termination do tus)"""
+        if not self._acquire(upload_id):
+            return False
+        try:
+            self._discard(upload_id)
+            return True
+        finally:
+            self._release(upload_id)
+    
+    def expire(self) -> int:
+        """Remove uploads sem atividade há mais de ttl segundos"""
+        removed = 0
+        cutoff = time.time() - self.ttl
+        for info_path in self.store_dir.glob("*.json"):
+            upload_id = info_path.stem
+            part_path, _ = self._paths(upload_id)
+            try:
+                last_activity = max(info_path.stat().st_mtime, part_path.stat().st_mtime)
+            except FileNotFoundError:
+                last_activity = 0
+            if last_activity < cutoff and self.delete(upload_id):
+                removed += 1
+        return removed
+    
+    def _discard(self, upload_id: str) -> None:
+        for path in self._paths(upload_id):
+            path.unlink(missing_ok=True)
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+    
+    def _acquire(self, upload_id: str) -> bool:
+        with self._lock:
+            if upload_id in self._busy:
+                return False
+            self._busy.add(upload_id)
+            return True
+    
+    def _release(self, upload_id: str) -> None:
+        with self._lock:
+            self._busy.discard(upload_id)
+
+resumable_uploads = ResumableUploads(settings.RESUMABLE_UPLOAD_DIR, settings.RESUMABLE_UPLOAD_TTL)
@@ -0,0 +1,297 @@
+import os
+import html
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional, Dict, Any, Tuple
+import fitz  # PyMuPDF
+import pytesseract
+from PIL import Image
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.pdf_project import PDFProject, PDFFile
+from .pdf_service import get_process_pool
+from .text_extract import page_text
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    content_hash TEXT PRIMARY KEY,
+    page_count INTEGER NOT NULL,
+    indexed_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5(
+    text,
+    content_hash UNINDEXED,
+    page UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS files (
+    file_id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    owner_id INTEGER NOT NULL,
+    project_id INTEGER NOT NULL,
+    filename TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_content_owner ON files (content_hash, owner_id);
+"""
+
+# Delimitadores do trecho destacado; trocados por <mark> depois de escapar o texto
+HIGHLIGHT_START, HIGHLIGHT_END = "\x02", "\x03"
+
+def extract_document_pages(pdf_path: str, ocr: bool) -> List[Tuple[int, str]]:
+    """Texto de cada página (executado no pool de processos)
+    
+    Páginas sem texto nativo passam pelo OCR quando habilitado.
+    """
+    pages = []
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            text = page_text(page, "text")["text"]
+            if not text and ocr:
+                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
+                img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+                try:
+                    text = pytesseract.image_to_string(img, lang=settings.OCR_LANGUAGE).strip()
+                except pytesseract.TesseractNotFoundError as e:
+                    logger.error(f"Erro no OCR: {str(e)}")
+                    ocr = False
+                except pytesseract.TesseractError as e:
+                    logger.error(f"Erro no OCR da página {page.number + 1}: {str(e)}")
+            pages.append((page.number + 1, text))
+    return pages
+
+def match_expression(query: str) -> str:
+    """Converte a busca do usuário em uma expressão FTS5: todos os termos, literais"""
+    terms = query.split()
+    if not terms:
+        raise ValueError("Informe ao menos um termo de busca")
+    return " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+def _render_snippet(snippet: str) -> str:
+    return html.escape(snippet).replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_END, "</mark>")
+
+class SearchIndex:
+    """Índice FTS5 do texto das páginas, em um banco SQLite próprio
+    
+    As páginas são indexadas por hash do conteúdo, então reenvios do mesmo
+    arquivo apenas registram o novo PDFFile na tabela files. A indexação roda
+    em uma thread: a extração vai para o pool de processos e as inserções são
+    agrupadas em transações de até SEARCH_INDEX_BATCH_PAGES páginas.
+    """
+    
+    def __init__(self, path: str, batch_pages: int):
+        self.path = path
+        self.batch_pages = batch_pages
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._schema_ready = False
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        if not self._schema_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._schema_ready = True
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+    
+    def enqueue(
+        self,
+        file_id: int,
+        file_path: str,
+        content_hash: str,
+        owner_id: int,
+        project_id: int,
+        filename: str
+    ) -> None:
+        """Agenda a indexação de um arquivo; retorna imediatamente"""
+        self._queue.put({
+            "file_id": file_id,
+            "file_path": file_path,
+            "content_hash": content_hash,
+            "owner_id": owner_id,
+            "project_id": project_id,
+            "filename": filename
+        })
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="search-indexer", daemon=True)
+                self._worker.start()
+    
+    def requeue_missing(self, session_factory: Callable[[], Session]) -> int:
+        """Reagenda os arquivos cujo conteúdo ainda não está no índice
+        
+        A fila só existe na memória: arquivos enviados pouco antes de o
+        servidor parar (ou com a indexação interrompida no meio) são
+        recuperados na inicialização. Retorna quantos foram reagendados.
+        """
+        conn = self._connect()
+        try:
+            indexed = {
+                file_id for (file_id,) in conn.execute(
+                    "SELECT f.file_id FROM files f JOIN documents d ON d.content_hash = f.content_hash"
+                )
+            }
+        finally:
+            conn.close()
+        
+        db = session_factory()
+        try:
+            rows = (
+                db.query(
+                    PDFFile.id, PDFFile.file_path, PDFFile.content_hash,
+                    PDFProject.owner_id, PDFFile.project_id, PDFFile.original_filename
+                )
+                .join(PDFProject, PDFFile.project_id == PDFProject.id)
+                .filter(PDFFile.content_hash.isnot(None))
+                .all()
+            )
+        finally:
+            db.close()
+        
+        requeued = 0
+        for file_id, file_path, content_hash, owner_id, project_id, filename in rows:
+            if file_id in indexed or not os.path.exists(file_path):
+                continue
+            self.enqueue(file_id, file_path, content_hash, owner_id, project_id, filename)
+            requeued += 1
+        return requeued
+    
+    def wait_idle(self) -> None:
+        """Bloqueia até a fila de indexação esvaziar"""
+        self._queue.join()
+    
+    def _run(self) -> None:
+        while True:
+            jobs = [self._queue.get()]
+            # O que já estiver na fila entra no mesmo lote de transações
+            while True:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            try:
+                self.index_jobs(jobs)
+            except Exception as e:
+                logger.error(f"Erro ao indexar documentos: {str(e)}")
+            finally:
+                for _ in jobs:
+                    self._queue.task_done()
+    
+    def index_jobs(self, jobs: List[Dict[str, Any]]) -> None:
+        """Indexa os arquivos pendentes, reaproveitando conteúdos já indexados"""
+        ocr = settings.OCR_ENABLED and settings.SEARCH_INDEX_OCR
+        conn = self._connect()
+        try:
+            pending = 0
+            for job in jobs:
+                conn.execute(
+                    "INSERT OR REPLACE INTO files (file_id, content_hash, owner_id, project_id, filename) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (job["file_id"], job["content_hash"], job["owner_id"], job["project_id"], job["filename"])
+                )
+                pending += 1
+                
+                indexed = conn.execute(
+                    "SELECT 1 FROM documents WHERE content_hash = ?", (job["content_hash"],)
+                ).fetchone()
+                if indexed:
+                    continue
+                
+                try:
+                    pages = get_process_pool().submit(extract_document_pages, job["file_path"], ocr).result()
+                except Exception as e:
+                    logger.error(f"Erro ao extrair texto de {job['filename']}: {str(e)}")
+                    continue
+                
+                # Restos de uma indexação interrompida do mesmo conteúdo
+                conn.execute("DELETE FROM pages WHERE content_hash = ?", (job["content_hash"],))
+                for start in range(0, len(pages), self.batch_pages):
+                    batch = pages[start:start + self.batch_pages]
+                    conn.executemany(
+                        "INSERT INTO pages (text, content_hash, page) VALUES (?, ?, ?)",
+                        [(text, job["content_hash"], page) for page, text in batch if text]
+                    )
+                    pending += len(batch)
+                    if pending >= self.batch_pages:
+                        conn.commit()
+                        pending = 0
+                
+                # Só marcado como indexado depois de todas as páginas
+                conn.execute(
+                    "INSERT INTO documents (content_hash, page_count, indexed_at) VALUES (?, ?, ?)",
+                    (job["content_hash"], len(pages), time.time())
+                )
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def search(
+        self,
+        query: str,
+        owner_id: int,
+        project_id: Optional[int] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """Páginas que contêm todos os termos, ordenadas por relevância (bm25)"""
+        expression = match_expression(query)
+        filters = "pages MATCH ? AND f.owner_id = ?"
+        params: List[Any] = [expression, owner_id]
+        if project_id is not None:
+            filters += " AND f.project_id = ?"
+            params.append(project_id)
+        
+        conn = self._connect()
+        try:
+            total = conn.execute(
+                f"SELECT COUNT(*) FROM pages p JOIN files f ON f.content_hash = p.content_hash WHERE {filters}",
+                params
+            ).fetchone()[0]
+            
+            rows = conn.execute(
+                "SELECT f.file_id, f.project_id, f.filename, p.page, "
+                "snippet(pages, 0, ?, ?, '…', 16), bm25(pages) AS score "
+                f"FROM pages p JOIN files f ON f.content_hash = p.content_hash WHERE {filters} "
+                "ORDER BY score, f.file_id, p.page LIMIT ? OFFSET ?",
+                [HIGHLIGHT_START, HIGHLIGHT_END, *params, limit, offset]
+            ).fetchall()
+        finally:
+            conn.close()
+        
+        return {
+            "query": query,
+            "total": total,
+            "limit": limit,
+            "offset": offset,
+            "hits": [
+                {
+                    "file_id": file_id,
+                    "project_id": hit_project_id,
+                    "filename": filename,
+                    "page": page,
+                    "snippet": _render_snippet(snippet),
+                    "score": round(-score, 6)
+                }
+                for file_id, hit_project_id, filename, page, snippet, score in rows
+            ]
+        }
+    
+    def stats(self) -> Dict[str, Any]:
+        """Tamanho do índice e da fila"""
+        conn = self._connect()
+        try:
+            documents, pages = conn.execute("SELECT COUNT(*), COALESCE(SUM(page_count), 0) FROM documents").fetchone()
+            files = conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        finally:
+            conn.close()
+        return {"documents": documents, "pages": pages, "files": files, "queued": self._queue.qsize()}
+
+search_index = SearchIndex(settings.SEARCH_INDEX_PATH, settings.SEARCH_INDEX_BATCH_PAGES)
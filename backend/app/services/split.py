@@ -0,0 +1,151 @@
+import os
+import re
+from typing import List, Optional, Dict, Any, Tuple
+import fitz  # PyMuPDF
+
+from .document_cache import document_cache
+from .optimization import FONT_FILE_KEYS, _font_descriptors
+
+SPLIT_MODES = ("pages", "ranges", "bookmarks", "size")
+
+def parse_page_ranges(spec: str, page_count: int) -> List[Tuple[int, int]]:
+    """Converte "1-3,5,8-" em faixas [início, fim) baseadas em zero"""
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        match = re.fullmatch(r"(\d*)\s*-\s*(\d*)|(\d+)", part)
+        if not part or not match or match.group(0) == "-":
+            raise ValueError(f"Faixa de páginas inválida: '{part}'")
+        
+        if match.group(3):
+            first = last = int(match.group(3))
+        else:
+            first = int(match.group(1) or 1)
+            last = int(match.group(2) or page_count)
+        
+        if not 1 <= first <= last <= page_count:
+            raise ValueError(f"Faixa fora do documento (1-{page_count}): '{part}'")
+        ranges.append((first - 1, last))
+    return ranges
+
+def _page_resource_sizes(doc: fitz.Document, page: fitz.Page) -> Dict[int, int]:
+    """Tamanho dos streams de imagens e fontes embutidas usados pela página"""
+    sizes = {}
+    for image in page.get_images(full=True):
+        sizes[image[0]] = len(doc.xref_stream_raw(image[0]))
+    
+    for font in page.get_fonts():
+        if font[0] <= 0:
+            continue
+        for descriptor in _font_descriptors(doc, font[0]):
+            for key in FONT_FILE_KEYS:
+                kind, value = doc.xref_get_key(descriptor, key)
+                if kind == "xref":
+                    font_file = int(value.split()[0])
+                    sizes[font_file] = len(doc.xref_stream_raw(font_file))
+    return sizes
+
+def _plan_by_size(doc: fitz.Document, max_size: int) -> List[Tuple[int, int]]:
+    """Agrupa páginas consecutivas enquanto o tamanho estimado couber no limite
+    
+    Recursos compartilhados (imagens e fontes) contam uma vez por parte, como
+    acontecerá no arquivo gerado. Uma página maior que o limite fica sozinha.
+    """
+    ranges = []
+    start = 0
+    estimated = 0
+    seen: Dict[int, int] = {}
+    
+    for page in doc:
+        content = sum(len(doc.xref_stream_raw(xref)) for xref in page.get_contents())
+        resources = _page_resource_sizes(doc, page)
+        added = content + sum(size for xref, size in resources.items() if xref not in seen)
+        
+        if page.number > start and estimated + added > max_size:
+            ranges.append((start, page.number))
+            start = page.number
+            seen = {}
+            estimated = 0
+            added = content + sum(resources.values())
+        
+        estimated += added
+        seen.update(resources)
+    
+    ranges.append((start, doc.page_count))
+    return ranges
+
+def _plan_by_bookmarks(doc: fitz.Document, level: int) -> List[Tuple[int, int, str]]:
+    """Uma parte por marcador do nível pedido; páginas antes do primeiro viram uma parte própria"""
+    starts: Dict[int, str] = {}
+    for entry_level, title, page_number in doc.get_toc(simple=True):
+        if entry_level == level and page_number >= 1 and page_number - 1 not in starts:
+            starts[page_number - 1] = title
+    
+    if not starts:
+        raise ValueError(f"Documento sem marcadores no nível {level}")
+    
+    boundaries = sorted(starts)
+    if boundaries[0] != 0:
+        boundaries.insert(0, 0)
+    
+    parts = []
+    for index, start in enumerate(boundaries):
+        end = boundaries[index + 1] if index + 1 < len(boundaries) else doc.page_count
+        parts.append((start, end, starts.get(start, "")))
+    return parts
+
+def plan_split(
+    pdf_path: str,
+    mode: str = "pages",
+    pages_per_file: int = 1,
+    ranges: Optional[str] = None,
+    bookmark_level: int = 1,
+    max_size: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """Abre a origem uma vez e calcula as partes [início, fim) de cada arquivo"""
+    if mode not in SPLIT_MODES:
+        raise ValueError(f"Modo de divisão inválido: {mode}")
+    
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+        if mode == "pages":
+            parts = [
+                (start, min(start + pages_per_file, page_count), "")
+                for start in range(0, page_count, pages_per_file)
+            ]
+        elif mode == "ranges":
+            if not ranges:
+                raise ValueError("Informe as faixas de páginas")
+            parts = [(start, end, "") for start, end in parse_page_ranges(ranges, page_count)]
+        elif mode == "bookmarks":
+            parts = _plan_by_bookmarks(doc, bookmark_level)
+        else:
+            if not max_size:
+                raise ValueError("Informe o tamanho máximo por arquivo")
+            parts = [(start, end, "") for start, end in _plan_by_size(doc, max_size)]
+    
+    return [
+        {"index": index + 1, "start_page": start + 1, "end_page": end, "label": label}
+        for index, (start, end, label) in enumerate(parts)
+    ]
+
+def write_split_part(pdf_path: str, start: int, end: int, output_path: str) -> int:
+    """Grava as páginas [start, end) em um novo arquivo (executado no pool de processos)"""
+    # Cache do próprio worker: cada processo analisa a origem uma única vez
+    with document_cache.borrow(pdf_path) as src, fitz.open() as part:
+        part.insert_pdf(src, from_page=start, to_page=end - 1)
+        
+        # Manter os marcadores que apontam para dentro da parte
+        toc = [
+            [level, title, page_number - start]
+            for level, title, page_number in src.get_toc(simple=True)
+            if start < page_number <= end
+        ]
+        if toc:
+            toc[0][0] = 1
+            for previous, entry in zip(toc, toc[1:]):
+                entry[0] = min(entry[0], previous[0] + 1)
+            part.set_toc(toc)
+        
+        part.save(output_path, garbage=1)
+    return os.path.getsize(output_path)
@@ -0,0 +1,133 @@
+import os
+import re
+import json
+import hashlib
+from pathlib import Path
+from typing import Iterator, List, Optional, Dict, Any, Tuple
+import fitz  # PyMuPDF
+from PIL import Image
+
+from .thumbnails import write_variants
+
+# AVIF fica de fora: codificar uma folha inteira leva segundos
+SPRITE_FORMATS = ("webp", "jpg")
+
+# Maior dimensão aceita pelo WebP
+MAX_SHEET_SIDE = 16383
+
+SPRITE_NAME = re.compile(r"^\d+-(files|pages)-[0-9a-f]{16}-\d+$")
+
+def sprite_signature(kind: str, files: List[Dict[str, Any]], tile_size: Tuple[int, int]) -> str:
+    """Hash do conjunto de arquivos do projeto
+    
+    A ordem dos arquivos não entra: os tiles são localizados pelo file_id, então
+    reordenar o projeto não obriga a remontar a sprite.
+    """
+    parts = sorted(
+        f"{entry['file_id']}:{entry['stored_filename']}:{entry.get('thumbnail_path') or ''}"
+        for entry in files
+    )
+    payload = f"{kind}|{tile_size[0]}x{tile_size[1]}|" + "|".join(parts)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+def sprite_name(project_id: int, kind: str, signature: str) -> str:
+    return f"{project_id}-{kind}-{signature}"
+
+def load_sprite_map(store_dir: str, name: str) -> Optional[Dict[str, Any]]:
+    """Mapa de coordenadas já montado, ou None"""
+    try:
+        with open(Path(store_dir) / f"{name}.json", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _render_tile(page: fitz.Page, tile_size: Tuple[int, int]) -> Image.Image:
+    """Página renderizada direto no tamanho do tile, sem redimensionar depois"""
+    scale = min(tile_size[0] / page.rect.width, tile_size[1] / page.rect.height)
+    pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+    return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+def iter_tiles(kind: str, files: List[Dict[str, Any]], tile_size: Tuple[int, int]) -> Iterator[Tuple[Dict[str, Any], Image.Image]]:
+    """Tiles da sprite: a thumbnail de cada arquivo ou cada página renderizada"""
+    for entry in files:
+        if kind == "files":
+            thumbnail_path = entry.get("thumbnail_path")
+            if thumbnail_path and os.path.exists(thumbnail_path):
+                with Image.open(thumbnail_path) as img:
+                    tile = img.convert("RGB")
+                tile.thumbnail(tile_size, Image.Resampling.LANCZOS)
+            else:
+                with fitz.open(entry["file_path"]) as doc:
+                    tile = _render_tile(doc[0], tile_size)
+            yield {"file_id": entry["file_id"]}, tile
+        else:
+            with fitz.open(entry["file_path"]) as doc:
+                for page in doc:
+                    yield {"file_id": entry["file_id"], "page": page.number + 1}, _render_tile(page, tile_size)
+
+def build_sprite(
+    store_dir: str,
+    name: str,
+    kind: str,
+    files: List[Dict[str, Any]],
+    tile_size: Tuple[int, int],
+    columns: int
+) -> Dict[str, Any]:
+    """Monta as folhas da sprite e o mapa de coordenadas (executado no pool de processos)
+    
+    Os tiles são colados à medida que são renderizados, em folhas de até
+    MAX_SHEET_SIDE pixels; projetos grandes ganham várias folhas. O mapa é
+    gravado por último, então sua existência indica a sprite pronta.
+    """
+    tile_width, tile_height = tile_size
+    columns = max(1, min(columns, MAX_SHEET_SIDE // tile_width))
+    per_sheet = columns * (MAX_SHEET_SIDE // tile_height)
+    
+    sheets: List[Dict[str, Any]] = []
+    tiles: List[Dict[str, Any]] = []
+    canvas: Optional[Image.Image] = None
+    count = 0
+    
+    def flush() -> None:
+        rows = (count + columns - 1) // columns
+        sheet = canvas.crop((0, 0, min(count, columns) * tile_width, rows * tile_height))
+        sheet_name = f"{name}-{len(sheets)}"
+        write_variants(sheet, store_dir, sheet_name, SPRITE_FORMATS)
+        sheets.append({"name": sheet_name, "width": sheet.width, "height": sheet.height})
+    
+    for info, tile in iter_tiles(kind, files, tile_size):
+        if canvas is None:
+            canvas = Image.new("RGB", (columns * tile_width, (per_sheet // columns) * tile_height), "white")
+        
+        x, y = (count % columns) * tile_width, (count // columns) * tile_height
+        canvas.paste(tile, (x, y))
+        tiles.append({**info, "sheet": len(sheets), "x": x, "y": y, "width": tile.width, "height": tile.height})
+        count += 1
+        
+        if count == per_sheet:
+            flush()
+            canvas, count = None, 0
+    
+    if count:
+        flush()
+    
+    sprite_map = {
+        "kind": kind,
+        "signature": name.rsplit("-", 1)[1],
+        "tile_width": tile_width,
+        "tile_height": tile_height,
+        "sheets": sheets,
+        "tiles": tiles
+    }
+    map_path = Path(store_dir) / f"{name}.json"
+    temp_path = map_path.with_suffix(f".{os.getpid()}.tmp")
+    temp_path.write_text(json.dumps(sprite_map), encoding="utf-8")
+    os.replace(temp_path, map_path)
+    
+    # Sprites de conjuntos anteriores do mesmo projeto não serão mais pedidas
+    prefix = name.rsplit("-", 1)[0] + "-"
+    for path in Path(store_dir).glob(f"{prefix}*"):
+        if not path.name.startswith(name):
+            path.unlink(missing_ok=True)
+    
+    return sprite_map
@@ -0,0 +1,54 @@
+from typing import Iterator, List, Dict, Any
+import fitz  # PyMuPDF
+
+from .document_cache import document_cache
+
+TEXT_MODES = ("text", "blocks", "words")
+
+# Blocos de imagem não interessam aqui: só texto, recortado à página
+TEXT_FLAGS = fitz.TEXTFLAGS_TEXT & ~fitz.TEXT_PRESERVE_IMAGES
+
+def _bbox(item: tuple) -> List[float]:
+    return [round(value, 2) for value in item[:4]]
+
+def page_text(page: fitz.Page, mode: str) -> Dict[str, Any]:
+    """Texto nativo de uma página no modo pedido"""
+    if mode == "words":
+        words = page.get_text("words", flags=TEXT_FLAGS, sort=True)
+        items = [{"bbox": _bbox(word), "text": word[4], "block": word[5], "line": word[6]} for word in words]
+        return {
+            "page": page.number + 1,
+            "characters": sum(len(item["text"]) for item in items),
+            "words": items
+        }
+    
+    blocks = page.get_text("blocks", flags=TEXT_FLAGS, sort=True)
+    items = [{"bbox": _bbox(block), "text": block[4].strip()} for block in blocks if block[6] == 0]
+    
+    if mode == "blocks":
+        return {
+            "page": page.number + 1,
+            "characters": sum(len(item["text"]) for item in items),
+            "blocks": items
+        }
+    
+    # Ordem de leitura a partir dos blocos: get_text("text", sort=True) é várias vezes mais lento
+    text = "\n".join(item["text"] for item in items)
+    return {"page": page.number + 1, "characters": len(text), "text": text}
+
+def iter_page_text(pdf_path: str, page_indexes: List[int], mode: str = "text") -> Iterator[Dict[str, Any]]:
+    """Entrega o texto página a página; só a página corrente fica em memória
+    
+    Cada página é carregada, lida e liberada antes da próxima, então o consumo
+    não cresce com o tamanho do documento.
+    """
+    if mode not in TEXT_MODES:
+        raise ValueError(f"Modo deve ser um de: {', '.join(TEXT_MODES)}")
+    
+    with document_cache.borrow(pdf_path) as doc:
+        for index in page_indexes:
+            yield page_text(doc.load_page(index), mode)
+
+def text_summary(page_count: int, characters: int) -> Dict[str, Any]:
+    """Totais da extração de texto"""
+    return {"total_pages": page_count, "total_characters": characters}
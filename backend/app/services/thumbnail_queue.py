@@ -0,0 +1,164 @@
+import os
+import heapq
+import itertools
+import logging
+import threading
+from typing import Callable, Iterable, List, Dict, Any, Tuple
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.pdf_project import PDFFile
+from .pdf_service import get_process_pool
+from .thumbnails import make_thumbnail
+
+logger = logging.getLogger(__name__)
+
+# Menor valor sai primeiro
+PRIORITY_VISIBLE = 0     # Arquivos na tela do usuário
+PRIORITY_PREVIEW = 1     # Prévias: baratas e já permitem reordenar
+PRIORITY_PROJECT = 2     # Thumbnails do projeto aberto
+PRIORITY_BACKGROUND = 3
+
+TIERS = ("preview", "thumbnail")
+
+class ThumbnailQueue:
+    """Prévias e thumbnails geradas em segundo plano, por prioridade
+    
+    O upload só grava e analisa o arquivo; a renderização entra nesta fila. Um
+    número fixo de threads (THUMBNAIL_WORKERS) envia as renderizações ao pool
+    de processos, então as thumbnails nunca ocupam o pool inteiro. Arquivos que
+    o usuário está vendo passam à frente; ao terminar, o caminho é gravado no
+    PDFFile (preview_path ou thumbnail_path).
+    """
+    
+    def __init__(self, store_dir: str, workers: int):
+        self.store_dir = store_dir
+        self.workers = workers
+        self._heap: List[list] = []
+        self._jobs: Dict[Tuple[int, str], list] = {}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._active = 0
+    
+    def enqueue(
+        self,
+        file_id: int,
+        file_path: str,
+        session_factory: Callable[[], Session],
+        priority: int = PRIORITY_BACKGROUND,
+        tiers: Iterable[str] = TIERS
+    ) -> None:
+        """Agenda a prévia e a thumbnail de um arquivo; retorna imediatamente"""
+        with self._condition:
+            for tier in tiers:
+                job = {"file_id": file_id, "file_path": file_path, "tier": tier, "session_factory": session_factory}
+                self._push(job, min(priority, PRIORITY_PREVIEW) if tier == "preview" else priority)
+            self._start_workers()
+    
+    def requeue_missing(self, session_factory: Callable[[], Session]) -> int:
+        """Reagenda os arquivos ainda sem thumbnail; retorna quantos foram reagendados
+        
+        A fila só existe na memória: o que estava pendente quando o servidor
+        parou é recuperado na inicialização pelas colunas que ficaram vazias.
+        """
+        db = session_factory()
+        try:
+            rows = (
+                db.query(PDFFile.id, PDFFile.file_path, PDFFile.preview_path)
+                .filter(PDFFile.thumbnail_path.is_(None))
+                .all()
+            )
+        finally:
+            db.close()
+        
+        requeued = 0
+        for file_id, file_path, preview_path in rows:
+            if not os.path.exists(file_path):
+                continue
+            tiers = ("thumbnail",) if preview_path else TIERS
+            self.enqueue(file_id, file_path, session_factory, tiers=tiers)
+            requeued += 1
+        return requeued
+    
+    def prioritize(self, file_ids: Iterable[int], priority: int = PRIORITY_VISIBLE) -> int:
+        """Antecipa os trabalhos pendentes dos arquivos; retorna quantos foram antecipados"""
+        file_ids = set(file_ids)
+        with self._condition:
+            entries = [entry for (file_id, _), entry in self._jobs.items() if file_id in file_ids and entry[0] > priority]
+            for entry in entries:
+                self._push(entry[2], priority)
+        return len(entries)
+    
+    def pending(self) -> int:
+        with self._condition:
+            return len(self._jobs)
+    
+    def wait_idle(self) -> None:
+        """Bloqueia até a fila esvaziar e os trabalhos em andamento terminarem"""
+        with self._condition:
+            while self._jobs or self._active:
+                self._condition.wait()
+    
+    def _push(self, job: Dict[str, Any], priority: int) -> None:
+        key = (job["file_id"], job["tier"])
+        existing = self._jobs.get(key)
+        if existing is not None:
+            if existing[0] <= priority:
+                return
+            # Remoção preguiçosa: a entrada antiga fica no heap e é ignorada ao sair
+            existing[2] = None
+        
+        entry = [priority, next(self._sequence), job]
+        self._jobs[key] = entry
+        heapq.heappush(self._heap, entry)
+        # notify_all: quem espera em wait_idle usa a mesma condição que os workers
+        self._condition.notify_all()
+    
+    def _start_workers(self) -> None:
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._run, name=f"thumbnail-worker-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def _next_job(self) -> Dict[str, Any]:
+        with self._condition:
+            while True:
+                while not self._heap:
+                    self._condition.wait()
+                _, _, job = heapq.heappop(self._heap)
+                if job is None:
+                    continue
+                del self._jobs[(job["file_id"], job["tier"])]
+                self._active += 1
+                return job
+    
+    def _run(self) -> None:
+        while True:
+            job = self._next_job()
+            try:
+                self._process(job)
+            except Exception as e:
+                logger.error(f"Erro ao gerar {job['tier']} do arquivo {job['file_id']}: {str(e)}")
+            finally:
+                with self._condition:
+                    self._active -= 1
+                    self._condition.notify_all()
+    
+    def _process(self, job: Dict[str, Any]) -> None:
+        if job["tier"] == "preview":
+            size, dpi, column = settings.THUMBNAIL_PREVIEW_SIZE, None, "preview_path"
+        else:
+            size, dpi, column = settings.THUMBNAIL_SIZE, settings.PREVIEW_DPI, "thumbnail_path"
+        
+        path = get_process_pool().submit(make_thumbnail, job["file_path"], self.store_dir, size, dpi).result()
+        
+        db = job["session_factory"]()
+        try:
+            db.query(PDFFile).filter(PDFFile.id == job["file_id"]).update({column: path})
+            db.commit()
+        finally:
+            db.close()
+
+thumbnail_queue = ThumbnailQueue(settings.THUMBNAIL_DIR, settings.THUMBNAIL_WORKERS)
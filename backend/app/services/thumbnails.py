@@ -0,0 +1,129 @@
+import os
+import re
+import hashlib
+from io import BytesIO
+from pathlib import Path
+from typing import Iterable, Optional, Dict, Any, Tuple
+import fitz  # PyMuPDF
+from PIL import Image
+
+# O plugin de AVIF (pillow-avif-plugin ou Pillow com libavif) é opcional
+try:
+    import pillow_avif  # noqa: F401
+except ImportError:
+    pass
+
+Image.init()
+
+# Variantes gravadas no repositório, em ordem de preferência quando o cliente aceita mais de uma
+THUMBNAIL_FORMATS: Dict[str, Dict[str, Any]] = {
+    "avif": {"media_type": "image/avif", "pil_format": "AVIF", "options": {"quality": 60, "speed": 6}},
+    "webp": {"media_type": "image/webp", "pil_format": "WEBP", "options": {"quality": 80, "method": 4}},
+    "jpg": {"media_type": "image/jpeg", "pil_format": "JPEG", "options": {"quality": 80, "optimize": True, "progressive": True}},
+}
+FALLBACK_FORMAT = "jpg"
+
+THUMBNAIL_KEY = re.compile(r"^[0-9a-f]{32}$")
+
+def supported_formats() -> list:
+    """Formatos que o Pillow instalado sabe gravar"""
+    return [name for name, spec in THUMBNAIL_FORMATS.items() if spec["pil_format"] in Image.SAVE]
+
+def variant_path(store_dir: str, key: str, image_format: str) -> Path:
+    return Path(store_dir) / f"{key}.{image_format}"
+
+def write_variants(img: Image.Image, store_dir: str, name: str, formats: Optional[Iterable[str]] = None) -> None:
+    """Grava a imagem em cada formato suportado como <name>.<formato>, pulando os que já existem"""
+    for image_format in formats or supported_formats():
+        path = variant_path(store_dir, name, image_format)
+        if path.exists():
+            continue
+        spec = THUMBNAIL_FORMATS[image_format]
+        buffer = BytesIO()
+        img.save(buffer, spec["pil_format"], **spec["options"])
+        # Gravação atômica: requisições concorrentes nunca veem um arquivo pela metade
+        temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        temp_path.write_bytes(buffer.getvalue())
+        os.replace(temp_path, path)
+
+def store_thumbnail(img: Image.Image, store_dir: str) -> str:
+    """Grava as variantes da thumbnail no repositório e retorna a chave
+    
+    A chave é o hash dos pixels, então a URL muda sempre que a imagem muda e
+    pode ser servida como imutável; thumbnails idênticas são gravadas uma vez.
+    """
+    img = img.convert("RGB")
+    key = hashlib.sha256(f"{img.size}".encode() + img.tobytes()).hexdigest()[:32]
+    write_variants(img, store_dir, key)
+    return key
+
+def render_first_page(doc: fitz.Document, size: Tuple[int, int], dpi: Optional[int] = None) -> Image.Image:
+    """Primeira página no tamanho da thumbnail
+    
+    Com dpi, renderiza grande e reduz com LANCZOS (qualidade final); sem, renderiza
+    direto no tamanho pedido, o que custa uma fração do tempo (prévia rápida).
+    """
+    page = doc[0]
+    if dpi is None:
+        scale = min(size[0] / page.rect.width, size[1] / page.rect.height)
+    else:
+        scale = dpi / 72
+    pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+    img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    if dpi is not None:
+        img.thumbnail(size, Image.Resampling.LANCZOS)
+    return img
+
+def make_thumbnail(pdf_path: str, store_dir: str, size: Tuple[int, int], dpi: Optional[int] = None) -> str:
+    """Renderiza e grava as variantes da primeira página (executado no pool de processos)
+    
+    Retorna o caminho da variante JPEG, que todo cliente exibe.
+    """
+    with fitz.open(pdf_path) as doc:
+        img = render_first_page(doc, size, dpi)
+    key = store_thumbnail(img, store_dir)
+    return str(variant_path(store_dir, key, FALLBACK_FORMAT))
+
+def thumbnail_key(thumbnail_path: Optional[str]) -> Optional[str]:
+    """Chave da thumbnail a partir do caminho salvo no PDFFile; None para thumbnails antigas"""
+    if not thumbnail_path:
+        return None
+    key = Path(thumbnail_path).stem
+    return key if THUMBNAIL_KEY.match(key) else None
+
+def negotiate_format(accept: Optional[str], available: Iterable[str]) -> Optional[str]:
+    """Escolhe a variante pelo cabeçalho Accept
+    
+    AVIF e WebP só são enviados quando aparecem explicitamente: navegadores
+    antigos mandam image/* ou */* sem saber decodificá-los. O JPEG atende os
+    curingas e é o padrão quando nada mais casa.
+    """
+    weights: Dict[str, float] = {}
+    for item in (accept or "").split(","):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if media_type:
+            weights[media_type.lower()] = quality
+    
+    available = set(available)
+    best, best_quality = None, 0.0
+    for image_format, spec in THUMBNAIL_FORMATS.items():
+        if image_format not in available:
+            continue
+        quality = weights.get(spec["media_type"], 0.0)
+        if image_format == FALLBACK_FORMAT:
+            quality = weights.get(spec["media_type"], weights.get("image/*", weights.get("*/*", 0.0)))
+        if quality > best_quality:
+            best, best_quality = image_format, quality
+    
+    # Sem Accept, ou sem nada aceitável, o JPEG ainda é o que qualquer cliente exibe
+    if best is None and FALLBACK_FORMAT in available:
+        return FALLBACK_FORMAT
+    return best
@@ -0,0 +1,244 @@
+import os
+import re
+import shutil
+from functools import lru_cache, wraps
+from io import BytesIO
+from typing import List, Optional, Dict, Any, Tuple
+import fitz  # PyMuPDF
+from reportlab.pdfgen import canvas
+
+# (nome do recurso, xref do Form XObject, xref do stream "q /nome Do Q")
+SharedStamp = Tuple[str, int, int]
+
+# (largura, altura) da página, arredondadas: chave dos carimbos gerados
+StampSize = Tuple[float, float]
+
+@lru_cache(maxsize=32)
+def build_watermark_stamp(
+    text: str,
+    width: float,
+    height: float,
+    font_size: int,
+    opacity: float,
+    rotation: int
+) -> bytes:
+    """Gera o PDF de uma página com a marca d'água centralizada no tamanho pedido"""
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=(width, height))
+    c.setFont("Helvetica", font_size)
+    c.setFillColorRGB(0.5, 0.5, 0.5)
+    c.setFillAlpha(opacity)
+    c.translate(width / 2, height / 2)
+    c.rotate(rotation)
+    c.drawCentredString(0, -font_size / 3, text)
+    c.save()
+    return buffer.getvalue()
+
+def _page_geometry(page: fitz.Page) -> Tuple:
+    """Chave de cache: páginas com a mesma geometria podem compartilhar o carimbo"""
+    return (tuple(round(v, 2) for v in page.mediabox), tuple(round(v, 2) for v in page.cropbox), page.rotation)
+
+def _find_shared_stamp(doc: fitz.Document, page: fitz.Page) -> Optional[SharedStamp]:
+    """Localiza o Form XObject e o stream de conteúdo que o show_pdf_page acabou de criar"""
+    contents_xref = page.get_contents()[-1]
+    match = re.search(rb"/(\S+)\s+Do", doc.xref_stream(contents_xref))
+    if not match:
+        return None
+    
+    name = match.group(1).decode()
+    for xref, xobject_name, *_ in page.get_xobjects():
+        if xobject_name == name:
+            return name, xref, contents_xref
+    return None
+
+def _ensure_resources(doc: fitz.Document, page: fitz.Page) -> None:
+    """Cria um /Resources vazio em páginas que não têm nem herdam um (o show_pdf_page exige)"""
+    xref = page.xref
+    while xref:
+        if doc.xref_get_key(xref, "Resources")[0] != "null":
+            return
+        kind, parent = doc.xref_get_key(xref, "Parent")
+        xref = int(parent.split()[0]) if kind == "xref" else 0
+    doc.xref_set_key(page.xref, "Resources", "<<>>")
+
+def _plain_errors(func):
+    """Converte os erros do MuPDF em ValueError
+    
+    As exceções do PyMuPDF carregam objetos SWIG que o pool de processos não
+    consegue serializar: o cliente receberia "cannot pickle" em vez do erro.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            raise ValueError(str(e)) from None
+    return wrapper
+
+def _new_stream(doc: fitz.Document, data: bytes) -> int:
+    """Cria um stream de conteúdo avulso e retorna seu xref"""
+    xref = doc.get_new_xref()
+    doc.update_object(xref, "<<>>")
+    doc.update_stream(xref, data)
+    return xref
+
+def _attach_shared_stamp(
+    doc: fitz.Document,
+    page: fitz.Page,
+    stamp: SharedStamp,
+    wrapper: List[int]
+) -> bool:
+    """Referencia um carimbo existente: só o dicionário da página muda, sem novos streams"""
+    name, form_xref, contents_xref = stamp
+    reference = f"{form_xref} 0 R"
+    
+    kind, value = doc.xref_get_key(page.xref, "Resources")
+    if kind == "xref":
+        target, prefix = int(value.split()[0]), ""
+    elif kind == "dict":
+        target, prefix = page.xref, "Resources/"
+    else:
+        # Recursos herdados do nó /Pages: deixar o show_pdf_page resolver
+        return False
+    
+    kind, value = doc.xref_get_key(target, prefix + "XObject")
+    if kind == "xref":
+        target, key = int(value.split()[0]), name
+    else:
+        key = prefix + "XObject/" + name
+    
+    kind, value = doc.xref_get_key(target, key)
+    if kind != "null" and value != reference:
+        return False
+    
+    doc.xref_set_key(target, key, reference)
+    contents = page.get_contents()
+    
+    # O conteúdo original precisa terminar no estado gráfico inicial. Em vez de
+    # reescrever os streams da página (wrap_contents), envolvê-los com um par
+    # "q"/"Q" compartilhado por todo o documento
+    if not page.is_wrapped:
+        if not wrapper:
+            wrapper.extend([_new_stream(doc, b"q\n"), _new_stream(doc, b"\nQ\n")])
+        contents = [wrapper[0]] + contents + [wrapper[1]]
+    
+    contents.append(contents_xref)
+    doc.xref_set_key(page.xref, "Contents", "[" + " ".join(f"{xref} 0 R" for xref in contents) + "]")
+    return True
+
+def _stamp_size(page: fitz.Page) -> StampSize:
+    rect = page.rect
+    return round(rect.width, 2), round(rect.height, 2)
+
+def stamp_document(
+    doc: fitz.Document,
+    text: str,
+    font_size: int = 50,
+    opacity: float = 0.3,
+    rotation: int = 45,
+    stamps: Optional[Dict[StampSize, bytes]] = None
+) -> Dict[str, Any]:
+    """Aplica a marca d'água com um Form XObject compartilhado por geometria de página
+    
+    stamps traz carimbos já gerados (por build_stamps) por tamanho de página;
+    os que faltarem são gerados aqui.
+    """
+    shared: Dict[Tuple, SharedStamp] = {}
+    stamp_docs: Dict[Tuple, fitz.Document] = {}
+    wrapper: List[int] = []
+    stamps_built = 0
+    
+    try:
+        for page in doc:
+            key = _page_geometry(page)
+            stamp = shared.get(key)
+            if stamp is not None and _attach_shared_stamp(doc, page, stamp, wrapper):
+                continue
+            
+            # Manter o documento do carimbo aberto: o show_pdf_page reaproveita o XObject copiado
+            stamp_doc = stamp_docs.get(key)
+            if stamp_doc is None:
+                size = _stamp_size(page)
+                stamp_pdf = (stamps or {}).get(size) or build_watermark_stamp(
+                    text, *size, font_size, opacity, rotation
+                )
+                stamp_doc = stamp_docs[key] = fitz.open("pdf", stamp_pdf)
+            
+            _ensure_resources(doc, page)
+            page.show_pdf_page(page.rect, stamp_doc, 0, overlay=True)
+            stamps_built += 1
+            
+            if key not in shared:
+                found = _find_shared_stamp(doc, page)
+                if found:
+                    shared[key] = found
+    finally:
+        for stamp_doc in stamp_docs.values():
+            stamp_doc.close()
+    
+    return {
+        "pages": doc.page_count,
+        "stamps_built": stamps_built,
+        "shared_pages": doc.page_count - stamps_built
+    }
+
+@_plain_errors
+def watermark_file(input_path: str, output_path: str, text: str, **options) -> Dict[str, Any]:
+    """Aplica a marca d'água a um arquivo inteiro (executado no pool de processos)"""
+    with fitz.open(input_path) as doc:
+        stats = stamp_document(doc, text, **options)
+        # Sem deflate: recomprimir streams intactos aumentaria o arquivo a cada página
+        doc.save(output_path, garbage=1)
+    return stats
+
+@_plain_errors
+def build_stamps(
+    input_path: str,
+    start: int,
+    end: int,
+    text: str,
+    font_size: int = 50,
+    opacity: float = 0.3,
+    rotation: int = 45
+) -> Dict[StampSize, bytes]:
+    """Gera os carimbos das páginas [start, end), um por tamanho (executado no pool de processos)
+    
+    Só o conteúdo do carimbo sai do worker: a aplicação é feita depois em uma
+    única cópia do original, então links, formulários, destinos nomeados e
+    rótulos de página que atravessam as partes continuam intactos.
+    """
+    stamps: Dict[StampSize, bytes] = {}
+    with fitz.open(input_path) as doc:
+        for index in range(start, end):
+            size = _stamp_size(doc[index])
+            if size not in stamps:
+                stamps[size] = build_watermark_stamp(text, *size, font_size, opacity, rotation)
+    return stamps
+
+@_plain_errors
+def watermark_incremental(input_path: str, output_path: str, text: str, **options) -> Dict[str, Any]:
+    """Aplica a marca d'água como atualização incremental sobre uma cópia do original
+    
+    Os bytes do original são preservados e só os objetos novos ou alterados
+    (carimbos, dicionários de página e recursos) são anexados ao final.
+    """
+    shutil.copyfile(input_path, output_path)
+    original_size = os.path.getsize(output_path)
+    
+    with fitz.open(output_path) as doc:
+        if not doc.can_save_incrementally():
+            raise ValueError("Documento não permite atualização incremental")
+        stats = stamp_document(doc, text, **options)
+        doc.save(output_path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+    
+    validate_watermarked(output_path, stats["pages"])
+    stats["appended_bytes"] = os.path.getsize(output_path) - original_size
+    return stats
+
+def validate_watermarked(output_path: str, expected_pages: int) -> None:
+    """Reabre o resultado e confere a estrutura (xref íntegra e número de páginas)"""
+    with fitz.open(output_path) as doc:
+        if doc.is_repaired:
+            raise ValueError("Tabela xref inválida no arquivo gerado")
+        if doc.page_count != expected_pages:
+            raise ValueError(f"Esperadas {expected_pages} páginas, encontradas {doc.page_count}")
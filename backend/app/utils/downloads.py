@@ -0,0 +1,198 @@
+import os
+import unicodedata
+from email.utils import formatdate
+from secrets import token_hex
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Receive, Scope, Send
+
+# Política de cache por tipo de recurso
+CACHE_POLICIES = {
+    # Uploads ganham nome único (uuid) e nunca são regravados
+    "upload": "private, max-age=31536000, immutable",
+    # Saídas são regravadas com o mesmo nome a cada operação: sempre revalidar (barato com 304)
+    "output": "private, no-cache",
+    "static": "public, max-age=3600",
+    # URL da thumbnail contém o hash da imagem: nunca revalidar
+    "thumbnail": "public, max-age=31536000, immutable",
+}
+
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+PATHSEND_EXTENSION = "http.response.pathsend"
+
+def stat_etag(stat_result: os.stat_result) -> str:
+    """ETag a partir de mtime e tamanho, como o do Starlette, sem ler o conteúdo
+    
+    Toda regravação muda o mtime (em nanossegundos), então o validador continua
+    forte o bastante para If-Range; o primeiro Range de um arquivo grande não
+    paga mais a leitura do arquivo inteiro.
+    """
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+def content_disposition(filename: str, disposition_type: str = "attachment") -> str:
+    """Cabeçalho Content-Disposition válido para qualquer nome de arquivo
+    
+    O nome vai inteiro em filename*=UTF-8''... (RFC 5987) e, para clientes
+    antigos, em uma versão ASCII sem aspas, barras invertidas nem caracteres
+    de controle. Nomes fora do latin-1 não quebram a codificação do cabeçalho.
+    """
+    ascii_name = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode("ascii")
+    ascii_name = "".join("_" if char in '"\\' or not char.isprintable() else char for char in ascii_name)
+    stem, dot, extension = ascii_name.rpartition(".")
+    if not any(char.isalnum() for char in (stem if dot else extension)):
+        ascii_name = "download" + (dot + extension if dot else "")
+    header = f'{disposition_type}; filename="{ascii_name}"'
+    if ascii_name != filename:
+        header += f"; filename*=UTF-8''{quote(filename, safe='')}"
+    return header
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Comparação fraca do If-None-Match, como pede a RFC 9110"""
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+class ContentFileResponse(FileResponse):
+    """FileResponse com ETag, GET condicional e envio sem cópia
+    
+    O ETag vem do chamador (ex.: hash do upload gravado na ingestão) ou do stat
+    do arquivo. A interpretação do Range continua com a FileResponse; aqui entram
+    o ETag, o 304 para If-None-Match, o If-Range comparado ao ETag, a resposta
+    multipart/byteranges conforme a RFC (a do Starlette 0.41 manda o tipo no
+    Content-Range e separa as partes sem CRLF) e o envio pelo servidor
+    (sendfile) quando ele anuncia as extensões ASGI de zero-copy ou pathsend.
+    """
+    
+    def __init__(self, path: str, *, cache_control: str, etag: Optional[str] = None, **kwargs):
+        super().__init__(path, **kwargs)
+        self.headers["cache-control"] = cache_control
+        self._etag = etag
+        self._extensions: dict = {}
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.stat_result is None:
+            try:
+                self.stat_result = await anyio.to_thread.run_sync(os.stat, self.path)
+            except FileNotFoundError:
+                raise RuntimeError(f"File at path {self.path} does not exist.")
+        
+        etag = self._etag or stat_etag(self.stat_result)
+        self.headers["etag"] = etag
+        self.set_stat_headers(self.stat_result)
+        
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        if if_none_match is not None and etag_matches(if_none_match, etag):
+            not_modified = {
+                name: value for name, value in self.headers.items()
+                if name in ("etag", "cache-control", "last-modified", "vary")
+            }
+            return await Response(status_code=304, headers=not_modified)(scope, receive, send)
+        
+        self._extensions = scope.get("extensions") or {}
+        await super().__call__(scope, receive, send)
+    
+    def _should_use_range(self, http_if_range: str, stat_result: os.stat_result) -> bool:
+        return http_if_range in (self.headers["etag"], formatdate(stat_result.st_mtime, usegmt=True))
+    
+    async def _handle_simple(self, send: Send, send_header_only: bool) -> None:
+        if send_header_only or not (ZEROCOPY_EXTENSION in self._extensions or PATHSEND_EXTENSION in self._extensions):
+            return await super()._handle_simple(send, send_header_only)
+        
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if PATHSEND_EXTENSION in self._extensions:
+            await send({"type": PATHSEND_EXTENSION, "path": os.path.abspath(self.path)})
+            return
+        with open(self.path, "rb") as file:
+            await send({"type": ZEROCOPY_EXTENSION, "file": file, "more_body": False})
+    
+    async def _handle_single_range(
+        self, send: Send, start: int, end: int, file_size: int, send_header_only: bool
+    ) -> None:
+        if send_header_only or ZEROCOPY_EXTENSION not in self._extensions:
+            return await super()._handle_single_range(send, start, end, file_size, send_header_only)
+        
+        self.headers["content-range"] = f"bytes {start}-{end - 1}/{file_size}"
+        self.headers["content-length"] = str(end - start)
+        await send({"type": "http.response.start", "status": 206, "headers": self.raw_headers})
+        with open(self.path, "rb") as file:
+            await send({
+                "type": ZEROCOPY_EXTENSION,
+                "file": file,
+                "offset": start,
+                "count": end - start,
+                "more_body": False
+            })
+    
+    async def _handle_multiple_ranges(
+        self,
+        send: Send,
+        ranges: List[Tuple[int, int]],
+        file_size: int,
+        send_header_only: bool,
+    ) -> None:
+        boundary = token_hex(13)
+        content_type = self.headers["content-type"]
+        part_headers = [
+            (
+                f"--{boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Range: bytes {start}-{end - 1}/{file_size}\r\n\r\n"
+            ).encode("latin-1")
+            for start, end in ranges
+        ]
+        closing = f"--{boundary}--\r\n".encode("latin-1")
+        content_length = sum(len(header) + (end - start) + 2 for header, (start, end) in zip(part_headers, ranges))
+        
+        self.headers["content-type"] = f"multipart/byteranges; boundary={boundary}"
+        self.headers["content-length"] = str(content_length + len(closing))
+        await send({"type": "http.response.start", "status": 206, "headers": self.raw_headers})
+        if send_header_only:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        
+        zerocopy = ZEROCOPY_EXTENSION in self._extensions
+        with open(self.path, "rb") as file:
+            for header, (start, end) in zip(part_headers, ranges):
+                await send({"type": "http.response.body", "body": header, "more_body": True})
+                if zerocopy:
+                    await send({
+                        "type": ZEROCOPY_EXTENSION,
+                        "file": file,
+                        "offset": start,
+                        "count": end - start,
+                        "more_body": True
+                    })
+                else:
+                    file.seek(start)
+                    while start < end:
+                        chunk = await anyio.to_thread.run_sync(file.read, min(self.chunk_size, end - start))
+                        start += len(chunk)
+                        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                await send({"type": "http.response.body", "body": b"\r\n", "more_body": True})
+        await send({"type": "http.response.body", "body": closing, "more_body": False})
+
+class ContentStaticFiles(StaticFiles):
+    """StaticFiles servindo arquivos pela ContentFileResponse, com a política de cache do diretório"""
+    
+    def __init__(self, *, cache_control: str, **kwargs):
+        super().__init__(**kwargs)
+        self.cache_control = cache_control
+    
+    def file_response(
+        self,
+        full_path: str,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        return ContentFileResponse(
+            full_path,
+            cache_control=self.cache_control,
+            status_code=status_code,
+            stat_result=stat_result
+        )
@@ -1,7 +1,9 @@
-from pydantic import BaseModel, EmailStr, validator
+from pydantic import BaseModel, EmailStr, Field, validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
+from ..services.thumbnails import thumbnail_key
+
 # Schemas de usuário
 class UserBase(BaseModel):
     username: str
@@ -95,13 +97,45 @@ class PDFFileResponse(PDFFileBase):
     file_path: str
     file_size: int
     page_count: Optional[int] = None
+    preview_path: Optional[str] = None
     thumbnail_path: Optional[str] = None
+    preview_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
+    thumbnail_status: Optional[str] = None  # ready, preview ou pending
     metadata: Optional[Dict[str, Any]] = None
     created_at: datetime
     
+    @validator('preview_url', always=True)
+    def build_preview_url(cls, v, values):
+        key = thumbnail_key(values.get('preview_path'))
+        return v or (f"/api/pdf/thumbnails/{key}" if key else None)
+    
+    @validator('thumbnail_url', always=True)
+    def build_thumbnail_url(cls, v, values):
+        key = thumbnail_key(values.get('thumbnail_path'))
+        return v or (f"/api/pdf/thumbnails/{key}" if key else None)
+    
+    @validator('thumbnail_status', always=True)
+    def build_thumbnail_status(cls, v, values):
+        if values.get('thumbnail_url'):
+            return "ready"
+        return "preview" if values.get('preview_url') else "pending"
+    
     class Config:
         from_attributes = True
 
+# Schemas do documento virtual (mesclagem sem gerar arquivo)
+class VirtualDocumentFile(BaseModel):
+    file_id: int
+    original_filename: str
+    first_page: int
+    page_count: int
+
+class VirtualDocumentResponse(BaseModel):
+    project_id: int
+    total_pages: int
+    files: List[VirtualDocumentFile]
+
 # Schemas de operação PDF
 class PDFOperationBase(BaseModel):
     operation_type: str
@@ -125,6 +159,10 @@ class PDFOperationResponse(PDFOperationBase):
 # Schemas de requisições específicas
 class MergePDFRequest(BaseModel):
     output_filename: str
+    parallel: Optional[bool] = None  # None = automático pelo número de arquivos
+    deduplicate: Optional[bool] = None  # None = usa MERGE_DEDUPLICATE
+    optimize: bool = False
+    linearize: Optional[bool] = None  # None = usa LINEARIZE_OUTPUTS
     
     @validator('output_filename')
     def validate_filename(cls, v):
@@ -136,37 +174,148 @@ class CompressPDFRequest(BaseModel):
     input_file_id: int
     quality: int = 85
     output_filename: str
+    target_dpi: Optional[int] = None  # None = usa COMPRESS_TARGET_DPI
+    target_size: Optional[int] = None  # Tamanho máximo desejado em bytes; quality vira o teto
+    linearize: Optional[bool] = None  # None = usa LINEARIZE_OUTPUTS
     
     @validator('quality')
     def validate_quality(cls, v):
         if not 1 <= v <= 100:
             raise ValueError('Qualidade deve estar entre 1 e 100')
         return v
+    
+    @validator('target_size')
+    def validate_target_size(cls, v):
+        if v is not None and v <= 0:
+            raise ValueError('Tamanho alvo deve ser positivo')
+        return v
+    
+    @validator('target_dpi')
+    def validate_target_dpi(cls, v):
+        if v is not None and not 36 <= v <= 600:
+            raise ValueError('DPI alvo deve estar entre 36 e 600')
+        return v
+    
+    @validator('output_filename')
+    def validate_filename(cls, v):
+        if not v.endswith('.pdf'):
+            v += '.pdf'
+        return v
 
 class WatermarkRequest(BaseModel):
     input_file_id: int
     watermark_text: str
     output_filename: str
     opacity: float = 0.3
-    font_size: int = 50
-    rotation: int = 45
+    # Fonte positiva e limitada; o carimbo gira em torno do centro, qualquer ângulo em graus
+    font_size: int = Field(50, gt=0, le=500)
+    rotation: int = Field(45, ge=-180, le=180)
+    incremental: bool = False
+    optimize: bool = False
+    linearize: Optional[bool] = None  # None = usa LINEARIZE_OUTPUTS
     
     @validator('opacity')
     def validate_opacity(cls, v):
         if not 0.1 <= v <= 1.0:
             raise ValueError('Opacidade deve estar entre 0.1 e 1.0')
         return v
+    
+    @validator('output_filename')
+    def validate_filename(cls, v):
+        if not v.endswith('.pdf'):
+            v += '.pdf'
+        return v
 
 class SplitPDFRequest(BaseModel):
     input_file_id: int
+    mode: str = "pages"
     pages_per_file: int = 1
+    ranges: Optional[str] = None  # Ex.: "1-3,5,8-"
+    bookmark_level: int = 1
+    max_size: Optional[int] = None  # Bytes por arquivo no modo "size"
     output_prefix: str = "split"
+    archive: bool = False  # Responder com um ZIP transmitido em vez da lista de arquivos
+    
+    @validator('mode')
+    def validate_mode(cls, v):
+        if v not in ('pages', 'ranges', 'bookmarks', 'size'):
+            raise ValueError('Modo deve ser pages, ranges, bookmarks ou size')
+        return v
     
     @validator('pages_per_file')
     def validate_pages_per_file(cls, v):
         if v < 1:
             raise ValueError('Páginas por arquivo deve ser pelo menos 1')
         return v
+    
+    @validator('bookmark_level')
+    def validate_bookmark_level(cls, v):
+        if v < 1:
+            raise ValueError('Nível de marcador deve ser pelo menos 1')
+        return v
+    
+    @validator('max_size')
+    def validate_max_size(cls, v):
+        if v is not None and v <= 0:
+            raise ValueError('Tamanho máximo deve ser positivo')
+        return v
+
+class OptimizePDFRequest(BaseModel):
+    input_file_id: int
+    output_filename: str
+    subset_fonts: bool = True
+    prune_resources: bool = True
+    
+    @validator('output_filename')
+    def validate_filename(cls, v):
+        if not v.endswith('.pdf'):
+            v += '.pdf'
+        return v
+
+class RasterizeRequest(BaseModel):
+    input_file_id: int
+    pages: Optional[str] = None  # Ex.: "1-3,5"; todas se vazio
+    dpi: int = 150
+    format: str = "png"  # png, jpeg, webp
+    quality: int = 85
+    output: str = "zip"  # zip, ndjson
+    output_prefix: str = "pages"
+    
+    @validator('dpi')
+    def validate_dpi(cls, v):
+        if not 36 <= v <= 600:
+            raise ValueError('DPI deve estar entre 36 e 600')
+        return v
+    
+    @validator('format')
+    def validate_format(cls, v):
+        if v not in ('png', 'jpeg', 'webp'):
+            raise ValueError('Formato deve ser png, jpeg ou webp')
+        return v
+    
+    @validator('quality')
+    def validate_quality(cls, v):
+        if not 1 <= v <= 100:
+            raise ValueError('Qualidade deve estar entre 1 e 100')
+        return v
+    
+    @validator('output')
+    def validate_output(cls, v):
+        if v not in ('zip', 'ndjson'):
+            raise ValueError('Saída deve ser zip ou ndjson')
+        return v
+
+class ExtractImagesRequest(BaseModel):
+    input_file_id: int
+    pages: Optional[str] = None  # Ex.: "1-3,5"; todas se vazio
+    output: str = "zip"  # zip, ndjson
+    output_prefix: str = "images"
+    
+    @validator('output')
+    def validate_output(cls, v):
+        if v not in ('zip', 'ndjson'):
+            raise ValueError('Saída deve ser zip ou ndjson')
+        return v
 
 class OCRRequest(BaseModel):
     input_file_id: int
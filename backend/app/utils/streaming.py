@@ -0,0 +1,81 @@
+import os
+import json
+import time
+import zipfile
+from typing import AsyncIterator, Iterable, Iterator, List, Dict, Any, Tuple, Union
+
+class DrainableBuffer:
+    """Destino sem seek para o zipfile: acumula os bytes escritos até serem drenados
+    
+    Sem seek, o zipfile grava cada entrada com data descriptor e não precisa
+    voltar ao cabeçalho local, o que permite enviar o ZIP enquanto é montado.
+    """
+    
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+    
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def flush(self) -> None:
+        pass
+    
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+async def stream_zip(
+    entries: AsyncIterator[Tuple[str, Union[str, bytes]]],
+    chunk_size: int = 1024 * 1024
+) -> AsyncIterator[bytes]:
+    """Gera um ZIP sem compressão a partir de (nome no arquivo, caminho ou conteúdo) à medida que chegam"""
+    buffer = DrainableBuffer()
+    
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        async for arcname, path in entries:
+            if isinstance(path, bytes):
+                archive.writestr(zipfile.ZipInfo(arcname, date_time=time.localtime()[:6]), path)
+                yield buffer.drain()
+                continue
+            
+            info = zipfile.ZipInfo(arcname, date_time=time.localtime(os.path.getmtime(path))[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            # Tamanho conhecido: o zipfile decide sozinho se precisa de ZIP64
+            info.file_size = os.path.getsize(path)
+            
+            with open(path, "rb") as source, archive.open(info, "w") as target:
+                while True:
+                    block = source.read(chunk_size)
+                    if not block:
+                        break
+                    target.write(block)
+                    yield buffer.drain()
+            
+            data = buffer.drain()
+            if data:
+                yield data
+    
+    # Diretório central, escrito ao fechar o arquivo
+    data = buffer.drain()
+    if data:
+        yield data
+
+def _ndjson_line(item: Dict[str, Any]) -> bytes:
+    return (json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8")
+
+async def stream_ndjson(items: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """Serializa cada item como uma linha JSON assim que ele chega"""
+    async for item in items:
+        yield _ndjson_line(item)
+
+def iter_ndjson(items: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """Versão síncrona de stream_ndjson, consumida pelo Starlette em threads"""
+    for item in items:
+        yield _ndjson_line(item)
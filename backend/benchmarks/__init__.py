@@ -0,0 +1,5 @@
+"""Benchmarks de desempenho das operações PDF
+
+Execute a partir do diretório backend, por exemplo:
+    python -m benchmarks.bench_parallel_merge
+"""
@@ -0,0 +1,93 @@
+"""Benchmark de memória: RSS/USS/PSS de workers abrindo o mesmo PDF grande
+
+Compara o PyMuPDF aberto pelo caminho (como faz o DocumentCache) com a abertura
+a partir de bytes e com o PyPDF2 lendo do arquivo ou de um mmap.
+"""
+import argparse
+import mmap
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import fitz
+import psutil
+from PyPDF2 import PdfReader
+
+from app.services.document_cache import DocumentCache
+
+def build_document(path: Path, page_count: int, image_kb: int):
+    """Gera um PDF com uma imagem incompressível por página"""
+    doc = fitz.open()
+    side = int((image_kb * 1024 / 3) ** 0.5)
+    for _ in range(page_count):
+        page = doc.new_page()
+        pixmap = fitz.Pixmap(fitz.csRGB, side, side, os.urandom(side * side * 3), 0)
+        page.insert_image(page.rect, pixmap=pixmap)
+    doc.save(str(path))
+    doc.close()
+
+def _memory():
+    info = psutil.Process().memory_full_info()
+    return info.rss, info.uss, info.pss
+
+def _touch_fitz(doc):
+    """Lê todos os streams de imagem, como faria uma extração ou recompressão"""
+    for page in doc:
+        for image in page.get_images():
+            doc.xref_stream_raw(image[0])
+
+def _touch_pypdf(reader):
+    for page in reader.pages:
+        for obj in page["/Resources"]["/XObject"].values():
+            obj.get_object()._data  # stream codificado, sem decodificar
+
+def measure(strategy: str, path: str):
+    """Executado em cada worker: memória antes e depois de abrir e ler o arquivo"""
+    before = _memory()
+    if strategy == "fitz_bytes":
+        with open(path, "rb") as f:
+            doc = fitz.open(stream=f.read(), filetype="pdf")
+        _touch_fitz(doc)
+        after = _memory()
+        doc.close()
+    elif strategy == "fitz_caminho":
+        with DocumentCache(4, 1 << 40).borrow(path) as doc:
+            _touch_fitz(doc)
+            after = _memory()
+    elif strategy == "pypdf_arquivo":
+        with open(path, "rb") as f:
+            _touch_pypdf(PdfReader(f))
+            after = _memory()
+    else:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            _touch_pypdf(PdfReader(mapped))
+            after = _memory()
+    return [a - b for a, b in zip(after, before)]
+
+def run(workers: int, page_count: int, image_kb: int):
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_memory_"))
+    try:
+        source = work_dir / "large.pdf"
+        build_document(source, page_count, image_kb)
+        size_mb = source.stat().st_size / (1024 * 1024)
+        print(f"Arquivo: {size_mb:.1f} MB, {workers} workers (acréscimo médio por worker)")
+        print(f"{'estratégia':<16}{'RSS (MB)':>10}{'USS (MB)':>10}{'PSS (MB)':>10}")
+        
+        for strategy in ("fitz_bytes", "fitz_caminho", "pypdf_arquivo", "pypdf_mmap"):
+            # Pool novo por estratégia: cada worker começa sem o arquivo em memória
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                deltas = list(pool.map(measure, [strategy] * workers, [str(source)] * workers))
+            rss, uss, pss = (sum(column) / workers / (1024 * 1024) for column in zip(*deltas))
+            print(f"{strategy:<16}{rss:>10.1f}{uss:>10.1f}{pss:>10.1f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--image-kb", type=int, default=512)
+    args = parser.parse_args()
+    run(args.workers, args.pages, args.image_kb)
@@ -0,0 +1,72 @@
+"""Benchmark da mesclagem paralela: tempo total versus número de workers"""
+import argparse
+import asyncio
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import fitz
+
+from app.services.pdf_service import PDFService
+
+def build_synthetic_project(directory: Path, file_count: int, pages_per_file: int):
+    """Gera um projeto sintético com arquivos de tamanho variado"""
+    pdf_files = []
+    for index in range(file_count):
+        # Variar o número de páginas para exercitar o particionamento
+        page_count = max(1, pages_per_file + (index % 7) - 3)
+        doc = fitz.open()
+        for page_number in range(page_count):
+            page = doc.new_page()
+            page.insert_text((72, 72), f"Arquivo {index} - página {page_number + 1}", fontsize=16)
+            for line in range(40):
+                page.draw_line((72, 100 + line * 15), (540, 100 + line * 15))
+        file_path = directory / f"source_{index:04d}.pdf"
+        doc.save(str(file_path))
+        doc.close()
+        pdf_files.append(SimpleNamespace(
+            file_path=str(file_path),
+            order_index=index,
+            page_count=page_count
+        ))
+    return pdf_files
+
+async def run(file_count: int, pages_per_file: int, worker_counts):
+    service = PDFService()
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_merge_"))
+    try:
+        pdf_files = build_synthetic_project(work_dir, file_count, pages_per_file)
+        total_pages = sum(f.page_count for f in pdf_files)
+        print(f"Projeto sintético: {file_count} arquivos, {total_pages} páginas")
+        print(f"{'modo':<14}{'workers':>8}{'tempo (s)':>12}{'speedup':>10}")
+        
+        # Medir só a mesclagem: MERGE_DEDUPLICATE ligado somaria a deduplicação aos dois modos
+        start = time.perf_counter()
+        result = await service.merge_pdfs(pdf_files, "bench_sequential.pdf", parallel=False, deduplicate=False)
+        baseline = time.perf_counter() - start
+        assert result["success"] and result["total_pages"] == total_pages
+        print(f"{'sequencial':<14}{1:>8}{baseline:>12.2f}{1.0:>10.2f}")
+        
+        for workers in worker_counts:
+            start = time.perf_counter()
+            result = await service.merge_pdfs(
+                pdf_files, f"bench_parallel_{workers}.pdf", parallel=True, max_workers=workers, deduplicate=False
+            )
+            elapsed = time.perf_counter() - start
+            assert result["success"] and result["total_pages"] == total_pages
+            print(f"{'paralelo':<14}{workers:>8}{elapsed:>12.2f}{baseline / elapsed:>10.2f}")
+            Path(result["output_path"]).unlink()
+        
+        (service.output_dir / "bench_sequential.pdf").unlink()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=300)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+    asyncio.run(run(args.files, args.pages, args.workers))
@@ -0,0 +1,97 @@
+"""Benchmark da marca d'água: merge_page, carimbo compartilhado e atualização incremental"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+import fitz
+from PyPDF2 import PdfReader, PdfWriter
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from app.services.pdf_service import PDFService
+
+def build_document(path: Path, page_count: int, image_kb: int = 0):
+    """Gera um documento sintético com texto e, opcionalmente, uma imagem distinta por página"""
+    doc = fitz.open()
+    side = int((image_kb * 1024 / 3) ** 0.5)
+    for page_number in range(page_count):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Página {page_number + 1}", fontsize=16)
+        for line in range(40):
+            page.draw_line((72, 100 + line * 15), (540, 100 + line * 15))
+        if side:
+            # Ruído não comprime: simula páginas digitalizadas com streams grandes
+            pixmap = fitz.Pixmap(fitz.csRGB, side, side, os.urandom(side * side * 3), 0)
+            page.insert_image(fitz.Rect(72, 100, 540, 700), pixmap=pixmap)
+    doc.save(str(path))
+    doc.close()
+
+def legacy_watermark(pdf_path: str, watermark_text: str, output_path: str):
+    """Implementação anterior: merge_page do PyPDF2 com um carimbo tamanho carta"""
+    watermark_buffer = BytesIO()
+    c = canvas.Canvas(watermark_buffer, pagesize=letter)
+    c.setFont("Helvetica", 50)
+    c.setFillColorRGB(0.5, 0.5, 0.5, alpha=0.3)
+    c.rotate(45)
+    c.drawString(200, 200, watermark_text)
+    c.save()
+    
+    watermark_buffer.seek(0)
+    watermark_page = PdfReader(watermark_buffer).pages[0]
+    
+    with open(pdf_path, "rb") as f:
+        pdf_writer = PdfWriter()
+        for page in PdfReader(f).pages:
+            page.merge_page(watermark_page)
+            pdf_writer.add_page(page)
+        with open(output_path, "wb") as output_file:
+            pdf_writer.write(output_file)
+
+async def run(page_counts, image_kb: int):
+    service = PDFService()
+    work_dir = Path(tempfile.mkdtemp(prefix="bench_watermark_"))
+    try:
+        print(f"{'páginas':>8}{'modo':>14}{'tempo (s)':>12}{'acréscimo (KB)':>16}{'bytes/página':>14}")
+        for page_count in page_counts:
+            source = work_dir / f"source_{page_count}.pdf"
+            build_document(source, page_count, image_kb)
+            source_size = source.stat().st_size
+            
+            legacy_output = work_dir / f"legacy_{page_count}.pdf"
+            start = time.perf_counter()
+            legacy_watermark(str(source), "CONFIDENCIAL", str(legacy_output))
+            elapsed = time.perf_counter() - start
+            growth = legacy_output.stat().st_size - source_size
+            print(f"{page_count:>8}{'merge_page':>14}{elapsed:>12.2f}{growth / 1024:>16.1f}{growth / page_count:>14.0f}")
+            
+            shared_output = work_dir / f"shared_{page_count}.pdf"
+            start = time.perf_counter()
+            result = await service.add_watermark(str(source), "CONFIDENCIAL", str(shared_output))
+            elapsed = time.perf_counter() - start
+            assert result["success"] and result["pages"] == page_count
+            growth = shared_output.stat().st_size - source_size
+            print(f"{page_count:>8}{'compartilhado':>14}{elapsed:>12.2f}{growth / 1024:>16.1f}{growth / page_count:>14.0f}")
+            
+            incremental_output = work_dir / f"incremental_{page_count}.pdf"
+            start = time.perf_counter()
+            result = await service.add_watermark(
+                str(source), "CONFIDENCIAL", str(incremental_output), incremental=True
+            )
+            elapsed = time.perf_counter() - start
+            assert result["success"] and result["incremental"]
+            growth = incremental_output.stat().st_size - source_size
+            print(f"{page_count:>8}{'incremental':>14}{elapsed:>12.2f}{growth / 1024:>16.1f}{growth / page_count:>14.0f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--image-kb", type=int, default=0, help="imagem por página, em KB")
+    args = parser.parse_args()
+    asyncio.run(run(args.pages, args.image_kb))
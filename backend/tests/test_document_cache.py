@@ -0,0 +1,115 @@
+import pytest
+import os
+import threading
+import fitz
+from pathlib import Path
+from app.services.document_cache import DocumentCache
+
+def make_pdf(path: Path, pages: int = 1) -> str:
+    doc = fitz.open()
+    for number in range(pages):
+        doc.new_page().insert_text((72, 72), f"Page {number + 1}")
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+class TestDocumentCache:
+    """Test the per-process LRU of open PyMuPDF documents"""
+    
+    def test_reuses_returned_handle(self, tmp_path: Path):
+        """Test a returned document is served again on the next borrow"""
+        cache = DocumentCache(max_documents=4, max_bytes=10 * 1024 * 1024)
+        path = make_pdf(tmp_path / "a.pdf")
+        
+        with cache.borrow(path) as first:
+            pass
+        with cache.borrow(path) as second:
+            assert second is first
+        
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+        assert stats["idle_documents"] == 1
+    
+    def test_concurrent_borrows_get_distinct_handles(self, tmp_path: Path):
+        """Test a borrowed document is never handed to a second borrower"""
+        cache = DocumentCache(max_documents=4, max_bytes=10 * 1024 * 1024)
+        path = make_pdf(tmp_path / "a.pdf")
+        
+        with cache.borrow(path) as first, cache.borrow(path) as second:
+            assert first is not second
+            assert cache.stats()["borrowed"] == 2
+        
+        assert cache.stats()["idle_documents"] == 2
+    
+    def test_evicts_least_recently_used(self, tmp_path: Path):
+        """Test count and memory bounds evict the oldest documents"""
+        paths = [make_pdf(tmp_path / f"{name}.pdf") for name in "abc"]
+        cache = DocumentCache(max_documents=2, max_bytes=10 * 1024 * 1024)
+        
+        for path in paths:
+            with cache.borrow(path):
+                pass
+        
+        assert cache.stats()["idle_documents"] == 2
+        assert cache.stats()["evictions"] == 1
+        with cache.borrow(paths[0]):
+            pass
+        assert cache.stats()["hits"] == 0
+        
+        small = DocumentCache(max_documents=10, max_bytes=os.path.getsize(paths[0]))
+        for path in paths:
+            with small.borrow(path):
+                pass
+        assert small.stats()["idle_documents"] == 1
+    
+    def test_modified_file_is_reopened(self, tmp_path: Path):
+        """Test the (path, mtime) key drops handles of older file versions"""
+        cache = DocumentCache(max_documents=4, max_bytes=10 * 1024 * 1024)
+        path = make_pdf(tmp_path / "a.pdf", pages=1)
+        
+        with cache.borrow(path):
+            pass
+        
+        make_pdf(tmp_path / "a.pdf", pages=3)
+        os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 10 ** 9))
+        
+        with cache.borrow(path) as doc:
+            assert doc.page_count == 3
+        assert cache.stats()["idle_documents"] == 1
+    
+    def test_error_discards_handle(self, tmp_path: Path):
+        """Test a document whose borrower raised is closed, not returned"""
+        cache = DocumentCache(max_documents=4, max_bytes=10 * 1024 * 1024)
+        path = make_pdf(tmp_path / "a.pdf")
+        
+        with pytest.raises(RuntimeError):
+            with cache.borrow(path):
+                raise RuntimeError("falha")
+        
+        assert cache.stats()["idle_documents"] == 0
+    
+    def test_thread_pool_use(self, tmp_path: Path):
+        """Test parallel borrowers from several threads render correctly"""
+        cache = DocumentCache(max_documents=4, max_bytes=10 * 1024 * 1024)
+        path = make_pdf(tmp_path / "a.pdf", pages=4)
+        errors = []
+        
+        def render():
+            try:
+                for _ in range(10):
+                    with cache.borrow(path) as doc:
+                        doc[2].get_pixmap(dpi=20)
+            except Exception as e:
+                errors.append(e)
+        
+        threads = [threading.Thread(target=render) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert not errors
+        assert cache.stats()["borrowed"] == 0
+        assert cache.stats()["hits"] + cache.stats()["misses"] == 40
@@ -1,8 +1,12 @@
 import pytest
 import os
+import shutil
+from pathlib import Path
 from fastapi.testclient import TestClient
 from app.models.user import User
 from app.models.pdf_project import PDFProject
+from app.core.config import settings
+from app.utils.downloads import content_disposition
 
 class TestPDFOperations:
     """Test PDF operations endpoints"""
@@ -78,6 +82,83 @@ class TestPDFOperations:
         assert response.status_code == 400
         assert "não é um PDF válido" in response.json()["detail"]
     
+    def test_upload_isolates_failures(self, client: TestClient, auth_headers: dict, test_project: PDFProject, temp_pdf_file: str):
+        """Test a corrupt PDF in a batch is reported per file while the others are stored in order"""
+        import json
+        
+        with open(temp_pdf_file, "rb") as f:
+            content = f.read()
+        files = [
+            ("files", ("first.pdf", content, "application/pdf")),
+            ("files", ("corrupt.pdf", b"%PDF-1.4 truncated", "application/pdf")),
+            ("files", ("notes.txt", b"Not a PDF", "text/plain")),
+            ("files", ("last.pdf", content, "application/pdf")),
+        ]
+        stored_before = set(os.listdir(settings.UPLOAD_DIR))
+        
+        response = client.post(
+            f"/api/pdf/projects/{test_project.id}/upload",
+            files=files,
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 207
+        data = response.json()
+        assert [item["original_filename"] for item in data] == ["first.pdf", "last.pdf"]
+        assert [item["order_index"] for item in data] == [0, 1]
+        
+        errors = json.loads(response.headers["X-Upload-Errors"])
+        assert [(error["index"], error["filename"]) for error in errors] == [(1, "corrupt.pdf"), (2, "notes.txt")]
+        assert "não é um PDF válido" in errors[1]["error"]
+        
+        # O PDF corrompido não deixa arquivo para trás
+        assert set(os.listdir(settings.UPLOAD_DIR)) - stored_before == {os.path.basename(item["file_path"]) for item in data}
+    
+    def test_resumable_upload(self, client: TestClient, auth_headers: dict, test_project: PDFProject, temp_pdf_file: str):
+        """Test a tus-style upload is created, sent in chunks, resumed from HEAD and finalized into the project"""
+        import base64
+        
+        with open(temp_pdf_file, "rb") as f:
+            content = f.read()
+        metadata = "filename " + base64.b64encode(b"scan.pdf").decode()
+        
+        response = client.post(
+            f"/api/pdf/projects/{test_project.id}/uploads",
+            headers={**auth_headers, "Upload-Length": str(len(content)), "Upload-Metadata": metadata}
+        )
+        assert response.status_code == 201
+        location = response.headers["Location"]
+        assert response.headers["Upload-Offset"] == "0"
+        
+        chunk_headers = {**auth_headers, "Content-Type": "application/offset+octet-stream"}
+        half = len(content) // 2
+        response = client.patch(location, content=content[:half], headers={**chunk_headers, "Upload-Offset": "0"})
+        assert response.status_code == 204
+        assert response.headers["Upload-Offset"] == str(half)
+        
+        # Bloco repetido (o cliente não viu a resposta): conflito com o offset atual
+        response = client.patch(location, content=content[:half], headers={**chunk_headers, "Upload-Offset": "0"})
+        assert response.status_code == 409
+        
+        response = client.head(location, headers=auth_headers)
+        assert response.headers["Upload-Offset"] == str(half)
+        assert response.headers["Upload-Length"] == str(len(content))
+        
+        assert client.post(f"{location}/finalize", headers=auth_headers).status_code == 409
+        
+        response = client.patch(location, content=content[half:], headers={**chunk_headers, "Upload-Offset": str(half)})
+        assert response.headers["Upload-Offset"] == str(len(content))
+        
+        response = client.post(f"{location}/finalize", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["original_filename"] == "scan.pdf"
+        assert data["project_id"] == test_project.id
+        assert data["page_count"] > 0
+        with open(data["file_path"], "rb") as f:
+            assert f.read() == content
+        assert client.head(location, headers=auth_headers).status_code == 404
+    
     def test_reorder_files(self, client: TestClient, auth_headers: dict, test_project: PDFProject):
         """Test reordering files in a project"""
         # First upload some files
@@ -141,6 +222,39 @@ class TestPDFOperations:
         assert response.status_code == 400
         assert "Nenhum arquivo PDF encontrado" in response.json()["detail"]
     
+    def test_virtual_document(self, client: TestClient, auth_headers: dict, test_project: PDFProject, temp_pdf_file: str):
+        """Test browsing the merged result without running a merge"""
+        with open(temp_pdf_file, "rb") as f:
+            content = f.read()
+        files = [("files", ("test1.pdf", content, "application/pdf")),
+                ("files", ("test2.pdf", content, "application/pdf"))]
+        client.post(
+            f"/api/pdf/projects/{test_project.id}/upload",
+            files=files,
+            headers=auth_headers
+        )
+        
+        response = client.get(f"/api/pdf/projects/{test_project.id}/virtual", headers=auth_headers)
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total_pages"] == 2
+        assert [f["first_page"] for f in data["files"]] == [1, 2]
+        
+        response = client.get(
+            f"/api/pdf/projects/{test_project.id}/virtual/pages/2?format=pdf",
+            headers=auth_headers
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/pdf"
+        assert response.headers["x-source-page"] == "1"
+        
+        response = client.get(
+            f"/api/pdf/projects/{test_project.id}/virtual/pages/3",
+            headers=auth_headers
+        )
+        assert response.status_code == 404
+    
     def test_download_project_output(self, client: TestClient, auth_headers: dict, test_project: PDFProject):
         """Test downloading project output"""
         # This test assumes the project has been processed
@@ -152,6 +266,563 @@ class TestPDFOperations:
         # Should return 404 since no output file exists
         assert response.status_code == 404
     
+    def test_download_file_conditional_and_ranges(self, client: TestClient, auth_headers: dict, test_project: PDFProject, temp_pdf_file: str):
+        """Test uploaded file downloads carry a content ETag, honor If-None-Match and serve byte ranges"""
+        import hashlib
+        
+        with open(temp_pdf_file, "rb") as f:
+            content = f.read()
+        upload = client.post(
+            f"/api/pdf/projects/{test_project.id}/upload",
+            files={"files": ("test.pdf", content, "application/pdf")},
+            headers=auth_headers
+        )
+        url = f"/api/pdf/files/{upload.json()[0]['id']}/download"
+        
+        response = client.get(url, headers=auth_headers)
+        assert response.status_code == 200
+        assert response.content == content
+        assert response.headers["etag"] == f'"{hashlib.sha256(content).hexdigest()}"'
+        assert response.headers["accept-ranges"] == "bytes"
+        assert "immutable" in response.headers["cache-control"]
+        etag = response.headers["etag"]
+        
+        response = client.get(url, headers={**auth_headers, "If-None-Match": f'W/"outro", {etag}'})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+        
+        response = client.get(url, headers={**auth_headers, "Range": "bytes=0-9", "If-Range": etag})
+        assert response.status_code == 206
+        assert response.content == content[:10]
+        assert response.headers["content-range"] == f"bytes 0-9/{len(content)}"
+        
+        response = client.get(url, headers={**auth_headers, "Range": "bytes=0-4,-5"})
+        assert response.status_code == 206
+        assert response.headers["content-type"].startswith("multipart/byteranges")
+        assert content[:5] in response.content and content[-5:] in response.content
+        
+        # If-Range com ETag antigo: arquivo inteiro
+        response = client.get(url, headers={**auth_headers, "Range": "bytes=0-9", "If-Range": '"antigo"'})
+        assert response.status_code == 200
+        assert response.content == content
+    
+    def test_download_output_stat_etag(self, client: TestClient, auth_headers: dict, test_project: PDFProject, db_session, tmp_path: Path):
+        """Test rewritten outputs get a new ETag derived from mtime and size"""
+        output = tmp_path / "final.pdf"
+        output.write_bytes(b"%PDF-1.4 primeira versao")
+        test_project.output_path = str(output)
+        test_project.output_filename = "final.pdf"
+        db_session.commit()
+        url = f"/api/pdf/projects/{test_project.id}/download"
+        
+        response = client.get(url, headers=auth_headers)
+        stat = output.stat()
+        assert response.status_code == 200
+        assert response.headers["etag"] == f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        etag = response.headers["etag"]
+        
+        assert client.get(url, headers={**auth_headers, "If-None-Match": etag}).status_code == 304
+        
+        # Regravada com o mesmo nome (como fazem as operações): o ETag antigo não vale mais
+        output.write_bytes(b"%PDF-1.4 segunda versao, maior")
+        response = client.get(url, headers={**auth_headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+    
+    def test_upload_defers_thumbnails(self, client: TestClient, auth_headers: dict, test_project: PDFProject, temp_pdf_file: str, db_session):
+        """Test uploads return before rendering and the queue fills in preview and thumbnail"""
+        from app.services.thumbnail_queue import thumbnail_queue
+        
+        with open(temp_pdf_file, "rb") as f:
+            files = {"files": ("test.pdf", f, "application/pdf")}
+            upload = client.post(
+                f"/api/pdf/projects/{test_project.id}/upload",
+                files=files,
+                headers=auth_headers
+            )
+        
+        uploaded = upload.json()[0]
+        assert uploaded["thumbnail_status"] == "pending"
+        assert uploaded["preview_url"] is None
+        
+        # Prévia e thumbnail são gravadas pela fila em segundo plano
+        thumbnail_queue.wait_idle()
+        db_session.expire_all()
+        response = client.get(
+            f"/api/pdf/projects/{test_project.id}/files?visible={uploaded['id']}",
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 200
+        listed = next(item for item in response.json() if item["id"] == uploaded["id"])
+        assert listed["thumbnail_status"] == "ready"
+        assert client.get(listed["preview_url"]).status_code == 200
+        assert client.get(listed["thumbnail_url"]).status_code == 200
+        
+        response = client.get(f"/api/pdf/projects/{test_project.id}/files?visible=a,b", headers=auth_headers)
+        assert response.status_code == 400
+    
+    def test_get_thumbnail(self, client: TestClient, auth_headers: dict, test_project: PDFProject, temp_pdf_file: str, db_session):
+        """Test thumbnails are negotiated by Accept and served as immutable"""
+        from app.services.thumbnail_queue import thumbnail_queue
+        
+        with open(temp_pdf_file, "rb") as f:
+            files = {"files": ("test.pdf", f, "application/pdf")}
+            upload = client.post(
+                f"/api/pdf/projects/{test_project.id}/upload",
+                files=files,
+                headers=auth_headers
+            )
+        thumbnail_queue.wait_idle()
+        db_session.expire_all()
+        listed = client.get(f"/api/pdf/projects/{test_project.id}/files", headers=auth_headers).json()
+        thumbnail_url = next(item for item in listed if item["id"] == upload.json()[0]["id"])["thumbnail_url"]
+        
+        response = client.get(thumbnail_url, headers={"Accept": "image/webp,image/*,*/*;q=0.8"})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/webp"
+        assert response.headers["vary"] == "Accept"
+        assert "immutable" in response.headers["cache-control"]
+        
+        response = client.get(thumbnail_url, headers={"Accept": "*/*"})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/jpeg"
+        
+        response = client.get("/api/pdf/thumbnails/not-a-key")
+        assert response.status_code == 404
+    
+    def test_project_sprite(self, client: TestClient, auth_headers: dict, test_project: PDFProject, temp_pdf_file: str):
+        """Test the project sprite is built in the background and then served with its map"""
+        import time
+        
+        with open(temp_pdf_file, "rb") as f:
+            files = {"files": ("test.pdf", f, "application/pdf")}
+            upload = client.post(
+                f"/api/pdf/projects/{test_project.id}/upload",
+                files=files,
+                headers=auth_headers
+            )
+        file_id = upload.json()[0]["id"]
+        
+        url = f"/api/pdf/projects/{test_project.id}/sprite?kind=pages"
+        response = client.get(url, headers=auth_headers)
+        assert response.status_code == 202
+        
+        for _ in range(100):
+            response = client.get(url, headers=auth_headers)
+            if response.status_code == 200:
+                break
+            time.sleep(0.1)
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "ready"
+        assert file_id in {tile["file_id"] for tile in data["tiles"]}
+        
+        sheet = client.get(data["sheets"][0]["url"], headers={"Accept": "image/webp"})
+        assert sheet.status_code == 200
+        assert sheet.headers["content-type"] == "image/webp"
+        assert "immutable" in sheet.headers["cache-control"]
+    
+    def test_compress_pdf(self, client: TestClient, auth_headers: dict, test_project: PDFProject, temp_pdf_file: str):
+        """Test compressing an uploaded PDF"""
+        with open(temp_pdf_file, "rb") as f:
+            files = {"files": ("test.pdf", f, "application/pdf")}
+            upload = client.post(
+                f"/api/pdf/projects/{test_project.id}/upload",
+                files=files,
+                headers=auth_headers
+            )
+        file_id = upload.json()[0]["id"]
+        
+        response = client.post(
+            "/api/pdf/compress",
+            json={"input_file_id": file_id, "quality": 60, "output_filename": "compressed_test"},
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["output_path"].endswith("compressed_test.pdf")
+        assert "compression_ratio" in data
+        assert isinstance(data["images"], list)
+        
+        os.unlink(data["output_path"])
+    
+    def test_compress_unknown_file(self, client: TestClient, auth_headers: dict):
+        """Test compressing a file that does not exist"""
+        response = client.post(
+            "/api/pdf/compress",
+            json={"input_file_id": 99999, "output_filename": "missing.pdf"},
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 404
+    
+    def test_add_watermark(self, client: TestClient, auth_headers: dict, test_project: PDFProject, temp_pdf_file: str):
+        """Test adding a watermark to an uploaded PDF"""
+        with open(temp_pdf_file, "rb") as f:
+            files = {"files": ("test.pdf", f, "application/pdf")}
+            upload = client.post(
+                f"/api/pdf/projects/{test_project.id}/upload",
+                files=files,
+                headers=auth_headers
+            )
+        file_id = upload.json()[0]["id"]
+        
+        response = client.post(
+            "/api/pdf/watermark",
+            json={
+                "input_file_id": file_id,
+                "watermark_text": "CONFIDENCIAL",
+                "output_filename": "watermarked_test",
+                "opacity": 0.4
+            },
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["output_path"].endswith("watermarked_test.pdf")
+        assert data["stamps_built"] == 1
+        
+        os.unlink(data["output_path"])
+    
+    def test_add_watermark_invalid_options(self, client: TestClient, auth_headers: dict):
+        """Test out-of-range font size and rotation are rejected before any work"""
+        request = {"input_file_id": 1, "watermark_text": "CONFIDENCIAL", "output_filename": "watermarked_test"}
+        
+        for options in ({"font_size": 0}, {"font_size": 5000}, {"rotation": 720}, {"rotation": -181}):
+            response = client.post("/api/pdf/watermark", json={**request, **options}, headers=auth_headers)
+            assert response.status_code == 422
+            assert response.json()["detail"][0]["loc"][-1] == next(iter(options))
+    
+    def test_split_pdf_archive(self, client: TestClient, auth_headers: dict, test_project: PDFProject, temp_pdf_file: str):
+        """Test splitting an uploaded PDF into a streamed ZIP"""
+        import io
+        import zipfile
+        
+        with open(temp_pdf_file, "rb") as f:
+            files = {"files": ("test.pdf", f, "application/pdf")}
+            upload = client.post(
+                f"/api/pdf/projects/{test_project.id}/upload",
+                files=files,
+                headers=auth_headers
+            )
+        file_id = upload.json()[0]["id"]
+        
+        response = client.post(
+            "/api/pdf/split",
+            json={"input_file_id": file_id, "output_prefix": "split_test", "archive": True},
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/zip"
+        archive = zipfile.ZipFile(io.BytesIO(response.content))
+        assert archive.testzip() is None
+        assert archive.namelist()[0] == "split_test_1.pdf"
+        
+        # Cada divisão grava em um diretório próprio dentro de OUTPUT_DIR
+        run_dirs = list(Path(settings.OUTPUT_DIR).glob("split_test_*"))
+        assert len(run_dirs) == 1 and run_dirs[0].is_dir()
+        assert sorted(os.listdir(run_dirs[0])) == sorted(archive.namelist())
+        shutil.rmtree(run_dirs[0])
+    
+    def test_streamed_operations_after_session_closed(self, client: TestClient, auth_headers: dict, test_project: PDFProject, temp_pdf_file: str, db_session):
+        """Test streamed responses read the file and record the operation after the request session is closed"""
+        import io
+        import zipfile
+        from app.models.database import get_db
+        from app.models.pdf_project import PDFOperation
+        
+        with open(temp_pdf_file, "rb") as f:
+            files = {"files": ("test.pdf", f, "application/pdf")}
+            upload = client.post(
+                f"/api/pdf/projects/{test_project.id}/upload",
+                files=files,
+                headers=auth_headers
+            )
+        file_id = upload.json()[0]["id"]
+        
+        # Como o get_db real: a sessão é fechada antes de o corpo ser enviado
+        def closing_get_db():
+            try:
+                yield db_session
+            finally:
+                db_session.close()
+        
+        client.app.dependency_overrides[get_db] = closing_get_db
+        
+        response = client.post(
+            "/api/pdf/split",
+            json={"input_file_id": file_id, "output_prefix": "closed_split", "archive": True},
+            headers=auth_headers
+        )
+        
+        archive = zipfile.ZipFile(io.BytesIO(response.content))
+        assert archive.testzip() is None
+        operation = db_session.query(PDFOperation).order_by(PDFOperation.id.desc()).first()
+        assert operation.status == "completed"
+        assert len(operation.output_files) == len(archive.namelist())
+        
+        shutil.rmtree(os.path.dirname(operation.output_files[0]))
+        
+        for output in ("ndjson", "zip"):
+            response = client.post(
+                "/api/pdf/rasterize",
+                json={"input_file_id": file_id, "dpi": 36, "output": output},
+                headers=auth_headers
+            )
+            assert response.status_code == 200
+            
+            operation = db_session.query(PDFOperation).order_by(PDFOperation.id.desc()).first()
+            assert operation.operation_type == "rasterize"
+            assert operation.status == "completed"
+            assert operation.output_files
+        
+        for output in ("ndjson", "zip"):
+            response = client.post(
+                "/api/pdf/extract-images",
+                json={"input_file_id": file_id, "output": output},
+                headers=auth_headers
+            )
+            assert response.status_code == 200
+            
+            operation = db_session.query(PDFOperation).order_by(PDFOperation.id.desc()).first()
+            assert operation.operation_type == "extract_images"
+            assert operation.status == "completed"
+    
+    def test_split_invalid_ranges(self, client: TestClient, auth_headers: dict, test_project: PDFProject, temp_pdf_file: str):
+        """Test out-of-range page ranges are rejected before splitting"""
+        with open(temp_pdf_file, "rb") as f:
+            files = {"files": ("test.pdf", f, "application/pdf")}
+            upload = client.post(
+                f"/api/pdf/projects/{test_project.id}/upload",
+                files=files,
+                headers=auth_headers
+            )
+        file_id = upload.json()[0]["id"]
+        
+        response = client.post(
+            "/api/pdf/split",
+            json={"input_file_id": file_id, "mode": "ranges", "ranges": "1-999"},
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 400
+    
+    def test_extract_pages(self, client: TestClient, auth_headers: dict, test_project: PDFProject, temp_pdf_file: str):
+        """Test extracting a page range without writing output files"""
+        with open(temp_pdf_file, "rb") as f:
+            files = {"files": ("test.pdf", f, "application/pdf")}
+            upload = client.post(
+                f"/api/pdf/projects/{test_project.id}/upload",
+                files=files,
+                headers=auth_headers
+            )
+        file_id = upload.json()[0]["id"]
+        outputs_before = set(os.listdir(settings.OUTPUT_DIR))
+        
+        response = client.get(f"/api/pdf/files/{file_id}/extract?pages=1", headers=auth_headers)
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/pdf"
+        assert response.content.startswith(b"%PDF")
+        assert set(os.listdir(settings.OUTPUT_DIR)) == outputs_before
+        
+        response = client.get(f"/api/pdf/files/{file_id}/extract?pages=999", headers=auth_headers)
+        assert response.status_code == 400
+    
+    def test_extract_pages_unicode_filename(self, client: TestClient, auth_headers: dict, test_project: PDFProject, temp_pdf_file: str):
+        """Test names outside latin-1 or with quotes produce a valid Content-Disposition"""
+        from urllib.parse import unquote
+        
+        with open(temp_pdf_file, "rb") as f:
+            files = {"files": ("relatório 报告.pdf", f, "application/pdf")}
+            upload = client.post(
+                f"/api/pdf/projects/{test_project.id}/upload",
+                files=files,
+                headers=auth_headers
+            )
+        file_id = upload.json()[0]["id"]
+        
+        response = client.get(f"/api/pdf/files/{file_id}/extract?pages=1", headers=auth_headers)
+        
+        assert response.status_code == 200
+        disposition = response.headers["content-disposition"]
+        assert disposition.startswith('inline; filename="relatorio _1.pdf"; ')
+        assert unquote(disposition.split("filename*=UTF-8''")[1]) == "relatório 报告_1.pdf"
+        
+        quoted = content_disposition('lote "final".zip')
+        assert quoted.startswith('attachment; filename="lote _final_.zip"; ')
+        assert unquote(quoted.split("filename*=UTF-8''")[1]) == 'lote "final".zip'
+    
+    def test_extract_text(self, client: TestClient, auth_headers: dict, test_project: PDFProject, temp_pdf_file: str):
+        """Test native text extraction streamed as NDJSON"""
+        import json
+        
+        with open(temp_pdf_file, "rb") as f:
+            files = {"files": ("test.pdf", f, "application/pdf")}
+            upload = client.post(
+                f"/api/pdf/projects/{test_project.id}/upload",
+                files=files,
+                headers=auth_headers
+            )
+        file_id = upload.json()[0]["id"]
+        
+        response = client.get(f"/api/pdf/files/{file_id}/text?mode=words", headers=auth_headers)
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert lines[0]["page"] == 1
+        assert "words" in lines[0]
+        assert lines[-1]["summary"]["total_pages"] == len(lines) - 1
+        
+        response = client.get(f"/api/pdf/files/{file_id}/text?mode=lines", headers=auth_headers)
+        assert response.status_code == 422
+        
+        response = client.get(f"/api/pdf/files/{file_id}/text?pages=999", headers=auth_headers)
+        assert response.status_code == 400
+    
+    def test_rasterize(self, client: TestClient, auth_headers: dict, test_project: PDFProject, temp_pdf_file: str):
+        """Test rasterization export as NDJSON manifest and as ZIP"""
+        import io
+        import json
+        import shutil
+        import zipfile
+        
+        with open(temp_pdf_file, "rb") as f:
+            files = {"files": ("test.pdf", f, "application/pdf")}
+            upload = client.post(
+                f"/api/pdf/projects/{test_project.id}/upload",
+                files=files,
+                headers=auth_headers
+            )
+        file_id = upload.json()[0]["id"]
+        
+        response = client.post(
+            "/api/pdf/rasterize",
+            json={"input_file_id": file_id, "dpi": 72, "output": "ndjson"},
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert lines[0]["page"] == 1
+        assert lines[-1]["summary"]["total_pages"] == len(lines) - 1
+        # URL servida por /outputs, sem expor o caminho no servidor
+        assert "output_path" not in lines[0]
+        assert lines[0]["url"].startswith("/outputs/") and lines[0]["url"].endswith("/page_00001.png")
+        run_dir = lines[0]["url"][len("/outputs/"):].split("/")[0]
+        shutil.rmtree(os.path.join(settings.OUTPUT_DIR, run_dir))
+        
+        response = client.post(
+            "/api/pdf/rasterize",
+            json={"input_file_id": file_id, "format": "jpeg", "output_prefix": "raster_test"},
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 200
+        archive = zipfile.ZipFile(io.BytesIO(response.content))
+        assert archive.namelist()[0] == "page_00001.jpg"
+        manifest = json.loads(archive.read("manifest.json"))
+        assert manifest["total_pages"] == len(archive.namelist()) - 1
+        assert manifest["pages_per_second"] > 0
+        
+        for name in os.listdir(settings.OUTPUT_DIR):
+            if name.startswith("raster_test_"):
+                shutil.rmtree(os.path.join(settings.OUTPUT_DIR, name))
+        
+        response = client.post(
+            "/api/pdf/rasterize",
+            json={"input_file_id": file_id, "pages": "999"},
+            headers=auth_headers
+        )
+        assert response.status_code == 400
+    
+    def test_extract_images(self, client: TestClient, auth_headers: dict, test_project: PDFProject, tmp_path):
+        """Test image extraction streamed as a ZIP with a manifest"""
+        import io
+        import json
+        import shutil
+        import zipfile
+        import fitz
+        from PIL import Image
+        
+        buffer = io.BytesIO()
+        Image.effect_noise((200, 100), 60).convert("RGB").save(buffer, "JPEG")
+        doc = fitz.open()
+        for _ in range(2):
+            doc.new_page().insert_image(fitz.Rect(72, 72, 272, 172), stream=buffer.getvalue())
+        doc.save(str(tmp_path / "photo.pdf"))
+        doc.close()
+        
+        with open(tmp_path / "photo.pdf", "rb") as f:
+            files = {"files": ("photo.pdf", f, "application/pdf")}
+            upload = client.post(
+                f"/api/pdf/projects/{test_project.id}/upload",
+                files=files,
+                headers=auth_headers
+            )
+        file_id = upload.json()[0]["id"]
+        
+        response = client.post(
+            "/api/pdf/extract-images",
+            json={"input_file_id": file_id, "output_prefix": "images_test"},
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 200
+        archive = zipfile.ZipFile(io.BytesIO(response.content))
+        manifest = json.loads(archive.read("manifest.json"))
+        assert manifest["total_images"] == 1
+        assert manifest["images"][0]["pages"] == [1, 2]
+        assert archive.read(manifest["images"][0]["filename"]) == buffer.getvalue()
+        
+        response = client.post(
+            "/api/pdf/extract-images",
+            json={"input_file_id": file_id, "output_prefix": "images_test", "output": "ndjson"},
+            headers=auth_headers
+        )
+        image = json.loads(response.text.splitlines()[0])
+        assert "output_path" not in image
+        assert image["url"].startswith("/outputs/images_test_") and image["url"].endswith(".jpg")
+        
+        for name in os.listdir(settings.OUTPUT_DIR):
+            if name.startswith("images_test_"):
+                shutil.rmtree(os.path.join(settings.OUTPUT_DIR, name))
+    
+    def test_search_documents(self, client: TestClient, auth_headers: dict, test_project: PDFProject, tmp_path):
+        """Test uploaded documents become searchable by their text"""
+        import fitz
+        from app.services.search_index import search_index
+        
+        doc = fitz.open()
+        doc.new_page().insert_text((72, 72), "cláusula xilofone indenizatória")
+        doc.save(str(tmp_path / "contract.pdf"))
+        doc.close()
+        
+        with open(tmp_path / "contract.pdf", "rb") as f:
+            files = {"files": ("contract.pdf", f, "application/pdf")}
+            upload = client.post(
+                f"/api/pdf/projects/{test_project.id}/upload",
+                files=files,
+                headers=auth_headers
+            )
+        file_id = upload.json()[0]["id"]
+        search_index.wait_idle()
+        
+        response = client.get("/api/pdf/search?q=clausula xilofone", headers=auth_headers)
+        
+        assert response.status_code == 200
+        hits = response.json()["hits"]
+        assert [(hit["file_id"], hit["page"]) for hit in hits] == [(file_id, 1)]
+        assert "<mark>xilofone</mark>" in hits[0]["snippet"]
+    
     def test_list_operations(self, client: TestClient, auth_headers: dict):
         """Test listing PDF operations"""
         response = client.get("/api/pdf/operations/", headers=auth_headers)
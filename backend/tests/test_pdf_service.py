@@ -2,7 +2,7 @@ import pytest
 import tempfile
 import os
 from pathlib import Path
-from app.services.pdf_service import PDFService
+from app.services.pdf_service import PDFService, get_process_pool, iter_in_window, partition_by_pages
 from app.models.pdf_project import PDFFile
 
 class TestPDFService:
@@ -29,11 +29,68 @@ class TestPDFService:
         assert result["original_filename"] == filename
         assert result["file_size"] == len(sample_pdf_content)
         assert "metadata" in result
+        # Renderização fica para a fila de thumbnails
+        assert result["preview_path"] is None and result["thumbnail_path"] is None
         
         # Cleanup
         if os.path.exists(result["file_path"]):
             os.unlink(result["file_path"])
     
+    @pytest.mark.asyncio
+    async def test_save_uploaded_file_normalizes(self, pdf_service: PDFService, tmp_path: Path, monkeypatch):
+        """Test ingest normalization rewrites damaged uploads and keeps the original"""
+        import fitz
+        from app.core.config import settings
+        
+        monkeypatch.setattr(settings, "INGEST_NORMALIZE", True)
+        
+        doc = fitz.open()
+        for number in range(3):
+            doc.new_page().insert_text((72, 72), f"Page {number + 1}")
+        source = tmp_path / "source.pdf"
+        doc.save(str(source))
+        doc.close()
+        
+        clean = source.read_bytes()
+        with fitz.open(str(source)) as update:
+            update[0].insert_text((72, 100), "update")
+            update.saveIncr()
+        # Atualização incremental com o ponteiro da xref corrompido
+        damaged = source.read_bytes().replace(b"startxref", b"startxrex")
+        
+        result = await pdf_service.save_uploaded_file(damaged, "damaged.pdf")
+        ingest = result["metadata"]["ingest"]
+        
+        assert ingest["normalized"] is True
+        assert ingest["repaired"] is True
+        assert ingest["incremental_updates"] == 1
+        assert ingest["parse_ms_before"]["pypdf2"] is None
+        assert ingest["parse_ms_after"]["pypdf2"] is not None
+        assert result["metadata"]["page_count"] == 3
+        assert result["file_size"] == os.path.getsize(result["file_path"])
+        with open(ingest["original_path"], "rb") as f:
+            assert f.read() == damaged
+        with fitz.open(result["file_path"]) as normalized:
+            assert not normalized.is_repaired
+        
+        result = await pdf_service.save_uploaded_file(clean, "clean.pdf")
+        assert result["metadata"]["ingest"]["normalized"] is False
+        with open(result["file_path"], "rb") as f:
+            assert f.read() == clean
+    
+    def test_ingest_scans_in_chunks(self, tmp_path: Path, monkeypatch):
+        """Test %%EOF markers split across read blocks are counted once and unreadable files measure as None"""
+        from app.services import ingest
+        
+        monkeypatch.setattr(ingest, "_SCAN_CHUNK", 7)
+        source = tmp_path / "revisions.pdf"
+        source.write_bytes(b"%PDF-1.4\n%%EOF\nupdate\n%%EOF\n%%EOF%%EOF")
+        assert ingest.count_eof_markers(str(source)) == 4
+        
+        garbage = tmp_path / "garbage.pdf"
+        garbage.write_bytes(b"not a pdf")
+        assert ingest.measure_parse(str(garbage))["pymupdf"] is None
+    
     @pytest.mark.asyncio
     async def test_extract_pdf_metadata(self, pdf_service: PDFService, temp_pdf_file: str):
         """Test extracting PDF metadata"""
@@ -49,18 +106,26 @@ class TestPDFService:
     @pytest.mark.asyncio
     async def test_generate_thumbnail(self, pdf_service: PDFService, temp_pdf_file: str):
         """Test generating PDF thumbnail"""
-        file_path = Path(temp_pdf_file)
-        file_id = "test_thumbnail"
+        from app.core.config import settings
+        from app.services.thumbnails import make_thumbnail
         
-        thumbnail_path = await pdf_service.generate_thumbnail(file_path, file_id)
+        # Mesma chamada que a fila de thumbnails envia ao pool
+        thumbnail_path = make_thumbnail(
+            temp_pdf_file, str(pdf_service.thumbnail_dir), settings.THUMBNAIL_SIZE, settings.PREVIEW_DPI
+        )
         
         # Note: This might return None if PyMuPDF can't process the minimal PDF
         if thumbnail_path:
             assert os.path.exists(thumbnail_path)
-            assert thumbnail_path.endswith(".png")
+            assert thumbnail_path.endswith(".jpg")
+            
+            webp_path = Path(thumbnail_path).with_suffix(".webp")
+            assert webp_path.exists()
+            assert webp_path.stat().st_size < os.path.getsize(thumbnail_path)
             
             # Cleanup
             os.unlink(thumbnail_path)
+            os.unlink(webp_path)
     
     @pytest.mark.asyncio
     async def test_merge_pdfs(self, pdf_service: PDFService, temp_pdf_file: str):
@@ -89,6 +154,147 @@ class TestPDFService:
         if os.path.exists(result["output_path"]):
             os.unlink(result["output_path"])
     
+    def test_partition_by_pages(self):
+        """Test contiguous, page-balanced partitioning for parallel merge"""
+        assert partition_by_pages([10, 10, 10, 10], 2) == [(0, 2), (2, 4)]
+        assert partition_by_pages([100, 1, 1, 1], 3) == [(0, 1), (1, 2), (2, 4)]
+        assert partition_by_pages([5], 4) == [(0, 1)]
+    
+    def test_process_pool_does_not_fork(self):
+        """Test the shared pool starts workers without forking the threaded server"""
+        pool = get_process_pool()
+        
+        assert pool._mp_context.get_start_method() in ("forkserver", "spawn")
+        assert pool.submit(os.getpid).result() != os.getpid()
+    
+    @pytest.mark.asyncio
+    async def test_iter_in_window(self):
+        """Test results come back in order with a bounded number in flight, and the rest is cancelled on close"""
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        
+        started = []
+        lock = threading.Lock()
+        
+        def job(value):
+            with lock:
+                started.append(value)
+            time.sleep(0.01)
+            return value * 10
+        
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            results = [result async for result in iter_in_window(executor, ((job, n) for n in range(6)), window=2)]
+            assert results == [0, 10, 20, 30, 40, 50]
+            
+            started.clear()
+            results = iter_in_window(executor, ((job, n) for n in range(100)), window=2)
+            assert await anext(results) == 0
+            await results.aclose()
+        
+        # A primeira, a que estava em andamento e no máximo uma enfileirada
+        assert len(started) <= 3
+    
+    @pytest.mark.asyncio
+    async def test_merge_pdfs_parallel(self, pdf_service: PDFService, tmp_path: Path):
+        """Test parallel merge preserves file order exactly"""
+        import fitz
+        
+        pdf_files = []
+        for index in range(6):
+            doc = fitz.open()
+            for page_number in range(index % 3 + 1):
+                doc.new_page().insert_text((72, 72), f"file{index}-page{page_number}")
+            file_path = tmp_path / f"source_{index}.pdf"
+            doc.save(str(file_path))
+            doc.close()
+            pdf_files.append(type('PDFFile', (), {
+                'file_path': str(file_path),
+                'order_index': 5 - index,
+                'page_count': index % 3 + 1
+            })())
+        
+        result = await pdf_service.merge_pdfs(pdf_files, "merged_parallel_test.pdf", parallel=True, max_workers=3)
+        
+        try:
+            assert result["success"] is True
+            assert result["chunks"] == 3
+            assert result["total_pages"] == 12
+            
+            with fitz.open(result["output_path"]) as merged:
+                texts = [page.get_text().strip() for page in merged]
+            assert texts[0] == "file5-page0"
+            assert texts[-1] == "file0-page0"
+        finally:
+            if os.path.exists(result.get("output_path", "")):
+                os.unlink(result["output_path"])
+    
+    @pytest.mark.asyncio
+    async def test_merge_pdfs_deduplicates_shared_resources(self, pdf_service: PDFService, tmp_path: Path):
+        """Test identical images from different sources collapse into one object"""
+        import fitz
+        from io import BytesIO
+        from PIL import Image
+        
+        buffer = BytesIO()
+        Image.effect_noise((300, 300), 50).convert("RGB").save(buffer, "PNG")
+        
+        pdf_files = []
+        for index in range(3):
+            doc = fitz.open()
+            doc.new_page().insert_image(fitz.Rect(50, 50, 350, 350), stream=buffer.getvalue())
+            file_path = tmp_path / f"logo_{index}.pdf"
+            doc.save(str(file_path))
+            doc.close()
+            pdf_files.append(type('PDFFile', (), {
+                'file_path': str(file_path),
+                'order_index': index,
+                'page_count': 1
+            })())
+        
+        result = await pdf_service.merge_pdfs(pdf_files, "merged_dedup_test.pdf")
+        
+        try:
+            assert result["success"] is True
+            assert result["duplicate_streams"] >= 2
+            assert result["bytes_saved"] > 0
+            
+            with fitz.open(result["output_path"]) as merged:
+                image_xrefs = {merged[i].get_images()[0][0] for i in range(merged.page_count)}
+            assert len(image_xrefs) == 1
+        finally:
+            if os.path.exists(result.get("output_path", "")):
+                os.unlink(result["output_path"])
+    
+    def test_deduplicate_streams_follows_references(self, tmp_path: Path):
+        """Test images whose soft masks are duplicates collapse too and only dedup savings are reported"""
+        import fitz
+        from io import BytesIO
+        from PIL import Image
+        from app.services.pdf_service import deduplicate_streams
+        
+        buffer = BytesIO()
+        Image.effect_noise((200, 200), 50).convert("RGBA").save(buffer, "PNG")
+        
+        merged = fitz.open()
+        for index in range(3):
+            with fitz.open() as src:
+                src.new_page().insert_image(fitz.Rect(50, 50, 250, 250), stream=buffer.getvalue())
+                merged.insert_pdf(src)
+        merged_path = tmp_path / "merged.pdf"
+        merged.save(str(merged_path))
+        merged.close()
+        original_size = os.path.getsize(merged_path)
+        
+        stats = deduplicate_streams(str(merged_path))
+        
+        # Imagem, /SMask e conteúdo da página de duas das três cópias
+        assert stats["duplicate_streams"] == 6
+        assert 0 < stats["bytes_saved"] <= original_size - os.path.getsize(merged_path)
+        with fitz.open(str(merged_path)) as doc:
+            assert len({page.get_images()[0][:2] for page in doc}) == 1
+            assert doc[2].get_pixmap().width > 0
+    
     @pytest.mark.asyncio
     async def test_compress_pdf(self, pdf_service: PDFService, temp_pdf_file: str):
         """Test PDF compression"""
@@ -109,6 +315,461 @@ class TestPDFService:
             if os.path.exists(output_path):
                 os.unlink(output_path)
     
+    @pytest.fixture
+    def scanned_pdf(self, tmp_path: Path) -> str:
+        """Create a PDF with one oversampled photo-like image per page"""
+        import fitz
+        from io import BytesIO
+        from PIL import Image
+        
+        doc = fitz.open()
+        for seed in range(2):
+            buffer = BytesIO()
+            gradient = Image.linear_gradient("L").resize((1800, 1800))
+            noise = Image.effect_noise((1800, 1800), 20 + seed)
+            Image.merge("RGB", (gradient, noise, gradient.rotate(90))).save(buffer, "PNG")
+            page = doc.new_page(width=432, height=432)  # 6 polegadas -> 300 DPI
+            page.insert_image(page.rect, stream=buffer.getvalue())
+        
+        file_path = tmp_path / "scanned.pdf"
+        doc.save(str(file_path), deflate=True)
+        doc.close()
+        return str(file_path)
+    
+    @pytest.mark.asyncio
+    async def test_compress_pdf_recompresses_images(self, pdf_service: PDFService, scanned_pdf: str, tmp_path: Path):
+        """Test images are downsampled to the target DPI and honor quality"""
+        high = await pdf_service.compress_pdf(scanned_pdf, str(tmp_path / "high.pdf"), quality=90, target_dpi=150)
+        low = await pdf_service.compress_pdf(scanned_pdf, str(tmp_path / "low.pdf"), quality=30, target_dpi=150)
+        
+        assert high["success"] is True and low["success"] is True
+        assert high["images_recompressed"] == 2
+        assert all(image["action"] == "downsampled" for image in high["images"])
+        assert all(image["new_width"] == 900 for image in high["images"])
+        assert low["compressed_size"] < high["compressed_size"] < high["original_size"]
+        assert high["compression_ratio"] > 50
+    
+    @pytest.mark.asyncio
+    async def test_compress_pdf_target_size(self, pdf_service: PDFService, scanned_pdf: str, tmp_path: Path):
+        """Test target-size mode picks a quality that fits the requested size"""
+        reference = await pdf_service.compress_pdf(scanned_pdf, str(tmp_path / "reference.pdf"), quality=90)
+        target_size = reference["compressed_size"] // 2
+        
+        result = await pdf_service.compress_pdf(
+            scanned_pdf, str(tmp_path / "target.pdf"), quality=90, target_size=target_size
+        )
+        
+        assert result["success"] is True
+        assert result["quality"] < 90
+        assert result["sampled_images"] > 0
+        assert result["target_met"] is True
+        assert result["compressed_size"] <= target_size
+    
+    @pytest.mark.asyncio
+    async def test_compress_pdf_closes_document_on_error(self, pdf_service: PDFService, scanned_pdf: str, tmp_path: Path, monkeypatch):
+        """Test the source document is closed when saving the compressed output fails"""
+        import fitz
+        
+        opened = []
+        real_open = fitz.open
+        
+        def tracking_open(*args, **kwargs):
+            doc = real_open(*args, **kwargs)
+            opened.append(doc)
+            return doc
+        
+        monkeypatch.setattr(fitz, "open", tracking_open)
+        result = await pdf_service.compress_pdf(scanned_pdf, str(tmp_path / "missing" / "out.pdf"))
+        
+        assert result["success"] is False
+        assert opened and all(doc.is_closed for doc in opened)
+    
+    def test_recompress_bilevel_image(self):
+        """Test black-and-white scans are stored as 1-bit images"""
+        from io import BytesIO
+        from PIL import Image, ImageDraw
+        from app.services.image_compression import recompress_image
+        
+        img = Image.new("L", (400, 400), 255)
+        ImageDraw.Draw(img).rectangle((100, 100, 300, 300), fill=0)
+        buffer = BytesIO()
+        img.save(buffer, "PNG")
+        
+        result = recompress_image(buffer.getvalue(), quality=85, scale=0.5)
+        
+        assert result["mode"] == "bilevel"
+        assert result["bpc"] == 1
+        assert (result["width"], result["height"]) == (200, 200)
+    
+    @pytest.mark.asyncio
+    async def test_optimize_pdf(self, pdf_service: PDFService, tmp_path: Path):
+        """Test font subsetting and pruning of unused page resources"""
+        import fitz
+        
+        doc = fitz.open()
+        for _ in range(3):
+            page = doc.new_page()
+            page.insert_font(fontname="F0", fontbuffer=fitz.Font("tiro").buffer)
+            page.insert_text((72, 72), "Hello", fontname="F0")
+            page.insert_font(fontname="F1", fontbuffer=fitz.Font("cour").buffer)  # nunca usada
+        input_path = tmp_path / "fonts.pdf"
+        doc.save(str(input_path))
+        doc.close()
+        
+        result = await pdf_service.optimize_pdf(str(input_path), str(tmp_path / "optimized.pdf"))
+        
+        assert result["success"] is True
+        steps = {step["step"]: step for step in result["steps"]}
+        assert steps["prune_resources"]["resources_removed"] == 3
+        assert steps["subset_fonts"]["bytes_after"] < steps["subset_fonts"]["bytes_before"]
+        assert result["optimized_size"] < result["original_size"]
+        
+        with fitz.open(result["output_path"]) as optimized:
+            assert optimized[0].get_text().strip() == "Hello"
+    
+    @pytest.mark.asyncio
+    async def test_add_watermark_shares_stamp(self, pdf_service: PDFService, tmp_path: Path):
+        """Test the watermark is built once and output grows by a near-constant amount"""
+        import fitz
+        
+        growth = {}
+        for page_count in (10, 100):
+            doc = fitz.open()
+            for number in range(page_count):
+                doc.new_page().insert_text((72, 72), f"Page {number + 1}")
+            input_path = tmp_path / f"pages_{page_count}.pdf"
+            doc.save(str(input_path))
+            doc.close()
+            
+            output_path = tmp_path / f"watermarked_{page_count}.pdf"
+            result = await pdf_service.add_watermark(str(input_path), "CONFIDENCIAL", str(output_path), opacity=0.5)
+            
+            assert result["success"] is True
+            assert result["stamps_built"] == 1
+            assert result["shared_pages"] == page_count - 1
+            growth[page_count] = output_path.stat().st_size - input_path.stat().st_size
+            
+            with fitz.open(str(output_path)) as watermarked:
+                assert "CONFIDENCIAL" in watermarked[-1].get_text()
+                assert watermarked[0].get_xobjects()[0][0] == watermarked[-1].get_xobjects()[0][0]
+        
+        # Apenas referências por página: bem menos que um stream de conteúdo novo
+        assert (growth[100] - growth[10]) / 90 < 100
+    
+    @pytest.mark.asyncio
+    async def test_add_watermark_mixed_page_sizes(self, pdf_service: PDFService, tmp_path: Path):
+        """Test one stamp is built per distinct page geometry"""
+        import fitz
+        
+        doc = fitz.open()
+        for width, height in [(595, 842), (842, 595), (595, 842), (842, 595)]:
+            doc.new_page(width=width, height=height)
+        input_path = tmp_path / "mixed.pdf"
+        doc.save(str(input_path))
+        doc.close()
+        
+        result = await pdf_service.add_watermark(str(input_path), "RASCUNHO", str(tmp_path / "mixed_out.pdf"))
+        
+        assert result["success"] is True
+        assert result["stamps_built"] == 2
+        assert result["shared_pages"] == 2
+    
+    @pytest.mark.asyncio
+    async def test_add_watermark_parallel_keeps_links(self, pdf_service: PDFService, tmp_path: Path, monkeypatch):
+        """Test the parallel path keeps links, form fields and page labels that cross chunk boundaries"""
+        import fitz
+        from app.core.config import settings
+        
+        monkeypatch.setattr(settings, "WATERMARK_PARALLEL_MIN_PAGES", 2)
+        monkeypatch.setattr(settings, "PDF_WORKERS", 2)
+        
+        doc = fitz.open()
+        for number in range(6):
+            doc.new_page().insert_text((72, 72), f"Page {number + 1}")
+        doc[0].insert_link({"kind": fitz.LINK_GOTO, "page": 5, "from": fitz.Rect(72, 60, 200, 80)})
+        widget = fitz.Widget()
+        widget.field_name = "assinatura"
+        widget.field_type = fitz.PDF_WIDGET_TYPE_TEXT
+        widget.rect = fitz.Rect(72, 100, 300, 130)
+        doc[5].add_widget(widget)
+        doc.set_page_labels([{"startpage": 0, "prefix": "A-", "style": "D", "firstpagenum": 1}])
+        input_path = tmp_path / "linked.pdf"
+        doc.save(str(input_path))
+        doc.close()
+        
+        output_path = tmp_path / "linked_out.pdf"
+        result = await pdf_service.add_watermark(str(input_path), "INTERNO", str(output_path))
+        
+        assert result["success"] is True
+        assert result["parallel"] is True and result["chunks"] == 2
+        assert result["stamps_built"] == 1
+        with fitz.open(str(output_path)) as watermarked:
+            assert [link["page"] for link in watermarked[0].get_links()] == [5]
+            assert [field.field_name for field in watermarked[5].widgets()] == ["assinatura"]
+            assert watermarked[5].get_label() == "A-6"
+            assert "INTERNO" in watermarked[5].get_text()
+    
+    @pytest.mark.asyncio
+    async def test_add_watermark_incremental(self, pdf_service: PDFService, tmp_path: Path):
+        """Test incremental mode appends to an untouched copy of the original"""
+        import fitz
+        
+        doc = fitz.open()
+        for number in range(5):
+            doc.new_page().insert_text((72, 72), f"Page {number + 1}")
+        input_path = tmp_path / "report.pdf"
+        doc.save(str(input_path))
+        doc.close()
+        
+        output_path = tmp_path / "report_watermarked.pdf"
+        result = await pdf_service.add_watermark(str(input_path), "INTERNO", str(output_path), incremental=True)
+        
+        assert result["success"] is True
+        assert result["incremental"] is True
+        assert result["appended_bytes"] > 0
+        assert output_path.read_bytes().startswith(input_path.read_bytes())
+        
+        with fitz.open(str(output_path)) as watermarked:
+            assert not watermarked.is_repaired
+            assert watermarked.page_count == 5
+            assert "INTERNO" in watermarked[4].get_text()
+    
+    @pytest.mark.asyncio
+    async def test_linearized_outputs(self, pdf_service: PDFService, tmp_path: Path, monkeypatch):
+        """Test linearize option and LINEARIZE_OUTPUTS default"""
+        import fitz
+        from app.core.config import settings
+        
+        doc = fitz.open()
+        for number in range(5):
+            doc.new_page().insert_text((72, 72), f"Page {number + 1}")
+        input_path = tmp_path / "report.pdf"
+        doc.save(str(input_path))
+        doc.close()
+        
+        # Linearizar regrava o arquivo, então o modo incremental é deixado de lado
+        output_path = tmp_path / "watermarked.pdf"
+        result = await pdf_service.add_watermark(
+            str(input_path), "INTERNO", str(output_path), incremental=True, linearize=True
+        )
+        
+        assert result["incremental"] is False
+        assert result["linearization"]["linearized"] is True
+        assert b"/Linearized" in output_path.read_bytes()[:1024]
+        with fitz.open(str(output_path)) as linearized:
+            assert linearized.is_fast_webaccess
+            assert "INTERNO" in linearized[4].get_text()
+        
+        monkeypatch.setattr(settings, "LINEARIZE_OUTPUTS", True)
+        result = await pdf_service.compress_pdf(str(input_path), str(tmp_path / "compressed.pdf"))
+        assert result["linearization"]["linearized"] is True
+        
+        result = await pdf_service.compress_pdf(str(input_path), str(tmp_path / "plain.pdf"), linearize=False)
+        assert "linearization" not in result
+    
+    @pytest.mark.asyncio
+    async def test_split_pdf_modes(self, pdf_service: PDFService, tmp_path: Path):
+        """Test page, range and bookmark split modes"""
+        import fitz
+        
+        doc = fitz.open()
+        for number in range(10):
+            doc.new_page().insert_text((72, 72), f"Page {number + 1}")
+        doc.set_toc([[1, "Capítulo 1", 3], [2, "Seção", 4], [1, "Capítulo 2", 7]])
+        input_path = tmp_path / "book.pdf"
+        doc.save(str(input_path))
+        doc.close()
+        
+        result = await pdf_service.split_pdf(str(input_path), str(tmp_path), pages_per_file=4)
+        assert result["success"] is True
+        assert [(p["start_page"], p["end_page"]) for p in result["parts"]] == [(1, 4), (5, 8), (9, 10)]
+        
+        result = await pdf_service.split_pdf(str(input_path), str(tmp_path), mode="ranges", ranges="2-3, 6, 9-")
+        assert [(p["start_page"], p["end_page"]) for p in result["parts"]] == [(2, 3), (6, 6), (9, 10)]
+        
+        result = await pdf_service.split_pdf(str(input_path), str(tmp_path), mode="bookmarks", output_prefix="cap")
+        assert [p["label"] for p in result["parts"]] == ["", "Capítulo 1", "Capítulo 2"]
+        with fitz.open(result["output_files"][1]) as chapter:
+            assert chapter.page_count == 4
+            assert chapter.get_toc() == [[1, "Capítulo 1", 1], [2, "Seção", 2]]
+        
+        result = await pdf_service.split_pdf(str(input_path), str(tmp_path), mode="ranges", ranges="5-20")
+        assert result["success"] is False
+    
+    @pytest.mark.asyncio
+    async def test_split_pdf_by_size(self, pdf_service: PDFService, scanned_pdf: str, tmp_path: Path):
+        """Test size mode keeps each part under the limit when pages allow it"""
+        page_size = os.path.getsize(scanned_pdf) // 2
+        
+        result = await pdf_service.split_pdf(scanned_pdf, str(tmp_path), mode="size", max_size=page_size + 1024)
+        
+        assert result["success"] is True
+        assert result["total_files"] == 2
+        assert all(part["file_size"] <= page_size * 1.1 for part in result["parts"])
+    
+    def test_extract_pages(self, pdf_service: PDFService, tmp_path: Path):
+        """Test in-memory extraction of page ranges"""
+        import fitz
+        
+        doc = fitz.open()
+        for number in range(8):
+            doc.new_page().insert_text((72, 72), f"Page {number + 1}")
+        input_path = tmp_path / "source.pdf"
+        doc.save(str(input_path))
+        doc.close()
+        
+        content = pdf_service.extract_pages(str(input_path), "2-3,7")
+        
+        with fitz.open("pdf", content) as subset:
+            assert [page.get_text().strip() for page in subset] == ["Page 2", "Page 3", "Page 7"]
+        
+        with pytest.raises(ValueError):
+            pdf_service.extract_pages(str(input_path), "5-9")
+    
+    @pytest.mark.asyncio
+    async def test_rasterize_pdf(self, pdf_service: PDFService, tmp_path: Path):
+        """Test batch rasterization in every output format"""
+        import fitz
+        from PIL import Image
+        
+        doc = fitz.open()
+        for number in range(5):
+            doc.new_page(width=612, height=792).insert_text((72, 72), f"Page {number + 1}")
+        input_path = tmp_path / "pages.pdf"
+        doc.save(str(input_path))
+        doc.close()
+        
+        for image_format, extension in [("png", "png"), ("jpeg", "jpg"), ("webp", "webp")]:
+            output_dir = tmp_path / image_format
+            result = await pdf_service.rasterize_pdf(
+                str(input_path), str(output_dir), pages="2-4", dpi=72, image_format=image_format
+            )
+            
+            assert result["success"] is True
+            assert result["total_pages"] == 3
+            assert result["pages_per_second"] > 0
+            assert [page["page"] for page in result["pages"]] == [2, 3, 4]
+            
+            with Image.open(result["pages"][0]["output_path"]) as image:
+                assert image.size == (612, 792)
+            assert result["pages"][0]["output_path"].endswith(f"page_00002.{extension}")
+        
+        result = await pdf_service.rasterize_pdf(str(input_path), str(tmp_path / "invalid"), pages="4-9")
+        assert result["success"] is False
+    
+    @pytest.mark.asyncio
+    async def test_extract_images(self, pdf_service: PDFService, tmp_path: Path):
+        """Test embedded images are copied byte for byte and deduplicated by xref"""
+        import io
+        import fitz
+        from PIL import Image
+        
+        buffer = io.BytesIO()
+        Image.effect_noise((200, 100), 60).convert("RGB").save(buffer, "JPEG")
+        jpeg_data = buffer.getvalue()
+        buffer = io.BytesIO()
+        Image.effect_noise((50, 50), 60).convert("RGBA").save(buffer, "PNG")
+        png_data = buffer.getvalue()
+        
+        doc = fitz.open()
+        for number in range(3):
+            page = doc.new_page()
+            page.insert_image(fitz.Rect(72, 72, 272, 172), stream=jpeg_data)
+            if number == 1:
+                page.insert_image(fitz.Rect(72, 300, 122, 350), stream=png_data)
+        input_path = tmp_path / "images.pdf"
+        doc.save(str(input_path))
+        doc.close()
+        
+        result = await pdf_service.extract_images(str(input_path), str(tmp_path / "images"))
+        
+        assert result["success"] is True
+        assert (result["total_images"], result["copied"], result["decoded"]) == (2, 1, 1)
+        
+        photo, overlay = result["images"]
+        assert photo["pages"] == [1, 2, 3]
+        assert photo["format"] == "jpg"
+        with open(photo["output_path"], "rb") as f:
+            assert f.read() == jpeg_data
+        
+        # Sem filtro próprio de imagem: decodificado, com a máscara como alfa
+        assert overlay["format"] == "png"
+        with Image.open(overlay["output_path"]) as image:
+            assert image.mode == "RGBA"
+        
+        result = await pdf_service.extract_images(str(input_path), str(tmp_path / "first"), pages="1")
+        assert result["total_images"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_extract_images_mask_size_and_errors(self, pdf_service: PDFService, tmp_path: Path):
+        """Test soft masks at another resolution are resampled and unreadable images do not end the run"""
+        import zlib
+        import fitz
+        from PIL import Image
+        
+        doc = fitz.open()
+        page = doc.new_page()
+        pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 40, 20), True)
+        pix.clear_with(200)
+        page.insert_image(fitz.Rect(72, 72, 272, 172), pixmap=pix)
+        masked, smask = page.get_images(full=True)[0][:2]
+        # Máscara com metade da resolução da imagem
+        doc.update_stream(smask, zlib.compress(bytes([255]) * 20 * 10), compress=False)
+        doc.xref_set_key(smask, "Filter", "/FlateDecode")
+        doc.xref_set_key(smask, "Width", "20")
+        doc.xref_set_key(smask, "Height", "10")
+        
+        page = doc.new_page()
+        page.insert_image(fitz.Rect(72, 72, 172, 172), pixmap=fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 30, 30), False))
+        broken = page.get_images(full=True)[0][0]
+        doc.xref_set_key(broken, "ColorSpace", "/Nonexistent")
+        input_path = tmp_path / "masks.pdf"
+        doc.save(str(input_path))
+        doc.close()
+        
+        result = await pdf_service.extract_images(str(input_path), str(tmp_path / "images"))
+        
+        assert result["success"] is True
+        assert (result["total_images"], result["decoded"], result["failed"]) == (2, 1, 1)
+        image, failed = result["images"]
+        assert image["xref"] == masked
+        with Image.open(image["output_path"]) as decoded:
+            assert decoded.mode == "RGBA" and decoded.size == (40, 20)
+        assert failed["xref"] == broken
+        assert "colorspace" in failed["error"] and "output_path" not in failed
+    
+    @pytest.mark.asyncio
+    async def test_extract_text(self, pdf_service: PDFService, tmp_path: Path):
+        """Test native text extraction in text, blocks and words modes"""
+        import fitz
+        
+        doc = fitz.open()
+        for number in range(3):
+            page = doc.new_page()
+            page.insert_text((72, 400), "segundo bloco")
+            page.insert_text((72, 72), f"Página {number + 1}")
+        input_path = tmp_path / "text.pdf"
+        doc.save(str(input_path))
+        doc.close()
+        
+        result = await pdf_service.extract_text(str(input_path))
+        assert result["success"] is True
+        assert result["total_pages"] == 3
+        # Ordem de leitura, não a ordem em que o texto foi escrito
+        assert result["pages"][0]["text"] == "Página 1\nsegundo bloco"
+        
+        result = await pdf_service.extract_text(str(input_path), mode="blocks", pages="2")
+        assert [block["text"] for block in result["pages"][0]["blocks"]] == ["Página 2", "segundo bloco"]
+        
+        result = await pdf_service.extract_text(str(input_path), mode="words", pages="3")
+        words = result["pages"][0]["words"]
+        assert [word["text"] for word in words] == ["Página", "3", "segundo", "bloco"]
+        assert words[0]["bbox"][0] == 72.0
+        assert result["total_characters"] == sum(len(word["text"]) for word in words)
+        
+        result = await pdf_service.extract_text(str(input_path), mode="lines")
+        assert result["success"] is False
+    
     @pytest.mark.asyncio
     async def test_extract_text_ocr_disabled(self, pdf_service: PDFService, temp_pdf_file: str):
         """Test OCR when disabled"""
@@ -180,4 +841,44 @@ class TestPDFService:
         result = await pdf_service.merge_pdfs([], "empty.pdf")
         
         # Should handle empty list gracefully
-        assert "success" in result
\ No newline at end of file
+        assert "success" in result    
+    def test_build_virtual_document(self, pdf_service: PDFService, temp_pdf_file: str):
+        """Test virtual document page map follows project ordering"""
+        pdf_files = [
+            type('PDFFile', (), {
+                'id': 2, 'file_path': temp_pdf_file, 'order_index': 1, 'page_count': 3
+            })(),
+            type('PDFFile', (), {
+                'id': 1, 'file_path': temp_pdf_file, 'order_index': 0, 'page_count': 2
+            })()
+        ]
+        
+        virtual_doc = pdf_service.build_virtual_document(pdf_files)
+        
+        assert virtual_doc["total_pages"] == 5
+        assert [entry["first_page"] for entry in virtual_doc["entries"]] == [1, 3]
+        
+        pdf_file, page_index = pdf_service.resolve_virtual_page(virtual_doc, 2)
+        assert pdf_file.id == 1 and page_index == 1
+        
+        pdf_file, page_index = pdf_service.resolve_virtual_page(virtual_doc, 3)
+        assert pdf_file.id == 2 and page_index == 0
+        
+        with pytest.raises(ValueError):
+            pdf_service.resolve_virtual_page(virtual_doc, 6)
+    
+    @pytest.mark.asyncio
+    async def test_get_virtual_page(self, pdf_service: PDFService, temp_pdf_file: str):
+        """Test serving a single page of the virtual document"""
+        pdf_files = [
+            type('PDFFile', (), {
+                'id': 1, 'file_path': temp_pdf_file, 'order_index': 0, 'page_count': None
+            })()
+        ]
+        virtual_doc = pdf_service.build_virtual_document(pdf_files)
+        
+        result = await pdf_service.get_virtual_page(virtual_doc, 1, output_format="pdf")
+        
+        assert result["success"] is True
+        assert result["content"].startswith(b"%PDF")
+        assert result["source_page"] == 1
@@ -0,0 +1,82 @@
+import pytest
+import base64
+import hashlib
+from pathlib import Path
+from app.services.resumable_upload import ResumableUploads, parse_upload_metadata
+
+async def chunks(*parts: bytes):
+    for part in parts:
+        yield part
+
+async def broken(*parts: bytes):
+    """Corpo que cai no meio, como uma conexão instável"""
+    for part in parts:
+        yield part
+    raise ConnectionError("conexão perdida")
+
+class TestResumableUploads:
+    """Test tus-style resumable uploads"""
+    
+    def test_parse_upload_metadata(self):
+        """Test Upload-Metadata values are base64 decoded"""
+        header = f"filename {base64.b64encode('relatório.pdf'.encode()).decode()},is_confidential"
+        
+        assert parse_upload_metadata(header) == {"filename": "relatório.pdf", "is_confidential": ""}
+        assert parse_upload_metadata(None) == {}
+        with pytest.raises(ValueError):
+            parse_upload_metadata("filename não-é-base64")
+    
+    @pytest.mark.asyncio
+    async def test_resume_after_interruption(self, tmp_path: Path):
+        """Test bytes received before a drop are kept and the upload resumes from the reported offset"""
+        uploads = ResumableUploads(str(tmp_path / "partial"), ttl=3600)
+        content = bytes(range(256)) * 40
+        upload = uploads.create(owner_id=1, project_id=2, filename="scan.pdf", length=len(content))
+        
+        result = await uploads.append(upload["upload_id"], 0, broken(content[:3000], content[3000:4000]))
+        assert result["success"] is False
+        assert result["offset"] == 4000
+        assert uploads.get(upload["upload_id"])["offset"] == 4000
+        
+        # Offset antigo é recusado
+        result = await uploads.append(upload["upload_id"], 3000, chunks(content[3000:]))
+        assert result["reason"] == "offset" and result["offset"] == 4000
+        
+        assert uploads.finish(upload["upload_id"], tmp_path / "early.pdf")["reason"] == "incomplete"
+        
+        result = await uploads.append(upload["upload_id"], 4000, chunks(content[4000:6000], content[6000:]))
+        assert result == {"success": True, "offset": len(content)}
+        
+        destination = tmp_path / "scan.pdf"
+        result = uploads.finish(upload["upload_id"], destination)
+        assert result["success"] is True
+        assert result["content_hash"] == hashlib.sha256(content).hexdigest()
+        assert destination.read_bytes() == content
+        assert uploads.get(upload["upload_id"]) is None
+    
+    @pytest.mark.asyncio
+    async def test_hash_survives_restart_and_rejects_overflow(self, tmp_path: Path):
+        """Test a new instance rebuilds the hash from disk and chunks past the length are refused"""
+        store_dir = str(tmp_path / "partial")
+        content = b"%PDF-1.4 " * 500
+        upload = ResumableUploads(store_dir, ttl=3600).create(1, 2, "doc.pdf", len(content))
+        upload_id = upload["upload_id"]
+        
+        await ResumableUploads(store_dir, ttl=3600).append(upload_id, 0, chunks(content[:1000]))
+        
+        restarted = ResumableUploads(store_dir, ttl=3600)
+        result = await restarted.append(upload_id, 1000, chunks(content[1000:], b"extra"))
+        assert result["reason"] == "length"
+        assert result["offset"] == len(content)
+        
+        result = restarted.finish(upload_id, tmp_path / "doc.pdf")
+        assert result["content_hash"] == hashlib.sha256(content).hexdigest()
+    
+    def test_expire_stale_uploads(self, tmp_path: Path):
+        """Test uploads idle for longer than the TTL are removed"""
+        uploads = ResumableUploads(str(tmp_path), ttl=-1)
+        upload = uploads.create(1, 2, "old.pdf", 10)
+        
+        assert uploads.expire() == 1
+        assert uploads.get(upload["upload_id"]) is None
+        assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,116 @@
+import pytest
+import fitz
+from pathlib import Path
+from typing import List
+from sqlalchemy.orm import sessionmaker
+from app.models.pdf_project import PDFFile
+from app.services.search_index import SearchIndex, match_expression
+
+def make_pdf(path: Path, texts: List[str]) -> str:
+    doc = fitz.open()
+    for text in texts:
+        doc.new_page().insert_text((72, 72), text)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+def job(file_id: int, path: str, content_hash: str, owner_id: int = 1, project_id: int = 1) -> dict:
+    return {
+        "file_id": file_id,
+        "file_path": path,
+        "content_hash": content_hash,
+        "owner_id": owner_id,
+        "project_id": project_id,
+        "filename": Path(path).name
+    }
+
+class TestSearchIndex:
+    """Test the FTS5 page index and its search"""
+    
+    @pytest.fixture
+    def index(self, tmp_path: Path) -> SearchIndex:
+        return SearchIndex(str(tmp_path / "search.db"), batch_pages=2)
+    
+    def test_search_ranks_pages(self, index: SearchIndex, tmp_path: Path):
+        """Test hits come back per page, ranked, with highlighted snippets"""
+        report = make_pdf(tmp_path / "report.pdf", ["Relatório de vendas", "vendas vendas vendas", "outro assunto"])
+        index.index_jobs([job(1, report, "a")])
+        
+        result = index.search("vendas", owner_id=1)
+        
+        assert result["total"] == 2
+        assert [hit["page"] for hit in result["hits"]] == [2, 1]
+        assert result["hits"][1]["snippet"] == "Relatório de <mark>vendas</mark>"
+        
+        # Acentos são ignorados na busca
+        assert index.search("relatorio", owner_id=1)["total"] == 1
+        assert index.search("vendas assunto", owner_id=1)["total"] == 0
+    
+    def test_reuses_rows_for_identical_content(self, index: SearchIndex, tmp_path: Path):
+        """Test a re-upload of the same content only links the new file"""
+        original = make_pdf(tmp_path / "original.pdf", ["contrato assinado"])
+        index.index_jobs([job(1, original, "same"), job(2, original, "same", project_id=2)])
+        
+        stats = index.stats()
+        assert (stats["documents"], stats["pages"], stats["files"]) == (1, 1, 2)
+        
+        result = index.search("contrato", owner_id=1)
+        assert sorted(hit["file_id"] for hit in result["hits"]) == [1, 2]
+        assert [hit["file_id"] for hit in index.search("contrato", owner_id=1, project_id=2)["hits"]] == [2]
+    
+    def test_filters_by_owner_and_paginates(self, index: SearchIndex, tmp_path: Path):
+        """Test users only see their own files and offsets page through hits"""
+        mine = make_pdf(tmp_path / "mine.pdf", [f"fatura {number}" for number in range(5)])
+        theirs = make_pdf(tmp_path / "theirs.pdf", ["fatura alheia"])
+        index.index_jobs([job(1, mine, "mine"), job(2, theirs, "theirs", owner_id=2)])
+        
+        first = index.search("fatura", owner_id=1, limit=3)
+        second = index.search("fatura", owner_id=1, limit=3, offset=3)
+        
+        assert first["total"] == 5
+        assert len(first["hits"]) == 3
+        assert len(second["hits"]) == 2
+        assert {hit["page"] for hit in first["hits"] + second["hits"]} == {1, 2, 3, 4, 5}
+        assert index.search("alheia", owner_id=1)["total"] == 0
+    
+    def test_background_indexing(self, index: SearchIndex, tmp_path: Path):
+        """Test enqueued files are indexed off the caller's thread"""
+        path = make_pdf(tmp_path / "queued.pdf", ["indexado em segundo plano"])
+        
+        index.enqueue(1, path, "queued", owner_id=1, project_id=1, filename="queued.pdf")
+        index.wait_idle()
+        
+        assert index.search("segundo plano", owner_id=1)["hits"][0]["file_id"] == 1
+    
+    def test_requeues_unindexed_files(self, index: SearchIndex, tmp_path: Path, db_session, test_project):
+        """Test files whose indexing was lost on a restart are scheduled again"""
+        indexed = make_pdf(tmp_path / "indexed.pdf", ["já indexado"])
+        lost = make_pdf(tmp_path / "lost.pdf", ["perdido na reinicialização"])
+        files = [
+            PDFFile(
+                project_id=test_project.id,
+                original_filename=Path(path).name,
+                stored_filename=Path(path).name,
+                file_path=path,
+                file_size=1,
+                content_hash=content_hash
+            )
+            for path, content_hash in ((indexed, "indexed"), (lost, "lost"), (str(tmp_path / "gone.pdf"), "gone"))
+        ]
+        db_session.add_all(files)
+        db_session.commit()
+        index.index_jobs([job(files[0].id, indexed, "indexed", owner_id=test_project.owner_id)])
+        
+        assert index.requeue_missing(sessionmaker(bind=db_session.get_bind())) == 1
+        index.wait_idle()
+        
+        hits = index.search("reinicialização", owner_id=test_project.owner_id)["hits"]
+        assert [(hit["file_id"], hit["project_id"]) for hit in hits] == [(files[1].id, test_project.id)]
+        assert index.requeue_missing(sessionmaker(bind=db_session.get_bind())) == 0
+    
+    def test_match_expression_is_literal(self):
+        """Test user input cannot inject FTS5 syntax"""
+        assert match_expression('NEAR(a b) "x') == '"NEAR(a" "b)" """x"'
+        
+        with pytest.raises(ValueError):
+            match_expression("   ")
@@ -0,0 +1,77 @@
+import fitz
+from pathlib import Path
+from typing import List
+from PIL import Image
+
+from app.services import sprites
+from app.services.sprites import build_sprite, load_sprite_map, sprite_name, sprite_signature
+
+def make_pdf(path: Path, pages: int) -> str:
+    doc = fitz.open()
+    for number in range(pages):
+        doc.new_page().insert_text((72, 72), f"Página {number + 1}")
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+def entries(tmp_path: Path, page_counts: List[int]) -> List[dict]:
+    return [
+        {
+            "file_id": index + 1,
+            "stored_filename": f"file{index}.pdf",
+            "file_path": make_pdf(tmp_path / f"file{index}.pdf", pages),
+            "thumbnail_path": None
+        }
+        for index, pages in enumerate(page_counts)
+    ]
+
+class TestSprites:
+    """Test sprite sheet packing and its cache key"""
+    
+    def test_signature_ignores_order(self, tmp_path: Path):
+        """Test reordering keeps the sprite while a new file set changes it"""
+        files = entries(tmp_path, [1, 1])
+        
+        signature = sprite_signature("files", files, (200, 280))
+        
+        assert sprite_signature("files", list(reversed(files)), (200, 280)) == signature
+        assert sprite_signature("files", files[:1], (200, 280)) != signature
+        assert sprite_signature("pages", files, (200, 280)) != signature
+    
+    def test_build_page_sprite(self, tmp_path: Path):
+        """Test every page gets a tile whose coordinates point into the sheet"""
+        files = entries(tmp_path, [3, 2])
+        store = tmp_path / "sprites"
+        store.mkdir()
+        name = sprite_name(7, "pages", sprite_signature("pages", files, (100, 140)))
+        
+        sprite_map = build_sprite(str(store), name, "pages", files, (100, 140), columns=4)
+        
+        assert load_sprite_map(str(store), name) == sprite_map
+        assert [(tile["file_id"], tile["page"]) for tile in sprite_map["tiles"]] == [(1, 1), (1, 2), (1, 3), (2, 1), (2, 2)]
+        assert sprite_map["sheets"] == [{"name": f"{name}-0", "width": 400, "height": 280}]
+        assert sprite_map["tiles"][4]["x"] == 0 and sprite_map["tiles"][4]["y"] == 140
+        
+        with Image.open(store / f"{name}-0.webp") as sheet:
+            assert sheet.size == (400, 280)
+    
+    def test_build_splits_sheets_and_drops_stale(self, tmp_path: Path, monkeypatch):
+        """Test large sets span several sheets and older sprites of the project are removed"""
+        monkeypatch.setattr(sprites, "MAX_SHEET_SIDE", 300)
+        files = entries(tmp_path, [5])
+        store = tmp_path / "sprites"
+        store.mkdir()
+        
+        old_name = sprite_name(7, "pages", "0" * 16)
+        build_sprite(str(store), old_name, "pages", files[:0], (100, 140), columns=2)
+        other_project = sprite_name(8, "pages", "0" * 16)
+        build_sprite(str(store), other_project, "pages", files[:0], (100, 140), columns=2)
+        
+        name = sprite_name(7, "pages", sprite_signature("pages", files, (100, 140)))
+        sprite_map = build_sprite(str(store), name, "pages", files, (100, 140), columns=2)
+        
+        # 2 colunas x 2 linhas por folha
+        assert [sheet["height"] for sheet in sprite_map["sheets"]] == [280, 140]
+        assert [tile["sheet"] for tile in sprite_map["tiles"]] == [0, 0, 0, 0, 1]
+        assert load_sprite_map(str(store), old_name) is None
+        assert load_sprite_map(str(store), other_project) is not None
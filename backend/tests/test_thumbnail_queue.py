@@ -0,0 +1,88 @@
+import fitz
+from pathlib import Path
+from PIL import Image
+from sqlalchemy.orm import sessionmaker
+
+from app.models.pdf_project import PDFFile
+from app.services.thumbnail_queue import ThumbnailQueue, PRIORITY_VISIBLE
+
+def make_pdf(path: Path) -> str:
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), path.stem)
+    doc.save(str(path))
+    doc.close()
+    return str(path)
+
+def drain(queue: ThumbnailQueue) -> list:
+    """Ordem em que os trabalhos sairiam da fila (sem workers)"""
+    order = []
+    while queue.pending():
+        job = queue._next_job()
+        queue._active -= 1
+        order.append((job["file_id"], job["tier"]))
+    return order
+
+class TestThumbnailQueue:
+    """Test background preview and thumbnail generation"""
+    
+    def test_previews_first_and_visible_files_jump_ahead(self, tmp_path: Path):
+        """Test cheap previews go first and prioritized files overtake the rest"""
+        queue = ThumbnailQueue(str(tmp_path), workers=0)
+        for file_id in (1, 2, 3):
+            queue.enqueue(file_id, f"{file_id}.pdf", session_factory=None)
+        
+        assert queue.prioritize([3, 99]) == 2
+        assert queue.prioritize([3]) == 0
+        
+        assert drain(queue) == [
+            (3, "preview"), (3, "thumbnail"),
+            (1, "preview"), (2, "preview"),
+            (1, "thumbnail"), (2, "thumbnail")
+        ]
+    
+    def test_fills_in_paths(self, tmp_path: Path, db_session):
+        """Test workers render both tiers and record them on the PDFFile"""
+        file_path = make_pdf(tmp_path / "queued.pdf")
+        pdf_file = PDFFile(
+            project_id=1,
+            original_filename="queued.pdf",
+            stored_filename="queued.pdf",
+            file_path=file_path,
+            file_size=1
+        )
+        db_session.add(pdf_file)
+        db_session.commit()
+        
+        queue = ThumbnailQueue(str(tmp_path), workers=1)
+        queue.enqueue(pdf_file.id, file_path, sessionmaker(bind=db_session.get_bind()), priority=PRIORITY_VISIBLE)
+        queue.wait_idle()
+        db_session.refresh(pdf_file)
+        
+        with Image.open(pdf_file.preview_path) as preview:
+            assert preview.width <= 50 and preview.height <= 70
+        with Image.open(pdf_file.thumbnail_path) as thumbnail:
+            assert thumbnail.width > 50
+        assert queue.pending() == 0
+    
+    def test_requeues_files_without_thumbnails(self, tmp_path: Path, db_session):
+        """Test files left without a thumbnail by a restart are scheduled again"""
+        done, half, missing = (make_pdf(tmp_path / f"{name}.pdf") for name in ("done", "half", "missing"))
+        rows = [
+            PDFFile(project_id=1, original_filename="done.pdf", stored_filename="done.pdf", file_path=done,
+                    file_size=1, preview_path="p.jpg", thumbnail_path="t.jpg"),
+            PDFFile(project_id=1, original_filename="half.pdf", stored_filename="half.pdf", file_path=half,
+                    file_size=1, preview_path="p.jpg"),
+            PDFFile(project_id=1, original_filename="new.pdf", stored_filename="new.pdf", file_path=missing,
+                    file_size=1),
+            PDFFile(project_id=1, original_filename="gone.pdf", stored_filename="gone.pdf",
+                    file_path=str(tmp_path / "gone.pdf"), file_size=1)
+        ]
+        db_session.add_all(rows)
+        db_session.commit()
+        
+        queue = ThumbnailQueue(str(tmp_path), workers=0)
+        assert queue.requeue_missing(sessionmaker(bind=db_session.get_bind())) == 2
+        
+        assert sorted(drain(queue)) == [
+            (rows[1].id, "thumbnail"), (rows[2].id, "preview"), (rows[2].id, "thumbnail")
+        ]
@@ -0,0 +1,64 @@
+import pytest
+import fitz
+from io import BytesIO
+from pathlib import Path
+from PIL import Image
+from app.services.thumbnails import negotiate_format, store_thumbnail, thumbnail_key, variant_path
+
+ALL_FORMATS = ["avif", "webp", "jpg"]
+
+def make_image() -> Image.Image:
+    """Primeira página renderizada e reduzida, como na geração de thumbnails"""
+    doc = fitz.open()
+    page = doc.new_page()
+    for line in range(40):
+        page.insert_text((72, 72 + line * 18), "Lorem ipsum dolor sit amet, consectetur adipiscing elit")
+    pix = page.get_pixmap(matrix=fitz.Matrix(150 / 72, 150 / 72))
+    doc.close()
+    
+    img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    img.thumbnail((200, 280), Image.Resampling.LANCZOS)
+    return img
+
+class TestThumbnails:
+    """Test the thumbnail store and Accept negotiation"""
+    
+    @pytest.mark.parametrize("accept, expected", [
+        ("image/avif,image/webp,image/apng,image/*,*/*;q=0.8", "avif"),
+        ("image/webp,*/*", "webp"),
+        ("image/avif;q=0.5,image/webp", "webp"),
+        ("image/*", "jpg"),
+        ("*/*", "jpg"),
+        (None, "jpg"),
+        ("image/png", "jpg"),
+        ("image/webp;q=0", "jpg"),
+    ])
+    def test_negotiate_format(self, accept, expected):
+        """Test modern formats are only chosen when listed explicitly"""
+        assert negotiate_format(accept, ALL_FORMATS) == expected
+    
+    def test_negotiate_only_available_formats(self):
+        """Test variants missing from the store are never chosen"""
+        assert negotiate_format("image/avif,image/webp", ["webp", "jpg"]) == "webp"
+        assert negotiate_format("image/avif", []) is None
+    
+    def test_store_thumbnail(self, tmp_path: Path):
+        """Test variants are keyed by content and smaller than the PNG"""
+        img = make_image()
+        
+        key = store_thumbnail(img, str(tmp_path))
+        
+        assert store_thumbnail(make_image(), str(tmp_path)) == key
+        assert thumbnail_key(str(variant_path(str(tmp_path), key, "jpg"))) == key
+        
+        png = BytesIO()
+        img.save(png, "PNG")
+        webp = variant_path(str(tmp_path), key, "webp")
+        assert webp.stat().st_size < len(png.getvalue()) / 2
+        assert Image.open(webp).size == img.size
+        assert not list(tmp_path.glob("*.tmp"))
+    
+    def test_thumbnail_key_ignores_legacy_paths(self):
+        """Test old PNG thumbnails in TEMP_DIR have no store key"""
+        assert thumbnail_key("/tmp/0f8e9a_thumb.png") is None
+        assert thumbnail_key(None) is None